@@ -8,6 +8,7 @@ from src.auth.models import AuthRefreshToken
 from src.device.models import Device
 from src.entity.models import Entity, entities_and_tags_table
 from src.folder.models import Folder
+from src.job.models import Job
 from src.role.models import Role
 from src.tag.models import Tag
 from src.tenant.models import Tenant, tenants_and_users_table
@@ -0,0 +1,188 @@
+"""
+Micro-benchmark of the user context middleware (src/auth/middleware.py).
+
+Measures requests/sec on /status (with and without a token) and /devices/ without
+the middleware, with the previous BaseHTTPMiddleware implementation and with the
+current ASGI one. The app
+runs in-process (httpx ASGI transport) against a scratch sqlite database, so only
+the relative numbers are meaningful.
+
+Usage, from the repository root (with the usual .env):
+    python scripts/benchmark_auth_middleware.py --requests 2000 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# the scratch database has to be configured before importing the app
+ENV = os.getenv("ENV") or "DEV"
+os.environ["ENV"] = ENV
+os.environ[f"DB_CONNECTION_{ENV}"] = (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+)
+os.environ[f"ASYNC_DB_CONNECTION_{ENV}"] = ""
+
+import httpx
+from fastapi.responses import JSONResponse
+from fastapi_pagination import add_pagination
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from src.main import app
+from src.audit_mixin import _auth_user_ctx
+from src.auth.dependencies import authenticate_token
+from src.auth.exceptions import InvalidCredentials
+from src.auth.middleware import AuthUserRequestContextMiddleware
+from src.auth.utils import create_access_token
+from src.database import AsyncSessionLocal, Base, SessionLocal, engine
+from src.device.schemas import DeviceCreate
+from src.device.service import create_device
+from src.folder.schemas import FolderCreate
+from src.folder.service import create_folder
+from src.role.schemas import RoleCreate
+from src.role.service import create_role
+from src.tenant.schemas import TenantCreate
+from src.tenant.service import create_tenant
+from src.user.schemas import UserCreate
+from src.user.service import assign_role, create_user
+
+
+class BaseHTTPAuthUserRequestContextMiddleware(BaseHTTPMiddleware):
+    # previous implementation, kept here for comparison
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
+        if "Bearer" in request.headers.get("authorization", ""):
+            try:
+                token = request.headers["authorization"].replace("Bearer ", "")
+                async with AsyncSessionLocal() as db:
+                    user = await authenticate_token(token, db)
+                request.state.user = user
+                _auth_user_ctx.set(user.id)
+            except InvalidCredentials as exc:
+                return JSONResponse(content=exc.detail, status_code=exc.status_code)
+        return await call_next(request)
+
+
+VARIANTS = {
+    "without middleware": None,
+    "BaseHTTPMiddleware": BaseHTTPAuthUserRequestContextMiddleware,
+    "ASGI middleware": AuthUserRequestContextMiddleware,
+}
+# (column, path, authenticated)
+REQUESTS = (
+    ("/status", "/status", False),
+    ("/status + token", "/status", True),
+    ("/devices/", "/devices/", True),
+)
+
+
+def create_data(devices: int) -> str:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        roles = [
+            create_role(db, RoleCreate(name=name))
+            for name in ("admin", "owner", "user")
+        ]
+        tenant = create_tenant(db, TenantCreate(name="benchmark"))
+        folder = create_folder(db, FolderCreate(name="benchmark", tenant_id=tenant.id))
+        for i in range(devices):
+            create_device(
+                db,
+                DeviceCreate(
+                    name=f"benchmark-{i}",
+                    folder_id=folder.id,
+                    SO_name="android",
+                    SO_version="10",
+                    os_kernel_version="6",
+                    vendor_name="samsung",
+                    vendor_model="galaxy tab s9",
+                    vendor_cores=8,
+                    vendor_ram_gb=4,
+                ),
+            )
+        user = create_user(
+            db, UserCreate(username="benchmark@sia.com", password="_s3cr3tp@5sw0rd_")
+        )
+        user = assign_role(db, user.id, roles[0].id)
+        return create_access_token(user)
+    finally:
+        db.close()
+
+
+def use_middleware(middleware_class) -> None:
+    app.user_middleware = [
+        m
+        for m in app.user_middleware
+        if m.cls
+        not in (
+            AuthUserRequestContextMiddleware,
+            BaseHTTPAuthUserRequestContextMiddleware,
+        )
+    ]
+    if middleware_class:
+        app.user_middleware.insert(0, Middleware(middleware_class))
+    app.middleware_stack = None  # rebuilt on the next request
+
+
+async def run(
+    path: str, token: Optional[str], requests: int, concurrency: int
+) -> float:
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", headers=headers
+    ) as client:
+
+        async def worker(count: int) -> None:
+            for _ in range(count):
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await worker(10)  # warm up
+        started_at = time.perf_counter()
+        await asyncio.gather(
+            *[worker(requests // concurrency) for _ in range(concurrency)]
+        )
+        elapsed = time.perf_counter() - started_at
+    return (requests // concurrency) * concurrency / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--devices", type=int, default=50)
+    args = parser.parse_args()
+
+    token = create_data(args.devices)
+    add_pagination(app)  # done by the app lifespan, which is not run here
+    print("requests/sec".ljust(20) + "".join(c.rjust(16) for c, _, _ in REQUESTS))
+    for name, middleware_class in VARIANTS.items():
+        use_middleware(middleware_class)
+        results = [
+            asyncio.run(
+                run(
+                    path,
+                    token if authenticated else None,
+                    args.requests,
+                    args.concurrency,
+                )
+            )
+            for _, path, authenticated in REQUESTS
+        ]
+        print(name.ljust(20) + "".join(f"{result:16.0f}" for result in results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+from typing import FrozenSet, Iterable, NamedTuple
+from src.cache import LRUCache
+from src.device.models import Device
+from src.folder.models import Folder
+from src.tenant.models import tenants_and_users_table
+from src.user.models import User
+
+load_dotenv()
+
+
+class AclSnapshot(NamedTuple):
+    version: int
+    tenant_ids: FrozenSet[int]
+    folder_ids: FrozenSet[int]
+    device_ids: FrozenSet[int]
+
+
+# user ids -> AclSnapshot. Snapshots are compiled against the ACL version of the user,
+# which is stored along with it so that every process sees it bumped (tenant
+# membership changes, folders and devices moving between tenants).
+acl_cache = LRUCache(
+    max_size=int(os.getenv("ACL_CACHE_MAX_SIZE", 1024)),
+    ttl_s=float(os.getenv("ACL_CACHE_TTL_S", 60)),
+)
+
+
+def get_acl_version(db: Session, user_id: int) -> int:
+    return db.scalar(select(User.acl_version).where(User.id == user_id)) or 0
+
+
+def bump_acl_version(
+    db: Session, user_ids: Iterable[int] = (), tenant_ids: Iterable[int] = ()
+) -> None:
+    # invalidates the snapshots of the given users and of every member of the given
+    # tenants, within the caller's transaction.
+    user_ids = {u for u in user_ids if u is not None}
+    tenant_ids = {t for t in tenant_ids if t is not None}
+    criteria = []
+    if user_ids:
+        criteria.append(User.id.in_(user_ids))
+    if tenant_ids:
+        membership = tenants_and_users_table.c
+        criteria.append(
+            User.id.in_(
+                select(membership.user_id).where(membership.tenant_id.in_(tenant_ids))
+            )
+        )
+    if not criteria:
+        return
+    db.execute(
+        update(User)
+        .where(or_(*criteria))
+        .values(
+            acl_version=User.acl_version + 1,
+            # not an update of the users themselves
+            last_login=User.last_login,
+            updated_at=User.updated_at,
+            updated_by_id=User.updated_by_id,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def bump_acl_version_on_move(
+    db: Session, source_tenant_ids: Iterable[int], target_tenant_id: int
+) -> None:
+    # folders and devices moving within a tenant leave every snapshot as it is
+    source_tenant_ids = {t for t in source_tenant_ids if t is not None}
+    if source_tenant_ids - {target_tenant_id}:
+        bump_acl_version(db, tenant_ids=source_tenant_ids | {target_tenant_id})
+
+
+def compile_acl_snapshot(db: Session, user_id: int, version: int) -> AclSnapshot:
+    membership = tenants_and_users_table.c
+    tenant_ids = db.scalars(
+        select(membership.tenant_id).where(membership.user_id == user_id)
+    ).all()
+    folder_ids = db.scalars(
+        select(Folder.id)
+        .join(tenants_and_users_table, membership.tenant_id == Folder.tenant_id)
+        .where(membership.user_id == user_id)
+    ).all()
+    device_ids = db.scalars(
+        select(Device.id)
+        .join(Folder, Folder.id == Device.folder_id)
+        .join(tenants_and_users_table, membership.tenant_id == Folder.tenant_id)
+        .where(membership.user_id == user_id)
+    ).all()
+    return AclSnapshot(
+        version, frozenset(tenant_ids), frozenset(folder_ids), frozenset(device_ids)
+    )
+
+
+def get_acl_snapshot(db: Session, user_id: int) -> AclSnapshot:
+    version = get_acl_version(db, user_id)
+    snapshot = acl_cache.get(user_id)
+    if snapshot is None or snapshot.version != version:
+        snapshot = compile_acl_snapshot(db, user_id, version)
+        acl_cache.set(user_id, snapshot)
+    return snapshot
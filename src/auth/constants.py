@@ -13,6 +13,7 @@ class ErrorCode:
     INVALID_OTP = "OTP inválido"
     INVALID_PASSWORD_TOKEN = "El token para actualizcación de password es inválido"
     EMAIL_AUTHENTICATION_REQUIRED = "Ha ocurrido un problema con la autenticación de la cuenta de email del servidor."
+    PASSWORD_HASHER_BUSY = "El servidor está saturado, reintente el inicio de sesión más tarde"
 
 
 class Message:
@@ -1,108 +1,124 @@
 import os
 import datetime
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Cookie
+from fastapi import Depends, FastAPI, Cookie, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError, jwt
 from typing import Any, Dict, Union, List
 from src.exceptions import PermissionDenied
-from src.database import get_db
+from src.database import get_db, get_async_db
 from src.user.schemas import User
 from src.user import service as user_service
-from src.role import models as role_models
-from src.tenant import models as tenant_models
+from src.role.utils import get_role_id
 from src.folder import models as folder_models
 from src.device import models as device_models
 from src.tag import models as tag_models
 from src.tag import schemas as tag_schemas
 from src.folder.exceptions import FolderNotFound
-from src.device.exceptions import DeviceNotFound
+from src.device.utils import resolve_device
 from src.auth import service, exceptions
-from src.auth.schemas import AuthRefreshToken, TokenData
-from src.auth.utils import get_user_by_username, _is_valid_refresh_token, parse_refresh_token
+from src.auth.acl import get_acl_snapshot
+from src.auth.schemas import AuthRefreshToken
+from src.auth.utils import (
+    decode_token,
+    get_user_by_id,
+    _is_valid_refresh_token,
+    parse_refresh_token,
+)
 
 load_dotenv()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db),
-):
+async def authenticate_token(token: str, db: AsyncSession) -> User:
     try:
-        payload = jwt.decode(
-            token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")]
-        )
-        user_str = payload.get("sub")
-        if user_str is None:
-            raise exceptions.InvalidCredentials()
-        user = User.model_validate_json(
-            user_str
-        )  # creating User schema with the data from the token.
-        token_data = TokenData(username=user.username)
+        # verified once, then served from the verified token cache until it expires
+        claims = decode_token(token)
     except JWTError:
         raise exceptions.InvalidCredentials()
-    user = get_user_by_username(db, username=token_data.username)
+    user = await db.run_sync(get_user_by_id, claims.user_id)
     if user is None:
         raise exceptions.InvalidCredentials()
     return user
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)):
+async def get_current_user(
+    request: Request,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # the user is resolved once per request by AuthUserRequestContextMiddleware
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+    return await authenticate_token(token, db)
+
+
+# the dependencies below query the sync session (e.g. the ACL snapshot version or the
+# device lookup), so they are plain functions: FastAPI runs them in its threadpool
+# instead of on the event loop.
+def get_current_active_user(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
     if current_user.disabled:
         raise exceptions.InactiveUser()
-    return current_user
+    # attaching the user to the request's sync session (without querying it again),
+    # so its relationships can still be lazy loaded by the sync dependencies.
+    return db.merge(current_user, load=False)
 
 
-async def has_role(
+def has_role(
     role_name: str,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
 ) -> User:
-    role = db.query(role_models.Role).filter(role_models.Role.name == role_name).first()
-    if role and user.role_id == role.id:
+    # resolved from the role registry, without querying the database once loaded
+    role_id = get_role_id(db, role_name)
+    if role_id is not None and user.role_id == role_id:
         return user
     return None
 
 
-async def has_admin_role(
+def has_admin_role(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
 ) -> User:
-    user = await has_role("admin", db, user)
+    user = has_role("admin", db, user)
     if user:
         return user
     raise PermissionDenied()
 
 
-async def has_owner_role(
+def has_owner_role(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
 ) -> User:
-    user = await has_role("owner", db, user)
+    user = has_role("owner", db, user)
     if user:
         return user
     raise PermissionDenied()
 
 
-async def has_admin_or_owner_role(
+def has_admin_or_owner_role(
     db: Session = Depends(get_db), user: User = Depends(get_current_active_user)
 ) -> User:
-    admin_user = await has_role("admin", db, user)
-    owner_user = await has_role("owner", db, user)
+    admin_user = has_role("admin", db, user)
+    owner_user = has_role("owner", db, user)
     if admin_user or owner_user:
         return user
     raise PermissionDenied()
 
 
-async def can_assign_role(
+def can_assign_role(
     role_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(has_admin_or_owner_role),
 ) -> User:
-    if await has_role("admin", db, user) or role_id >= user.role_id:
+    if has_role("admin", db, user) or role_id >= user.role_id:
         return user
     raise PermissionDenied()
 
@@ -118,7 +134,7 @@ async def valid_refresh_token(
     return parsed_token
 
 
-async def valid_refresh_token_user(
+def valid_refresh_token_user(
     refresh_token: Dict[str, Any] = Depends(valid_refresh_token),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
@@ -129,33 +145,31 @@ async def valid_refresh_token_user(
     return user
 
 
-async def has_access_to_tenant(
+def has_access_to_tenant(
     tenant_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(has_admin_or_owner_role),
 ):
-    if await has_role("admin", db, user):
+    if has_role("admin", db, user):
+        return user
+    elif tenant_id in get_acl_snapshot(db, user.id).tenant_ids:
+        # owner or user role verification
         return user
-    else:  # owner or user role verification
-        count = (
-            db.query(tenant_models.tenants_and_users_table)
-            .filter(
-                tenant_models.tenants_and_users_table.c.tenant_id == tenant_id,
-                tenant_models.tenants_and_users_table.c.user_id == user.id,
-            )
-            .count()
-        )
-        if count == 1:
-            return user
 
     raise PermissionDenied()
 
 
-async def has_access_to_folder(
+def has_access_to_folder(
     folder_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
 ):
+    if not has_role("admin", db, user) and folder_id in (
+        get_acl_snapshot(db, user.id).folder_ids
+    ):
+        return user
+
+    # admins, unknown folders and folders created after the snapshot was compiled
     folder = (
         db.query(folder_models.Folder)
         .filter(folder_models.Folder.id == folder_id)
@@ -164,11 +178,11 @@ async def has_access_to_folder(
     if not folder:
         raise FolderNotFound()
 
-    if await has_access_to_tenant(folder.tenant_id, db, user):
+    if has_access_to_tenant(folder.tenant_id, db, user):
         return user
 
 
-async def has_access_to_tags(
+def has_access_to_tags(
     tags: List[tag_schemas.Tag],
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
@@ -186,36 +200,28 @@ async def has_access_to_tags(
     if tags:
         return user
 
-async def has_access_to_device_by_serial(
+def has_access_to_device_by_serial(
     serial_number: str,
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user)
 ) -> User:
-    return await has_access_to_device(device_id=serial_number, db=db, user=user)
+    return has_access_to_device(device_id=serial_number, db=db, user=user)
 
-async def has_access_to_device(
+def has_access_to_device(
     device_id: Union[str, int],
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
 ):
-    device = (
-        db.scalars(
-            select(device_models.Device).where(
-                or_(
-                    device_models.Device.id == device_id,
-                    device_models.Device.serial_number == device_id,
-                )
-            )
-        )
-    ).first()
-    if not device:
-        raise DeviceNotFound()
-
-    if await has_access_to_folder(device.folder_id, db, user):
+    device = resolve_device(db, device_id)
+    if not has_role("admin", db, user) and device.device_id in (
+        get_acl_snapshot(db, user.id).device_ids
+    ):
+        return user
+    if has_access_to_folder(device.folder_id, db, user):
         return user
 
 
-async def has_access_to_user(
+def has_access_to_user(
     user_id: int,
     db: Session = Depends(get_db),
     auth_user: User = Depends(get_current_active_user),
@@ -223,36 +229,36 @@ async def has_access_to_user(
     if auth_user.is_admin or int(user_id) == auth_user.id:
         return user_id
 
-    if await has_role("owner", db, auth_user):
+    if has_role("owner", db, auth_user):
         user = user_service.get_user(db, user_id)
         shared_tenants = (
             t_id in auth_user.get_tenants_ids() for t_id in user.get_tenants_ids()
         )
-        if any(shared_tenants) and not await has_role("admin", db, user):
+        if any(shared_tenants) and not has_role("admin", db, user):
             return user_id
     raise PermissionDenied()
 
 
-async def has_access_to_user_id(
+def has_access_to_user_id(
     user_id: Union[int, None],
     db: Session = Depends(get_db),
     auth_user: User = Depends(get_current_active_user),
 ):
-    if await has_access_to_user(user_id, db, auth_user):
+    if has_access_to_user(user_id, db, auth_user):
         return user_id
 
 
-async def can_edit_device(
+def can_edit_device(
     device_id: Union[str, int],
     db: Session = Depends(get_db),
     user: User = Depends(has_admin_or_owner_role),
 ):
-    return await has_access_to_device(device_id, db, user)
+    return has_access_to_device(device_id, db, user)
 
 
-async def can_edit_folder(
+def can_edit_folder(
     folder_id: int,
     db: Session = Depends(get_db),
     user: User = Depends(has_admin_or_owner_role),
 ):
-    return await has_access_to_folder(folder_id, db, user)
+    return has_access_to_folder(folder_id, db, user)
@@ -1,5 +1,5 @@
 from src.auth.constants import ErrorCode
-from src.exceptions import BadRequest, NotAuthenticated
+from src.exceptions import BadRequest, NotAuthenticated, ServiceUnavailable
 
 
 class IncorrectUserOrPassword(BadRequest):
@@ -28,3 +28,7 @@ class InvalidPasswordUpdateToken(NotAuthenticated):
 
 class InvalidEmailCredentials(NotAuthenticated):
     DETAIL = ErrorCode.EMAIL_AUTHENTICATION_REQUIRED
+
+
+class PasswordHasherBusy(ServiceUnavailable):
+    DETAIL = ErrorCode.PASSWORD_HASHER_BUSY
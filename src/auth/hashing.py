@@ -0,0 +1,92 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+from typing import Any, Callable, Dict
+from src.auth import exceptions
+
+load_dotenv()
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification in a bounded thread pool (bcrypt releases the
+    GIL), so a burst of logins neither blocks the event loop nor every worker thread.
+    At most `max_workers` hashes run at once and up to `max_pending` more wait for a
+    worker; beyond that callers are rejected with `PasswordHasherBusy`.
+    """
+
+    def __init__(
+        self,
+        context: CryptContext,
+        max_workers: int = 4,
+        max_pending: int = 64,
+    ):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+        self._completed = 0
+        self._rejected = 0
+        self._max_queued = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self._running,
+                "queued": self._queued,
+                "max_queued": self._max_queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def hash(self, password: str) -> str:
+        return self._submit(self.context.hash, password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._submit(
+            self.context.verify, plain_password, hashed_password
+        ).result()
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    async def verify_async(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(
+            self._submit(self.context.verify, plain_password, hashed_password)
+        )
+
+    def _submit(self, func: Callable[..., Any], *args: Any) -> Future:
+        with self._lock:
+            if self._queued >= self.max_pending:
+                self._rejected += 1
+                raise exceptions.PasswordHasherBusy(headers={"Retry-After": "1"})
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        return self._executor.submit(self._run, func, *args)
+
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+
+password_hasher = PasswordHasher(
+    CryptContext(schemes=["bcrypt"], deprecated="auto"),
+    max_workers=int(os.getenv("PASSWORD_HASHER_MAX_WORKERS", 4)),
+    max_pending=int(os.getenv("PASSWORD_HASHER_MAX_PENDING", 64)),
+)
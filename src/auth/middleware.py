@@ -1,25 +1,39 @@
-from contextvars import ContextVar
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
 from fastapi.responses import JSONResponse
-from src.auth.dependencies import get_current_user
+from src.auth.dependencies import authenticate_token
 from src.auth.exceptions import InvalidCredentials
-from src.database import get_db
+from src.database import AsyncSessionLocal
 from src.audit_mixin import _auth_user_ctx
 
 
-class AuthUserRequestContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        if (
-            "authorization" in request.headers.keys()
-            and "Bearer" in request.headers["authorization"]
-        ):
+class AuthUserRequestContextMiddleware:
+    """
+    Plain ASGI middleware: the user is resolved before calling the app, and the
+    response is passed through untouched (so streaming responses and context vars
+    work as usual).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        authorization = Headers(scope=scope).get("authorization", "")
+        if "Bearer" in authorization:
             try:
-                token = request.headers["authorization"].replace("Bearer ", "")
-                user = await get_current_user(token, next(get_db()))
-                _auth_user_ctx.set(user.id)
+                token = authorization.replace("Bearer ", "")
+                async with AsyncSessionLocal() as db:
+                    user = await authenticate_token(token, db)
             except InvalidCredentials as exc:
-                return JSONResponse(content=exc.detail, status_code=exc.status_code)
+                response = JSONResponse(content=exc.detail, status_code=exc.status_code)
+                await response(scope, receive, send)
+                return
+            # reused by get_current_user, so the token is decoded only once
+            scope.setdefault("state", {})["user"] = user
+            _auth_user_ctx.set(user.id)
 
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
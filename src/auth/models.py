@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import ForeignKey, Index, String
 from sqlalchemy.orm import mapped_column, Mapped
 from ..database import Base
 from ..audit_mixin import AuditMixin
@@ -10,11 +10,18 @@ class AuthRefreshToken(AuditMixin, Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("user.id", ondelete="CASCADE"))
-    serial_number: Mapped[str] = mapped_column(String(1000), nullable=True)
-    refresh_token: Mapped[str] = mapped_column(String(1000))
-    expires_at: Mapped[datetime] = mapped_column()
+    serial_number: Mapped[str] = mapped_column(String(255), nullable=True)
+    # sha256 of the refresh token: the token itself is never stored
+    token_digest: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    expires_at: Mapped[datetime] = mapped_column(index=True)
     valid: Mapped[bool] = mapped_column(default=True)
 
+    __table_args__ = (
+        Index(
+            "ix_auth_refresh_tokens_user_id_serial_number", "user_id", "serial_number"
+        ),
+    )
+
 
 class AuthPasswordRecoveryToken(AuditMixin, Base):
     __tablename__ = "auth_password_recovery_tokens"
@@ -22,4 +29,4 @@ class AuthPasswordRecoveryToken(AuditMixin, Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
     email: Mapped[str] = mapped_column(String(1000))
     recovery_token: Mapped[str] = mapped_column(String(1000))
-    expires_at: Mapped[datetime] = mapped_column()
+    expires_at: Mapped[datetime] = mapped_column(index=True)
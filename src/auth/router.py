@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from src.database import get_db
@@ -9,7 +10,7 @@ from src.user.schemas import User, UserCreate
 from src.user.service import check_username_exists, create_user, get_user
 from typing import Any, Dict, Optional, Union
 from src.auth.utils import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
     get_refresh_token_settings,
     create_connection_token,
@@ -49,7 +50,7 @@ async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
 ) -> LoginData:
-    user = authenticate_user(form_data.username, form_data.password, db)
+    user = await authenticate_user_async(form_data.username, form_data.password, db)
     refresh_token_value = await service.create_refresh_token(db, user.id, serial_number)
     response.set_cookie(**get_refresh_token_settings(refresh_token_value))
     device = get_device_by_serial_number(db, serial_number)
@@ -70,7 +71,10 @@ async def refresh_tokens(
 ):
     new_access_token = create_access_token(user)
     new_refresh_token = await service.create_refresh_token(
-        db, refresh_token.user_id, serial_number=refresh_token.serial_number
+        db,
+        refresh_token.user_id,
+        serial_number=refresh_token.serial_number,
+        refresh_token=refresh_token.refresh_token,
     )
     response.set_cookie(**get_refresh_token_settings(new_refresh_token))
 
@@ -126,7 +130,9 @@ async def device_login(
     if not device:
         raise device_exceptions.DeviceNotFound()
 
-    refresh_token_value = await service.create_refresh_token(db, user_id, serial_number)
+    refresh_token_value = await service.create_refresh_token(
+        db, user_id, serial_number, refresh_token
+    )
     response.set_cookie(**get_refresh_token_settings(refresh_token_value))
 
     return LoginData(
@@ -150,7 +156,10 @@ async def password_recovery(
     password_update_data: PasswordUpdateData,
     db: Session = Depends(get_db),
 ) -> PasswordUpdated:
-    return service.update_user_password(db, token, password_update_data)
+    # hashing the new password waits for the password hasher pool
+    return await run_in_threadpool(
+        service.update_user_password, db, token, password_update_data
+    )
 
 
 @router.post("/password-reset")
@@ -160,6 +169,10 @@ async def password_reset(
     db: Session = Depends(get_db),
 ) -> PasswordUpdated:
     if password_reset_data.user_id:
-        if not await has_access_to_user(password_reset_data.user_id, db, user):
+        if not await run_in_threadpool(
+            has_access_to_user, password_reset_data.user_id, db, user
+        ):
             raise PermissionDenied()
-    return service.reset_user_password(db, user, password_reset_data)
+    return await run_in_threadpool(
+        service.reset_user_password, db, user, password_reset_data
+    )
@@ -1,5 +1,5 @@
 import string
-from pydantic import BaseModel, HttpUrl, EmailStr
+from pydantic import BaseModel, Field, HttpUrl, EmailStr
 from typing import Optional, Union
 from datetime import datetime
 from src.user.schemas import User
@@ -10,8 +10,13 @@ class Token(BaseModel):
     refresh_token: str
 
 
-class TokenData(BaseModel):
-    username: Optional[str] = None
+class TokenClaims(BaseModel):
+    # compact claim set of access and refresh tokens, see utils.create_access_token
+    version: int = Field(alias="v")
+    user_id: int = Field(alias="sub")
+    serial_number: Optional[str] = Field(default=None, alias="sn")
+    expires_at: int = Field(alias="exp")
+    token_id: Optional[str] = Field(default=None, alias="jti")
 
 
 class ConnectionToken(BaseModel):
@@ -1,4 +1,5 @@
 import os
+import logging
 import string
 import random
 import datetime
@@ -9,6 +10,8 @@ from dotenv import load_dotenv
 from sqlalchemy import delete, select
 from sqlalchemy.orm import Session
 from src.auth import models, utils, exceptions, schemas, constants
+from src.database import SessionLocal
+from src.utils import delete_in_batches
 from src.auth.utils import (
     _is_valid_refresh_token,
     get_user_by_username,
@@ -24,6 +27,10 @@ from src.user.schemas import UserUpdate
 from src.user import exceptions as user_exceptions
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+TOKEN_SWEEP_INTERVAL_S = int(os.getenv("TOKEN_SWEEP_INTERVAL_S", 300))
+TOKEN_SWEEP_BATCH_SIZE = int(os.getenv("TOKEN_SWEEP_BATCH_SIZE", 1000))
 
 ALPHA_NUM = string.ascii_letters + string.digits
 
@@ -36,18 +43,20 @@ async def get_refresh_token(
     db: Session,
     refresh_token: str,
 ) -> Optional[models.AuthRefreshToken]:
-    db_refresh_token = (
-        db.query(models.AuthRefreshToken)
-        .filter(models.AuthRefreshToken.refresh_token == refresh_token)
-        .first()
+    # point lookup on the unique token_digest index
+    return db.scalar(
+        select(models.AuthRefreshToken).where(
+            models.AuthRefreshToken.token_digest
+            == utils.hash_refresh_token(refresh_token)
+        )
     )
-    return db_refresh_token
 
 
 async def delete_refresh_token(db: Session, refresh_token: str) -> None:
     db.execute(
         delete(models.AuthRefreshToken).where(
-            models.AuthRefreshToken.refresh_token == refresh_token
+            models.AuthRefreshToken.token_digest
+            == utils.hash_refresh_token(refresh_token)
         )
     )
     db.commit()
@@ -57,36 +66,46 @@ async def create_refresh_token(
     db: Session,
     user_id: int,
     serial_number: Optional[str] = None,
+    refresh_token: Optional[str] = None,
 ) -> str:
-    if not serial_number:
-        db_refresh_token = db.scalar(
-            select(models.AuthRefreshToken).where(
-                models.AuthRefreshToken.user_id == user_id
-            )
+    # only digests are stored, so a token can be handed back only when the client
+    # presents it (refresh and device login); otherwise a new one is issued.
+    if refresh_token:
+        db_refresh_token = await get_refresh_token(db, refresh_token)
+        if (
+            db_refresh_token
+            and db_refresh_token.user_id == user_id
+            and db_refresh_token.serial_number == serial_number
+            and _is_valid_refresh_token(db_refresh_token.expires_at)
+        ):
+            return refresh_token
+
+    # dropping the expired tokens of this user and device, using the
+    # (user_id, serial_number) index
+    db.execute(
+        delete(models.AuthRefreshToken).where(
+            models.AuthRefreshToken.user_id == user_id,
+            models.AuthRefreshToken.serial_number == serial_number
+            if serial_number
+            else models.AuthRefreshToken.serial_number.is_(None),
+            models.AuthRefreshToken.expires_at < datetime.datetime.now(datetime.UTC),
         )
-    else:
-        db_refresh_token = db.scalars(
-            select(models.AuthRefreshToken).where(
-                models.AuthRefreshToken.serial_number == serial_number
-            )
-        ).first()
-
-    if db_refresh_token:
-        if _is_valid_refresh_token(db_refresh_token.expires_at):
-            return db_refresh_token.refresh_token
-        else:
-            await delete_refresh_token(db, db_refresh_token.refresh_token)
+    )
 
     user = db.query(User).filter(User.id == user_id).first()
     expiration_minutes = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS")) * 24 * 60
+    # jti: tokens issued for the same user within the same second must still differ
     refresh_token = utils.create_access_token(
-        user=user, serial_number=serial_number, expiration_minutes=expiration_minutes
+        user=user,
+        serial_number=serial_number,
+        expiration_minutes=expiration_minutes,
+        token_id=generate_random_alphanum(),
     )
 
     db_refresh_token = models.AuthRefreshToken(
         user_id=user_id,
         serial_number=serial_number,
-        refresh_token=refresh_token,
+        token_digest=utils.hash_refresh_token(refresh_token),
         expires_at=datetime.datetime.now(datetime.UTC)
         + datetime.timedelta(days=int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS"))),
     )
@@ -97,11 +116,46 @@ async def create_refresh_token(
 
 async def expire_refresh_token(db: Session, refresh_token: str) -> None:
     db.query(models.AuthRefreshToken).filter(
-        models.AuthRefreshToken.refresh_token == refresh_token
+        models.AuthRefreshToken.token_digest == utils.hash_refresh_token(refresh_token)
     ).update(values={"valid": False, "expires_at": datetime.datetime.now(datetime.UTC)})
     db.commit()
 
 
+def sweep_expired_tokens(
+    db: Session, batch_size: int = TOKEN_SWEEP_BATCH_SIZE
+) -> Dict[str, int]:
+    now = datetime.datetime.now(datetime.UTC)
+    counts = {
+        "refresh_tokens": delete_in_batches(
+            db,
+            models.AuthRefreshToken,
+            models.AuthRefreshToken.expires_at < now,
+            batch_size=batch_size,
+        ),
+        "recovery_tokens": delete_in_batches(
+            db,
+            models.AuthPasswordRecoveryToken,
+            models.AuthPasswordRecoveryToken.expires_at < now,
+            batch_size=batch_size,
+        ),
+    }
+    logger.info(
+        "Deleted %(refresh_tokens)s expired refresh tokens and "
+        "%(recovery_tokens)s expired recovery tokens",
+        counts,
+    )
+    return counts
+
+
+def run_token_sweep() -> None:
+    # expired tokens are otherwise only deleted when the same user logs in again
+    db = SessionLocal()
+    try:
+        sweep_expired_tokens(db)
+    finally:
+        db.close()
+
+
 async def get_auth_data_from_token(db: Session, token: str) -> str:
     db_token = await get_refresh_token(db, token)
     if not db_token:
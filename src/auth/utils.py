@@ -1,37 +1,54 @@
 import os
+import time
 import datetime
 import pyotp
 import ssl
 import smtplib
 from fastapi import Depends
 from hashlib import sha256
-from pydantic import EmailStr
+from pydantic import EmailStr, ValidationError
 from dotenv import load_dotenv
-from sqlalchemy import select, delete, or_
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
 from typing import Any, Optional, Dict, Union
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose.exceptions import ExpiredSignatureError
+from src.cache import LRUCache
 from src.database import get_db
 from src.user import models as user_models
-from src.user import schemas as user_schemas
 from src.user import exceptions as user_exceptions
 from src.auth import exceptions
+from src.auth.hashing import password_hasher
 from src.auth.models import AuthPasswordRecoveryToken as RecoveryToken
 from src.auth import schemas as auth_schemas
 from src.device.models import Device
 from src.device import exceptions as device_exceptions
+from src.device.utils import resolve_device
 
 load_dotenv()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+TOKEN_CLAIMS_VERSION = 1
 
+# tokens -> TokenClaims, so the signature of a token already seen is not verified
+# again on every request; entries are dropped once the token expires.
+verified_token_cache = LRUCache(
+    max_size=int(os.getenv("VERIFIED_TOKEN_CACHE_MAX_SIZE", 10_000)),
+    ttl_s=float(os.getenv("VERIFIED_TOKEN_CACHE_TTL_S", 300)),
+)
+
+
+# bcrypt runs in the password hasher pool: these wait for it in the caller's thread,
+# the async variants are awaited from the event loop instead.
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_hasher.verify(plain_password, hashed_password)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hasher.verify_async(plain_password, hashed_password)
 
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
 
 
 def get_user_by_username(db: Session, username: str) -> user_models.User:
@@ -43,6 +60,10 @@ def get_user_by_username(db: Session, username: str) -> user_models.User:
     return user
 
 
+def get_user_by_id(db: Session, user_id: int) -> Optional[user_models.User]:
+    return db.get(user_models.User, user_id)
+
+
 def authenticate_user(username: str, password: str, db: Session = Depends(get_db)):
     user = get_user_by_username(db, username)
     if not verify_password(password, user.hashed_password):
@@ -50,6 +71,13 @@ def authenticate_user(username: str, password: str, db: Session = Depends(get_db
     return user
 
 
+async def authenticate_user_async(username: str, password: str, db: Session):
+    user = get_user_by_username(db, username)
+    if not await verify_password_async(password, user.hashed_password):
+        raise exceptions.IncorrectUserOrPassword()
+    return user
+
+
 def encode_access_token(data: dict, expires_delta: Optional[datetime.timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -67,13 +95,17 @@ def create_access_token(
     user: user_models.User,
     serial_number: Optional[str] = None,
     expiration_minutes: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES")),
+    token_id: Optional[str] = None,
 ):
-    serialized_user = user_schemas.User.model_validate(user).model_dump_json()
     access_token_expires = datetime.timedelta(minutes=expiration_minutes)
-    access_token = encode_access_token(
-        data={"sub": serialized_user, "sn": serial_number},
-        expires_delta=access_token_expires,
-    )
+    data = {
+        "v": TOKEN_CLAIMS_VERSION,
+        "sub": str(user.id),
+        "sn": serial_number,
+    }
+    if token_id:
+        data["jti"] = token_id
+    access_token = encode_access_token(data=data, expires_delta=access_token_expires)
     return access_token
 
 
@@ -99,13 +131,7 @@ def get_refresh_token_settings(
 
 
 def check_device_has_rustdesk_credentials(db: Session, device_id: Union[str, int]):
-    device = db.scalars(
-        select(Device).where(
-            or_(Device.id == device_id, Device.serial_number == device_id)
-        )
-    ).first()
-    if not device:
-        raise device_exceptions.DeviceNotFound()
+    device = db.get(Device, resolve_device(db, device_id).device_id)
     if not device.id_rust or not device.pass_rust:
         raise device_exceptions.DeviceCredentialsNotConfigured()
     return device
@@ -153,6 +179,10 @@ def create_connection_token(
     return conn_token
 
 
+def hash_refresh_token(refresh_token: str) -> str:
+    return sha256(refresh_token.encode()).hexdigest()
+
+
 def _is_valid_refresh_token(expires_at: datetime) -> bool:
     return datetime.datetime.now(datetime.UTC) <= expires_at.astimezone(datetime.UTC)
 
@@ -222,19 +252,35 @@ def send_email(receiver_email: str, message: str):
         server.sendmail(sender_email, receiver_email, message.encode("utf-8"))
 
 
-def parse_refresh_token(refresh_token: str) -> auth_schemas.RefreshToken:
+def decode_token(token: str) -> auth_schemas.TokenClaims:
+    claims = verified_token_cache.get(token)
+    if claims is not None:
+        if claims.expires_at <= time.time():
+            verified_token_cache.invalidate(token)
+            raise ExpiredSignatureError("Signature has expired.")
+        return claims
+
     payload = jwt.decode(
-        refresh_token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")]
+        token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")]
     )
-    user = user_schemas.User.model_validate_json(payload.get("sub"))
-    user_id = user.id
-    serial_number = payload.get("sn")
-    expires_at = datetime.datetime.fromtimestamp(payload.get("exp"))
+    try:
+        claims = auth_schemas.TokenClaims.model_validate(payload)
+    except ValidationError:
+        raise JWTError("Invalid claims.")
+    if claims.version != TOKEN_CLAIMS_VERSION:
+        raise JWTError("Unsupported claims version.")
+    verified_token_cache.set(token, claims)
+    return claims
+
+
+def parse_refresh_token(refresh_token: str) -> auth_schemas.RefreshToken:
+    claims = decode_token(refresh_token)
+    expires_at = datetime.datetime.fromtimestamp(claims.expires_at)
     valid = _is_valid_refresh_token(expires_at)
 
     return auth_schemas.RefreshToken(
-        user_id=user_id,
-        serial_number=serial_number,
+        user_id=claims.user_id,
+        serial_number=claims.serial_number,
         expires_at=expires_at,
         valid=valid,
         refresh_token=refresh_token,
@@ -5,4 +5,6 @@ class ErrorCode:
         "Las credenciales para la gestion remota del dispositivo son inválidas"
     )
     EXPIRED_SHARE_URL = "La URL provista ha expirado!"
-    INVALID_EXPIRATION_MINUTES = "Los minutos de expiración deben expresarse como enteros positivos o cero"
\ No newline at end of file
+    INVALID_EXPIRATION_MINUTES = "Los minutos de expiración deben expresarse como enteros positivos o cero"
+    HEARTBEAT_BUFFER_FULL = "El servidor está saturado, reintente el envío del heartbeat más tarde"
+    INVALID_HEARTBEAT_HISTORY_RANGE = "La fecha de inicio debe ser anterior a la fecha de fin"
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from sqlalchemy import Integer, cast, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+from src.database import SessionLocal
+from src.device.models import Device, DevicePresence, FolderDeviceCount
+from src.device.utils import online_status_clause
+from src.folder.models import Folder
+from src.tenant.models import TenantSettings
+
+load_dotenv()
+
+DEVICE_ONLINE_REFRESH_INTERVAL_S = int(os.getenv("DEVICE_ONLINE_REFRESH_INTERVAL_S", 30))
+COUNTED_DIMENSIONS = ("SO_name", "vendor_name")
+
+
+def refresh_folder_device_counts(
+    db: Session, folder_ids: Iterable[Optional[int]]
+) -> None:
+    # recomputes the counters of the given folders from their devices; the caller
+    # commits. Only the folders whose devices changed need it, their ancestors are
+    # summed on read.
+    folder_ids = list({f for f in folder_ids if f is not None})
+    if not folder_ids:
+        return
+    db.execute(
+        delete(FolderDeviceCount).where(FolderDeviceCount.folder_id.in_(folder_ids))
+    )
+    online = func.sum(cast(func.coalesce(DevicePresence.is_online, False), Integer))
+    dimensions = [("total", literal(""))] + [
+        (dimension, func.coalesce(getattr(Device, dimension), ""))
+        for dimension in COUNTED_DIMENSIONS
+    ]
+    for dimension, value in dimensions:
+        group_by = [Device.folder_id] if dimension == "total" else [Device.folder_id, value]
+        db.execute(
+            insert(FolderDeviceCount).from_select(
+                ["folder_id", "dimension", "value", "devices", "online"],
+                select(
+                    Device.folder_id,
+                    literal(dimension),
+                    value,
+                    func.count(Device.id),
+                    online,
+                )
+                .join(
+                    DevicePresence,
+                    DevicePresence.device_id == Device.id,
+                    isouter=True,
+                )
+                .where(Device.folder_id.in_(folder_ids))
+                .group_by(*group_by),
+            )
+        )
+
+
+def refresh_devices_online_status(db: Session, now: Optional[datetime] = None) -> int:
+    # flips DevicePresence.is_online for the devices that came online or went offline
+    # since the last run and refreshes the counters of their folders.
+    online = online_status_clause(now)
+    changed = db.execute(
+        select(DevicePresence.device_id, Device.folder_id, online.label("is_online"))
+        .join(Device, Device.id == DevicePresence.device_id)
+        .join(Folder, Folder.id == Device.folder_id, isouter=True)
+        .join(
+            TenantSettings, TenantSettings.tenant_id == Folder.tenant_id, isouter=True
+        )
+        .where(DevicePresence.is_online != online)
+    ).all()
+    if not changed:
+        return 0
+    db.execute(
+        update(DevicePresence),
+        [{"device_id": r.device_id, "is_online": r.is_online} for r in changed],
+    )
+    refresh_folder_device_counts(db, [r.folder_id for r in changed])
+    db.commit()
+    return len(changed)
+
+
+def run_device_online_refresh() -> None:
+    db = SessionLocal()
+    try:
+        refresh_devices_online_status(db)
+    finally:
+        db.close()
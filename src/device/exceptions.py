@@ -1,5 +1,5 @@
 from src.device.constants import ErrorCode
-from src.exceptions import NotFound, BadRequest
+from src.exceptions import NotFound, BadRequest, ServiceUnavailable
 
 
 class DeviceNotFound(NotFound):
@@ -20,3 +20,11 @@ class ExpiredShareDeviceURL(BadRequest):
 
 class InvalidExpirationMinutes(BadRequest):
     DETAIL = ErrorCode.INVALID_EXPIRATION_MINUTES
+
+
+class InvalidHeartbeatHistoryRange(BadRequest):
+    DETAIL = ErrorCode.INVALID_HEARTBEAT_HISTORY_RANGE
+
+
+class HeartbeatBufferFull(ServiceUnavailable):
+    DETAIL = ErrorCode.HEARTBEAT_BUFFER_FULL
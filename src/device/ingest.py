@@ -0,0 +1,237 @@
+import os
+import logging
+import threading
+import time
+from collections import deque
+from dotenv import load_dotenv
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DataError, DBAPIError, IntegrityError, OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Any, Dict, List, Optional
+from src.database import SessionLocal
+from src.device import models, exceptions
+from src.device.utils import upsert_device_presence
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_COLUMNS = ("device_id", "timestamp", "CPU_load", "MEM_load_mb", "free_space_mb")
+
+
+def write_heartbeats(db: Session, entries: List[Dict[str, Any]]) -> int:
+    if not entries:
+        return 0
+
+    # a single multi-row INSERT for the whole batch
+    rows = [{column: e.get(column) for column in HEARTBEAT_COLUMNS} for e in entries]
+    db.execute(insert(models.Heartbeat).values(rows))
+
+    # rustdesk credentials: only the latest pair received for each device is kept.
+    credentials = {}
+    for e in entries:
+        if e.get("id_rust") is not None and e.get("pass_rust") is not None:
+            credentials[e["device_id"]] = {
+                "id": e["device_id"],
+                "id_rust": e["id_rust"],
+                "pass_rust": e["pass_rust"],
+            }
+    if credentials:
+        db.execute(update(models.Device), list(credentials.values()))
+
+    upsert_device_presence(db, entries)
+    db.commit()
+    return len(rows)
+
+
+class HeartbeatBuffer:
+    """
+    Write-behind buffer for heartbeats. Entries are acknowledged as soon as they are
+    queued and a background thread writes them in batches, either when `batch_size`
+    entries are waiting or every `flush_interval_s` seconds. The queue is bounded by
+    `max_size`: when it is full, producers wait up to `put_timeout_s` (or not at all
+    with `block=False`, e.g. from the event loop) and are then rejected with
+    `HeartbeatBufferFull`. A batch of entries is either queued whole or rejected.
+    Batches that fail because the database is unavailable are put back in the queue
+    and retried with an exponential backoff, up to `max_retry_delay_s`.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        batch_size: int = 500,
+        flush_interval_s: float = 1.0,
+        put_timeout_s: float = 0.5,
+        max_retry_delay_s: float = 30.0,
+        session_factory: sessionmaker = SessionLocal,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.put_timeout_s = put_timeout_s
+        self.max_retry_delay_s = max_retry_delay_s
+        self.retry_delay_s = 0.0
+        self.session_factory = session_factory
+        self._entries: deque = deque()
+        self._not_full = threading.Condition()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="heartbeat-buffer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join()
+        self._thread = None
+        # writing whatever is left before shutting down
+        self.flush()
+        if self.size:
+            logger.error("Dropping %s heartbeats left in the buffer", self.size)
+
+    def put(self, entry: Dict[str, Any], block: bool = True) -> None:
+        self.put_many([entry], block)
+
+    def put_many(self, entries: List[Dict[str, Any]], block: bool = True) -> None:
+        # room for the whole batch is checked and taken under the same lock, so a
+        # rejected batch (which the client retries) leaves nothing behind.
+        with self._not_full:
+            deadline = time.monotonic() + self.put_timeout_s
+            while len(self._entries) + len(entries) > self.max_size:
+                remaining = deadline - time.monotonic()
+                if not block or remaining <= 0 or len(entries) > self.max_size:
+                    raise exceptions.HeartbeatBufferFull(headers={"Retry-After": "1"})
+                self._not_full.wait(remaining)
+            self._entries.extend(entries)
+            size = len(self._entries)
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def enqueue(self, db: Session, entry: Dict[str, Any], block: bool = True) -> None:
+        self.enqueue_many(db, [entry], block)
+
+    def enqueue_many(
+        self, db: Session, entries: List[Dict[str, Any]], block: bool = True
+    ) -> None:
+        # when the buffer is not running (e.g. outside the app lifespan) heartbeats are
+        # written straight away with the caller's session.
+        if not self.running:
+            write_heartbeats(db, entries)
+            return
+        self.put_many(entries, block)
+
+    def flush(self) -> int:
+        written = 0
+        with self._flush_lock:
+            # entries that could not be written because the database is unavailable
+            pending: List[Dict[str, Any]] = []
+            while not pending:
+                batch = self._drain(self.batch_size)
+                if not batch:
+                    break
+                written += self._write(batch, pending)
+            if pending:
+                self._requeue(pending)
+                self.retry_delay_s = min(
+                    max(self.retry_delay_s * 2, self.flush_interval_s),
+                    self.max_retry_delay_s,
+                )
+                logger.warning(
+                    "Database unavailable, retrying %s heartbeats in %ss",
+                    len(pending),
+                    self.retry_delay_s,
+                )
+            else:
+                self.retry_delay_s = 0.0
+        return written
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        with self._not_full:
+            batch = [
+                self._entries.popleft()
+                for _ in range(min(limit, len(self._entries)))
+            ]
+            if batch:
+                self._not_full.notify_all()
+        return batch
+
+    def _requeue(self, entries: List[Dict[str, Any]]) -> None:
+        # back at the front of the queue, as far as the room left by the producers in
+        # the meantime allows: the oldest entries are the ones dropped otherwise.
+        with self._not_full:
+            room = max(self.max_size - len(self._entries), 0)
+            kept = entries[-room:] if room else []
+            self._entries.extendleft(reversed(kept))
+        if len(kept) < len(entries):
+            logger.error(
+                "Dropping %s heartbeats, the buffer is full", len(entries) - len(kept)
+            )
+
+    def _write(
+        self, batch: List[Dict[str, Any]], pending: List[Dict[str, Any]]
+    ) -> int:
+        db = self.session_factory()
+        try:
+            return write_heartbeats(db, batch)
+        except (IntegrityError, DataError):
+            db.rollback()
+            if len(batch) == 1:
+                logger.exception(
+                    "Dropping a heartbeat of device %s", batch[0].get("device_id")
+                )
+                return 0
+        except Exception as e:
+            db.rollback()
+            if isinstance(e, OperationalError) or (
+                isinstance(e, DBAPIError) and e.connection_invalidated
+            ):
+                # e.g. a restart or a lock timeout: kept for the next attempt
+                pending.extend(batch)
+            else:
+                logger.exception("Dropping a batch of %s heartbeats", len(batch))
+            return 0
+        finally:
+            db.close()
+        # the batch holds bad entries (e.g. of a device deleted in the meantime):
+        # retrying each half on its own, so that they are dropped alone rather than
+        # with the rest of the batch.
+        middle = len(batch) // 2
+        written = self._write(batch[:middle], pending)
+        if pending:
+            pending.extend(batch[middle:])
+            return written
+        return written + self._write(batch[middle:], pending)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(timeout=self.flush_interval_s)
+            self._wakeup.clear()
+            self.flush()
+            if self.retry_delay_s:
+                self._stopping.wait(self.retry_delay_s)
+
+
+heartbeat_buffer = HeartbeatBuffer(
+    max_size=int(os.getenv("HEARTBEAT_BUFFER_MAX_SIZE", 10_000)),
+    batch_size=int(os.getenv("HEARTBEAT_BUFFER_BATCH_SIZE", 500)),
+    flush_interval_s=float(os.getenv("HEARTBEAT_BUFFER_FLUSH_INTERVAL_S", 1.0)),
+    put_timeout_s=float(os.getenv("HEARTBEAT_BUFFER_PUT_TIMEOUT_S", 0.5)),
+    max_retry_delay_s=float(os.getenv("HEARTBEAT_BUFFER_MAX_RETRY_DELAY_S", 30)),
+)
@@ -1,7 +1,7 @@
 import os
 from datetime import datetime, UTC, timedelta
-from sqlalchemy import ForeignKey, String, case
-from sqlalchemy.orm import relationship, mapped_column, Mapped
+from sqlalchemy import ForeignKey, Index, String, case, false
+from sqlalchemy.orm import relationship, mapped_column, object_session, Mapped
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.sql import func
 from typing import Optional
@@ -9,6 +9,7 @@ from ..database import Base
 from ..audit_mixin import AuditMixin
 from ..folder.models import Folder
 from ..entity.models import Entity
+from ..tenant.utils import get_cached_tenant_settings
 
 
 class Device(AuditMixin, Base):
@@ -39,8 +40,6 @@ class Device(AuditMixin, Base):
     vendor_model: Mapped[str] = mapped_column(String(255))
     vendor_cores: Mapped[int] = mapped_column()
     vendor_ram_gb: Mapped[int] = mapped_column()
-    share_url: Mapped[str] = mapped_column(String(255), nullable=True)
-    share_url_expires_at: Mapped[datetime] = mapped_column(nullable=True)
     serial_number: Mapped[Optional[str]] = mapped_column(
         String(255), nullable=True, unique=True
     )
@@ -50,6 +49,18 @@ class Device(AuditMixin, Base):
         cascade="all, delete-orphan",
         passive_deletes=True,
     )
+    share_links: Mapped[list["src.device.models.ShareLink"]] = relationship(
+        "src.device.models.ShareLink",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    presence: Mapped[Optional["src.device.models.DevicePresence"]] = relationship(
+        "src.device.models.DevicePresence",
+        uselist=False,
+        lazy="joined",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
 
     @property
     def tags(self):
@@ -64,10 +75,17 @@ class Device(AuditMixin, Base):
             return False
         if not self.folder.tenant:
             return False
-        if not self.heartbeats:
+        if not self.presence:
             return False
 
-        tenant_heartbeats_interval = self.folder.tenant.settings.heartbeat_s
+        tenant_settings = get_cached_tenant_settings(
+            object_session(self), self.folder.tenant_id
+        )
+        tenant_heartbeats_interval = (
+            tenant_settings.heartbeat_s
+            if tenant_settings
+            else int(os.getenv("HEARTBEAT_S"))
+        )
         # latest_heartbeat_timestamp = self.heartbeats[-1].timestamp
         diff_minutes = (
             datetime.now(UTC) - self.latest_heartbeat_timestamp.astimezone(UTC)
@@ -81,7 +99,7 @@ class Device(AuditMixin, Base):
 
     @property
     def latest_heartbeat_timestamp(self):
-        return self.heartbeats[-1].timestamp
+        return self.presence.last_heartbeat_at if self.presence else None
 
 
 class Heartbeat(Base):
@@ -91,4 +109,85 @@ class Heartbeat(Base):
     CPU_load: Mapped[Optional[int]] = mapped_column()
     MEM_load_mb: Mapped[Optional[int]] = mapped_column()
     free_space_mb: Mapped[Optional[int]] = mapped_column()
-    timestamp: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now())
+    timestamp: Mapped[datetime] = mapped_column(
+        default=func.now(), onupdate=func.now(), index=True
+    )
+
+    __table_args__ = (
+        Index("ix_heartbeat_logs_device_id_timestamp", "device_id", "timestamp"),
+    )
+
+
+class DevicePresence(Base):
+    # latest known state of a device, maintained when heartbeats are ingested so that
+    # online checks never have to read the heartbeat history.
+    __tablename__ = "device_presence"
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("device.id", ondelete="CASCADE"), primary_key=True
+    )
+    last_heartbeat_at: Mapped[datetime] = mapped_column(index=True)
+    CPU_load: Mapped[Optional[int]] = mapped_column()
+    MEM_load_mb: Mapped[Optional[int]] = mapped_column()
+    free_space_mb: Mapped[Optional[int]] = mapped_column()
+    credentials_updated_at: Mapped[Optional[datetime]] = mapped_column()
+    # online status as of the latest run of the device-online-refresh job, which is
+    # what the folder device counters are based on.
+    is_online: Mapped[bool] = mapped_column(default=False, server_default=false())
+
+
+class FolderDeviceCount(Base):
+    # devices directly assigned to a folder, and how many of them are online, overall
+    # (dimension "total", empty value) and per SO_name / vendor_name. Subtree totals
+    # are summed through folder_closure when read.
+    __tablename__ = "folder_device_counts"
+    folder_id: Mapped[int] = mapped_column(
+        ForeignKey("folder.id", ondelete="CASCADE"), primary_key=True
+    )
+    dimension: Mapped[str] = mapped_column(String(32), primary_key=True)
+    value: Mapped[str] = mapped_column(String(255), primary_key=True)
+    devices: Mapped[int] = mapped_column(default=0)
+    online: Mapped[int] = mapped_column(default=0)
+
+
+class ShareLink(Base):
+    # only the SHA-256 digest of the shared token is stored, which is what the link
+    # is looked up by.
+    __tablename__ = "share_links"
+    id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("device.id", ondelete="CASCADE"), index=True
+    )
+    token_digest: Mapped[str] = mapped_column(String(64), unique=True, index=True)
+    expires_at: Mapped[datetime] = mapped_column(index=True)
+    created_by: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("user.id", ondelete="SET NULL"), nullable=True
+    )
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+
+
+class HeartbeatRollupMixin:
+    # aggregated heartbeats of a device over the bucket starting at `bucket`.
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("device.id", ondelete="CASCADE"), primary_key=True
+    )
+    bucket: Mapped[datetime] = mapped_column(primary_key=True, index=True)
+    samples: Mapped[int] = mapped_column()
+    CPU_load_min: Mapped[Optional[int]] = mapped_column()
+    CPU_load_avg: Mapped[Optional[float]] = mapped_column()
+    CPU_load_max: Mapped[Optional[int]] = mapped_column()
+    MEM_load_mb_min: Mapped[Optional[int]] = mapped_column()
+    MEM_load_mb_avg: Mapped[Optional[float]] = mapped_column()
+    MEM_load_mb_max: Mapped[Optional[int]] = mapped_column()
+    free_space_mb_min: Mapped[Optional[int]] = mapped_column()
+    free_space_mb_avg: Mapped[Optional[float]] = mapped_column()
+    free_space_mb_max: Mapped[Optional[int]] = mapped_column()
+
+
+class HeartbeatRollupMinute(HeartbeatRollupMixin, Base):
+    __tablename__ = "heartbeat_rollups_1m"
+    bucket_s = 60
+
+
+class HeartbeatRollupHour(HeartbeatRollupMixin, Base):
+    __tablename__ = "heartbeat_rollups_1h"
+    bucket_s = 3600
@@ -0,0 +1,289 @@
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import ColumnElement, case, func, insert, or_, select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional, Tuple, Type
+from src.database import SessionLocal
+from src.device import models
+from src.folder.models import Folder
+from src.tenant.models import Tenant, TenantSettings
+from src.utils import delete_in_batches, time_bucket
+
+load_dotenv()
+
+ROLLUP_METRICS = ("CPU_load", "MEM_load_mb", "free_space_mb")
+ROLLUP_COLUMNS = ["device_id", "bucket", "samples"] + [
+    f"{metric}_{aggregate}"
+    for metric in ROLLUP_METRICS
+    for aggregate in ("min", "avg", "max")
+]
+
+HEARTBEAT_COMPACTION_INTERVAL_S = int(os.getenv("HEARTBEAT_COMPACTION_INTERVAL_S", 60))
+# heartbeats are written by the ingest buffer, so the latest minute is left alone
+# until late writes had the chance to land.
+HEARTBEAT_COMPACTION_GRACE_S = int(os.getenv("HEARTBEAT_COMPACTION_GRACE_S", 60))
+# upper bound on the time range rolled up in a single run (e.g. when catching up).
+HEARTBEAT_COMPACTION_MAX_WINDOW = timedelta(
+    hours=int(os.getenv("HEARTBEAT_COMPACTION_MAX_WINDOW_H", 24))
+)
+# raw heartbeats retention of the tenants without settings (and of the devices not
+# assigned to a tenant yet), as for new tenant settings.
+HEARTBEAT_RETENTION_DAYS = int(os.getenv("HEARTBEAT_RETENTION_DAYS", 30))
+HEARTBEAT_PURGE_BATCH_SIZE = int(os.getenv("HEARTBEAT_PURGE_BATCH_SIZE", 1000))
+HEARTBEAT_ROLLUP_1M_RETENTION_DAYS = int(
+    os.getenv("HEARTBEAT_ROLLUP_1M_RETENTION_DAYS", 30)
+)
+
+RollupModel = Type[models.HeartbeatRollupMixin]
+
+
+def floor_datetime(value: datetime, seconds: int) -> datetime:
+    return value - (value - datetime.min) % timedelta(seconds=seconds)
+
+
+def raw_aggregates() -> List[ColumnElement]:
+    aggregates = [func.count()]
+    for metric in ROLLUP_METRICS:
+        column = getattr(models.Heartbeat, metric)
+        aggregates += [func.min(column), func.avg(column), func.max(column)]
+    return aggregates
+
+
+def rollup_aggregates(source: RollupModel) -> List[ColumnElement]:
+    aggregates = [func.sum(source.samples)]
+    for metric in ROLLUP_METRICS:
+        avg = getattr(source, f"{metric}_avg")
+        # averages are weighted by the number of samples of each bucket
+        weighted_avg = func.sum(avg * source.samples) / func.sum(
+            case((avg.is_not(None), source.samples))
+        )
+        aggregates += [
+            func.min(getattr(source, f"{metric}_min")),
+            weighted_avg,
+            func.max(getattr(source, f"{metric}_max")),
+        ]
+    return aggregates
+
+
+def rollup(
+    db: Session,
+    target: RollupModel,
+    source: type,
+    timestamp: ColumnElement,
+    aggregates: List[ColumnElement],
+    until: datetime,
+) -> Optional[datetime]:
+    """
+    Aggregates the rows of `source` into the complete `target` buckets before `until`
+    that have not been rolled up yet. Returns the time up to which `source` has been
+    rolled up, or None when there is nothing to roll up at all.
+    """
+    last_bucket = db.scalar(select(func.max(target.bucket)))
+    pending = select(func.min(timestamp))
+    if last_bucket:
+        since = last_bucket + timedelta(seconds=target.bucket_s)
+        pending = pending.where(timestamp >= since)
+    # starting from the first row not rolled up yet rather than from the last bucket,
+    # so that gaps without rows (e.g. an outage) can't stall the rollup on an empty
+    # window.
+    first = db.scalar(pending)
+    if first is None:
+        return max(since, until) if last_bucket else None
+    since = floor_datetime(first, target.bucket_s)
+
+    until = min(until, since + HEARTBEAT_COMPACTION_MAX_WINDOW)
+    if since >= until:
+        return until
+
+    bucket = time_bucket(timestamp, target.bucket_s)
+    stmt = (
+        select(source.device_id, bucket, *aggregates)
+        .where(timestamp >= since, timestamp < until)
+        .group_by(source.device_id, bucket)
+    )
+    db.execute(insert(target).from_select(ROLLUP_COLUMNS, stmt))
+    db.commit()
+    return until
+
+
+def compact_heartbeats(
+    db: Session, now: Optional[datetime] = None
+) -> Tuple[Optional[datetime], Optional[datetime]]:
+    # raw heartbeats -> 1 minute buckets -> 1 hour buckets
+    now = now or datetime.now()
+    minutes_until = rollup(
+        db,
+        models.HeartbeatRollupMinute,
+        models.Heartbeat,
+        models.Heartbeat.timestamp,
+        raw_aggregates(),
+        floor_datetime(now - timedelta(seconds=HEARTBEAT_COMPACTION_GRACE_S), 60),
+    )
+    if minutes_until is None:
+        return None, None
+
+    hours_until = rollup(
+        db,
+        models.HeartbeatRollupHour,
+        models.HeartbeatRollupMinute,
+        models.HeartbeatRollupMinute.bucket,
+        rollup_aggregates(models.HeartbeatRollupMinute),
+        floor_datetime(minutes_until, 3600),
+    )
+    return minutes_until, hours_until
+
+
+def purge_heartbeats(
+    db: Session,
+    now: datetime,
+    minutes_until: Optional[datetime],
+    hours_until: Optional[datetime],
+) -> int:
+    deleted = 0
+
+    # raw heartbeats: per tenant retention, only once they have been rolled up
+    if minutes_until is not None:
+        retention_days = func.coalesce(
+            TenantSettings.heartbeat_retention_days, HEARTBEAT_RETENTION_DAYS
+        )
+        tenants = db.execute(
+            select(Tenant.id, retention_days).outerjoin(
+                TenantSettings, TenantSettings.tenant_id == Tenant.id
+            )
+        ).all()
+        tenant_ids = defaultdict(list)
+        for tenant_id, days in tenants:
+            tenant_ids[days].append(tenant_id)
+        # devices not assigned to a folder yet have no tenant (nor settings)
+        tenant_ids.setdefault(HEARTBEAT_RETENTION_DAYS, [])
+
+        for days, ids in tenant_ids.items():
+            in_tenants = Folder.tenant_id.in_(ids)
+            if days == HEARTBEAT_RETENTION_DAYS:
+                in_tenants = or_(in_tenants, models.Device.folder_id.is_(None))
+            devices = select(models.Device.id).outerjoin(Folder).where(in_tenants)
+            deleted += delete_in_batches(
+                db,
+                models.Heartbeat,
+                models.Heartbeat.device_id.in_(devices),
+                models.Heartbeat.timestamp
+                < min(now - timedelta(days=days), minutes_until),
+                batch_size=HEARTBEAT_PURGE_BATCH_SIZE,
+            )
+
+    # 1 minute rollups: once they have been rolled up into hours
+    if hours_until is not None:
+        deleted += delete_in_batches(
+            db,
+            models.HeartbeatRollupMinute,
+            models.HeartbeatRollupMinute.bucket
+            < min(
+                now - timedelta(days=HEARTBEAT_ROLLUP_1M_RETENTION_DAYS), hours_until
+            ),
+            batch_size=HEARTBEAT_PURGE_BATCH_SIZE,
+        )
+
+    return deleted
+
+
+def merge_points(point: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    # combining the partial aggregates of the same bucket coming from two sources
+    merged = {"timestamp": point["timestamp"]}
+    merged["samples"] = point["samples"] + other["samples"]
+    for metric in ROLLUP_METRICS:
+        values = {}
+        for aggregate in ("min", "avg", "max"):
+            column = f"{metric}_{aggregate}"
+            values[aggregate] = [
+                p[column] for p in (point, other) if p[column] is not None
+            ]
+        merged[f"{metric}_min"] = min(values["min"], default=None)
+        merged[f"{metric}_max"] = max(values["max"], default=None)
+        weights = [
+            p["samples"] for p in (point, other) if p[f"{metric}_avg"] is not None
+        ]
+        merged[f"{metric}_avg"] = (
+            sum(avg * w for avg, w in zip(values["avg"], weights)) / sum(weights)
+            if weights
+            else None
+        )
+    return merged
+
+
+def aggregate_heartbeats(
+    db: Session, device_id: int, since: datetime, until: datetime, step: int
+) -> List[Dict[str, Any]]:
+    """
+    Heartbeats of a device in [since, until) aggregated into `step` seconds buckets.
+    The coarsest table whose buckets fit in `step` is read, and the most recent
+    stretch that has not been rolled up yet is completed from the finer tables.
+    """
+    sources = [
+        (models.HeartbeatRollupHour, rollup_aggregates(models.HeartbeatRollupHour)),
+        (models.HeartbeatRollupMinute, rollup_aggregates(models.HeartbeatRollupMinute)),
+        (models.Heartbeat, raw_aggregates()),
+    ]
+    sources = [
+        (source, aggregates)
+        for source, aggregates in sources
+        if step % getattr(source, "bucket_s", 1) == 0
+    ]
+
+    points = {}
+    start = since
+    for source, aggregates in sources:
+        if source is models.Heartbeat:
+            timestamp, end = models.Heartbeat.timestamp, until
+        else:
+            last_bucket = db.scalar(select(func.max(source.bucket)))
+            if last_bucket is None:
+                continue
+            timestamp = source.bucket
+            end = min(until, last_bucket + timedelta(seconds=source.bucket_s))
+        if start >= end:
+            continue
+
+        bucket = time_bucket(timestamp, step).label("timestamp")
+        rows = db.execute(
+            select(
+                bucket,
+                *[
+                    aggregate.label(column)
+                    for column, aggregate in zip(ROLLUP_COLUMNS[2:], aggregates)
+                ],
+            )
+            .where(source.device_id == device_id, timestamp >= start, timestamp < end)
+            .group_by(bucket)
+            .order_by(bucket)
+        ).all()
+        for row in rows:
+            point = {
+                column: (
+                    float(value)
+                    if column.endswith("_avg") and value is not None
+                    else value
+                )
+                for column, value in row._asdict().items()
+            }
+            previous = points.get(point["timestamp"])
+            points[point["timestamp"]] = (
+                merge_points(previous, point) if previous else point
+            )
+
+        start = end
+        if start >= until:
+            break
+
+    return [points[timestamp] for timestamp in sorted(points)]
+
+
+def run_heartbeat_compaction() -> None:
+    db = SessionLocal()
+    try:
+        now = datetime.now()
+        minutes_until, hours_until = compact_heartbeats(db, now)
+        purge_heartbeats(db, now, minutes_until, hours_until)
+    finally:
+        db.close()
@@ -1,9 +1,11 @@
 import os
-from fastapi import Depends, APIRouter, HTTPException, Path, Query
+from datetime import datetime
+from fastapi import Body, Depends, APIRouter, HTTPException, Path, Query
 from fastapi.responses import RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi_pagination.ext.sqlalchemy import paginate
-from typing import List, Union
+from typing import Annotated, List, Optional, Union
 from src.auth.dependencies import (
     get_current_active_user,
     has_admin_role,
@@ -21,9 +23,11 @@ from src.auth.utils import (
 from src.auth.schemas import ConnectionUrl
 from src.user.schemas import User
 from src.tenant.router import router as tenant_router
-from src.database import get_db
+from src.database import get_db, get_async_db
 from src.device import service, schemas, utils, models, exceptions
-from src.utils import CustomBigPage
+from src.utils import KeysetPage
+
+HEARTBEAT_BATCH_MAX_SIZE = int(os.getenv("HEARTBEAT_BATCH_MAX_SIZE", 1000))
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 alt_router = APIRouter(prefix="/serials", tags=["serials"])  # compatibilidad para SIA
@@ -49,16 +53,13 @@ def connect_to_shared_device(id: str, db: Session = Depends(get_db)):
     return RedirectResponse(redirect_url)
 
 
-@router.get("/unassigned", response_model=CustomBigPage[schemas.Device])
-def get_unassigned_devices(
-    db: Session = Depends(get_db), user: User = Depends(has_admin_or_owner_role)
+@router.get("/unassigned", response_model=KeysetPage[schemas.Device])
+async def get_unassigned_devices(
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(has_admin_or_owner_role),
 ):
-    unassigned_devices = service.get_unassigned_devices(db)
-    return paginate(
-        db,
-        unassigned_devices,
-        transformer=lambda devices: service.device_transformer(db, devices),
-    )
+    devices = await db.run_sync(service.get_unassigned_devices)
+    return await paginate(db, devices)
 
 
 @alt_router.get("/{serial_number}", response_model=schemas.Device)
@@ -76,24 +77,17 @@ def read_device(
     db: Session = Depends(get_db),
     user: User = Depends(has_access_to_device),
 ):
-    if str(device_id).isdigit():
-        return service.get_device(db, device_id=device_id)
-    device = utils.get_device_by_serial_number(db, serial_number=device_id)
-    if not device:
-        raise exceptions.DeviceNotFound()
-    return device
+    device = utils.resolve_device(db, device_id)
+    return service.get_device(db, device_id=device.device_id)
 
 
-@router.get("/", response_model=CustomBigPage[schemas.DeviceList])
-def read_devices(
-    db: Session = Depends(get_db),
+@router.get("/", response_model=KeysetPage[schemas.DeviceList])
+async def read_devices(
+    db: AsyncSession = Depends(get_async_db),
     user: User = Depends(get_current_active_user),
 ):
-    return paginate(
-        db,
-        service.get_devices(db, user.id),
-        transformer=lambda devices: service.device_transformer(db, devices),
-    )
+    devices = await db.run_sync(service.get_devices, user.id)
+    return await paginate(db, devices)
 
 
 @router.patch("/{device_id}", response_model=schemas.Device)
@@ -128,16 +122,16 @@ def delete_device(
 
 
 @alt_router.get("/{serial_number}/connect", response_model=ConnectionUrl)
-async def connect_with_serial_number(
+def connect_with_serial_number(
     serial_number: str,
     db: Session = Depends(get_db),
     user: User = Depends(has_access_to_device_by_serial),
 ):
-    return await connect(serial_number, db)
+    return connect(serial_number, db)
 
 
 @router.get("/{device_id}/connect", response_model=ConnectionUrl)
-async def connect(
+def connect(
     device_id: Union[str, int],
     db: Session = Depends(get_db),
     desktop_mode: bool = False,
@@ -151,15 +145,32 @@ async def connect(
     return {"url": url}
 
 @router.post("/{device_id}/heartbeat", response_model=schemas.HeartBeatResponse)
-def update_heartbeat(
+async def update_heartbeat(
     device_id: Union[str, int],
     heartbeat: schemas.HeartBeat,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    device_status = service.update_device_heartbeat(db, device_id, heartbeat)
+    # the service runs on the async session's connection without leaving the event
+    # loop, so a full ingest buffer must not make it wait.
+    device_status = await db.run_sync(
+        service.update_device_heartbeat, device_id, heartbeat, block=False
+    )
     return device_status
 
 
+@router.post(
+    "/heartbeats:batch", response_model=List[schemas.HeartBeatBatchResponse]
+)
+async def update_heartbeats(
+    heartbeats: Annotated[
+        List[schemas.HeartBeatBatchItem],
+        Body(max_length=HEARTBEAT_BATCH_MAX_SIZE),
+    ],
+    db: AsyncSession = Depends(get_async_db),
+):
+    return await db.run_sync(service.update_devices_heartbeats, heartbeats, block=False)
+
+
 @router.post("/{device_id}/share", response_model=schemas.ShareDeviceURL)
 def share_device(
     device_id: Union[str, int],
@@ -179,10 +190,14 @@ def revoke_share_url(
     return service.revoke_share_url(db, device_id)
 
 
-# @router.get("/{device_id:int}/heartbeats")
-# def get_device_heartbeats(
-#     device_id: int,
-#     db: Session = Depends(get_db),
-#     user: User = Depends(has_access_to_device),
-# ):
-#     return service.read_device_heartbeats(db, device_id)
+@router.get("/{device_id}/heartbeats", response_model=schemas.HeartBeatHistory)
+def get_device_heartbeats(
+    device_id: Union[str, int],
+    since: Optional[datetime] = Query(None, alias="from"),
+    until: Optional[datetime] = Query(None, alias="to"),
+    step: Optional[int] = Query(None, ge=1, description="Seconds between points"),
+    db: Session = Depends(get_db),
+    user: User = Depends(has_access_to_device),
+):
+    db_device = read_device(device_id, db)
+    return service.read_device_heartbeats(db, db_device.id, since, until, step)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Union
 from src.tag.schemas import Tag
 
@@ -34,8 +34,6 @@ class Device(DeviceCreate):
     entity_id: int
     is_online: bool
     tags: List[Tag] = []
-    share_url: Optional[str] = None
-    share_url_expires_at: Optional[datetime] = None
 
     model_config = {"from_attributes": True, "extra": "ignore"}
 
@@ -49,8 +47,6 @@ class DeviceList(BaseModel):
     pass_rust: Optional[str] = None
     tags: List[Tag] = []
     heartbeat_timestamp: Optional[datetime] = None
-    share_url: Optional[str] = None
-    share_url_expires_at: Optional[datetime] = None
     serial_number: Optional[str] = None
 
     model_config = {"from_attributes": True}
@@ -69,8 +65,6 @@ class DeviceUpdate(DeviceCreate):
     vendor_cores: Optional[int] = None
     vendor_ram_gb: Optional[int] = None
     tags: Optional[List[Tag]] = []
-    share_url: Optional[str] = None
-    share_url_expires_at: Optional[datetime] = None
     time_zone: Optional[str] = None
 
     model_config = {"extra": "ignore"}
@@ -92,12 +86,45 @@ class HeartBeat(BaseModel):
     model_config = {"extra": "ignore"}
 
 
+class HeartBeatBatchItem(HeartBeat):
+    device_id: Union[int, str]  # id or serial number
+
+
 class HeartBeatResponse(BaseModel):
     device_id: int
     timestamp: datetime
     heartbeat_s: int  # seconds between messages
 
 
+class HeartBeatBatchResponse(BaseModel):
+    device_id: Union[int, str]  # the key sent when the device was not found
+    timestamp: Optional[datetime] = None
+    heartbeat_s: Optional[int] = None  # seconds between messages
+    detail: Optional[str] = None  # why the heartbeat was rejected
+
+
+class HeartBeatPoint(BaseModel):
+    timestamp: datetime  # start of the bucket
+    samples: int
+    CPU_load_min: Optional[int] = None
+    CPU_load_avg: Optional[float] = None
+    CPU_load_max: Optional[int] = None
+    MEM_load_mb_min: Optional[int] = None
+    MEM_load_mb_avg: Optional[float] = None
+    MEM_load_mb_max: Optional[int] = None
+    free_space_mb_min: Optional[int] = None
+    free_space_mb_avg: Optional[float] = None
+    free_space_mb_max: Optional[int] = None
+
+
+class HeartBeatHistory(BaseModel):
+    device_id: int
+    since: datetime = Field(serialization_alias="from")
+    until: datetime = Field(serialization_alias="to")
+    step: int  # seconds between points
+    points: List[HeartBeatPoint] = []
+
+
 class ShareParams(BaseModel):
     expiration_minutes: int
 
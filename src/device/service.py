@@ -1,20 +1,30 @@
+import math
 import os
 import time
 from datetime import datetime, timedelta, UTC
 from jose import JWTError, jwt
 from jose.exceptions import ExpiredSignatureError
-from typing import Optional, Union, Sequence
-from sqlalchemy import select, update, insert
+from typing import List, Optional, Union, Sequence
+from sqlalchemy import Select, delete, func, or_, select, update, insert
 from sqlalchemy.orm import Session
+from src.auth.acl import bump_acl_version_on_move
 from src.auth.utils import create_otp, create_connection_url
+from src.database import SessionLocal
 from src.device import schemas, models, exceptions, utils
+from src.device.counters import refresh_folder_device_counts
+from src.device.ingest import heartbeat_buffer
+from src.device.rollups import aggregate_heartbeats
 from src.entity.service import create_entity_auto, update_entity_tags
 from src.folder.models import Folder
 from src.folder.service import check_folder_exist, get_folders, get_root_folder
 from src.tenant.models import tenants_and_users_table, TenantSettings
 from src.tenant.service import get_tenant_settings
-from src.tenant.utils import filter_tag_ids
+from src.tenant.utils import filter_tag_ids, get_cached_tenant_settings
 from src.user.service import get_user
+from src.utils import delete_in_batches
+
+HEARTBEAT_HISTORY_MAX_POINTS = int(os.getenv("HEARTBEAT_HISTORY_MAX_POINTS", 1000))
+SHARE_URL_EXPIRY_INTERVAL_S = int(os.getenv("SHARE_URL_EXPIRY_INTERVAL_S", 60))
 
 
 def check_device_name_taken(
@@ -28,73 +38,79 @@ def check_device_name_taken(
             raise exceptions.DeviceNameTaken()
 
 
-def expire_invalid_share_urls(db: Session, device_id: Union[int, None] = None) -> None:
-    update_stmt = (
-        update(models.Device)
-        .where(models.Device.share_url.is_not(None))
-        .where(models.Device.share_url_expires_at < datetime.now())
-    )
+def expire_invalid_share_urls(db: Session, device_id: Union[int, None] = None) -> int:
+    criteria = [models.ShareLink.expires_at < datetime.now()]
     if device_id:
-        update_stmt = update_stmt.where(models.Device.id == device_id)
+        criteria.append(models.ShareLink.device_id == device_id)
+    return delete_in_batches(db, models.ShareLink, *criteria)
 
-    db.execute(update_stmt.values(share_url=None, share_url_expires_at=None))
-    db.commit()
+
+def run_share_url_expiry() -> None:
+    # expired share links are deleted by a periodic job, reads only ignore them.
+    db = SessionLocal()
+    try:
+        expire_invalid_share_urls(db)
+    finally:
+        db.close()
 
 
 def get_device(db: Session, device_id: int) -> models.Device:
-    expire_invalid_share_urls(db, device_id=device_id)
-    device = db.query(models.Device).filter(models.Device.id == device_id).first()
+    # the row is read anyway, so an instance already in the session is refreshed
+    # with it (e.g. its presence, written by the heartbeat ingest).
+    device = (
+        db.query(models.Device)
+        .filter(models.Device.id == device_id)
+        .populate_existing()
+        .first()
+    )
     if not device:
         raise exceptions.DeviceNotFound()
     return device
 
 
-def get_devices(db: Session, user_id: int):
-    expire_invalid_share_urls(db)
+def with_online_status(devices: Select) -> Select:
+    # device listings are a single statement: the latest heartbeat comes from
+    # device_presence and the online status is computed in SQL, per row.
+    return (
+        devices.with_only_columns(
+            *models.Device.__table__.columns,
+            # creating an alias that matches the schema attr.
+            models.DevicePresence.last_heartbeat_at.label("heartbeat_timestamp"),
+            utils.online_status_clause().label("is_online"),
+        )
+        .join(Folder, models.Device.folder_id == Folder.id, isouter=True)
+        .join(
+            TenantSettings, TenantSettings.tenant_id == Folder.tenant_id, isouter=True
+        )
+        .join(models.DevicePresence, isouter=True)
+        .order_by(models.Device.id)
+    )
+
+
+def get_devices(db: Session, user_id: int) -> Select:
     user = get_user(db, user_id)
     if user.is_admin:
         devices = select(models.Device)
     else:
-        device_ids = user.get_device_ids()
-        devices = select(models.Device).where(models.Device.id.in_(device_ids))
-
-    latest_heartbeat = (
-        select(models.Heartbeat)
-        .order_by(models.Heartbeat.timestamp.desc())
-        .limit(1)
-        .subquery()
-    )
-    stmt = (
-        devices.add_columns(
-            latest_heartbeat.c.timestamp.label("heartbeat_timestamp")
-        )  # creating an alias that matches the schema attr.
-        .join(latest_heartbeat, isouter=True)
-        .group_by(models.Device.id)
-    )
+        # semi-join on the user's tenant membership instead of binding every device id
+        folder_ids = (
+            select(Folder.id)
+            .join(
+                tenants_and_users_table,
+                tenants_and_users_table.c.tenant_id == Folder.tenant_id,
+            )
+            .where(tenants_and_users_table.c.user_id == user.id)
+        )
+        devices = select(models.Device).where(models.Device.folder_id.in_(folder_ids))
 
-    return stmt.select()
+    return with_online_status(devices)
 
 
-def get_unassigned_devices(db: Session):
-    expire_invalid_share_urls(db)
+def get_unassigned_devices(db: Session) -> Select:
     folder_id = db.scalar(select(Folder.id).where(Folder.tenant_id == 1))
     devices = select(models.Device).where(models.Device.folder_id == folder_id)
 
-    latest_heartbeat = (
-        select(models.Heartbeat)
-        .order_by(models.Heartbeat.timestamp.desc())
-        .limit(1)
-        .subquery()
-    )
-    stmt = (
-        devices.add_columns(
-            latest_heartbeat.c.timestamp.label("heartbeat_timestamp")
-        )  # creating an alias that matches the schema attr.
-        .join(latest_heartbeat, isouter=True)
-        .group_by(models.Device.id)
-    )
-
-    return stmt.select()
+    return with_online_status(devices)
 
 
 def get_device_by_name(db: Session, device_name: str):
@@ -113,6 +129,8 @@ def create_device(db: Session, device: schemas.DeviceCreate):
     entity = create_entity_auto(db)
     db_device = models.Device(**device.model_dump(), entity_id=entity.id)
     db.add(db_device)
+    db.flush()
+    refresh_folder_device_counts(db, [db_device.folder_id])
     db.commit()
     db.refresh(db_device)
     return db_device
@@ -138,55 +156,117 @@ def update_device(
             tag_ids=tag_ids,
         )
         db.commit()
+    previous_folder_id = device.folder_id
+    previous_tenant_id = device.folder.tenant_id if device.folder else None
     db.execute(
         update(models.Device).where(models.Device.id == device.id).values(values)
     )
+    if values.keys() & {"folder_id", "SO_name", "vendor_name"}:
+        refresh_folder_device_counts(
+            db, [previous_folder_id, values.get("folder_id", previous_folder_id)]
+        )
+    if "folder_id" in values:
+        bump_acl_version_on_move(
+            db,
+            [previous_tenant_id],
+            db.scalar(select(Folder.tenant_id).where(Folder.id == values["folder_id"])),
+        )
     db.commit()
+    utils.invalidate_device_ref(device.id, device.serial_number)
     db.refresh(device)
     return device
 
 
 def update_device_heartbeat(
-    db: Session, device_id: Union[str, int], heartbeat: schemas.HeartBeat
+    db: Session,
+    device_id: Union[str, int],
+    heartbeat: schemas.HeartBeat,
+    block: bool = True,
 ):
     # sanity checks
     values = heartbeat.model_dump(exclude_none=True)
-    id_rust = values.pop("id_rust", None)
-    pass_rust = values.pop("pass_rust", None)
-    if not str(device_id).isdigit():
-        device = utils.get_device_by_serial_number(db, device_id)
-        device_id = device.id
+    device = utils.resolve_device(db, device_id)
 
+    # the heartbeat (and rustdesk credentials, if any) is written by the ingest buffer
     timestamp = datetime.now()
-    db.execute(
-        insert(models.Heartbeat).values(
-            {"device_id": device_id, "timestamp": timestamp, **values}
-        ),
+    heartbeat_buffer.enqueue(
+        db, {"device_id": device.device_id, "timestamp": timestamp, **values}, block
     )
-    db.commit()
-
-    if id_rust is not None and pass_rust is not None:
-        # the attributes are not valid when equal to None so no modification is done.
-        device_update = schemas.DeviceUpdate(id_rust=id_rust, pass_rust=pass_rust)
-        db.execute(
-            update(models.Device)
-            .where(models.Device.id == device_id)
-            .values(**device_update.model_dump(exclude_unset=True))
-        )
-        db.commit()
 
     # updating heartbeat frequency according to tenant settings
-    db_device: models.Device = db.scalar(
-        select(models.Device).where(models.Device.id == device_id)
-    )
-    tenant_settings = get_tenant_settings(db, db_device.folder.tenant_id)
+    tenant_settings = get_cached_tenant_settings(
+        db, device.tenant_id
+    ) or get_tenant_settings(db, device.tenant_id)
     return schemas.HeartBeatResponse(
-        device_id=device_id,
+        device_id=device.device_id,
         timestamp=timestamp,
         heartbeat_s=tenant_settings.heartbeat_s,
     )
 
 
+def update_devices_heartbeats(
+    db: Session, heartbeats: List[schemas.HeartBeatBatchItem], block: bool = True
+) -> List[schemas.HeartBeatBatchResponse]:
+    # every device is resolved, along with its tenant settings, in a single query.
+    # one response per heartbeat, in order: those of unknown devices are rejected
+    # with a detail instead of failing the whole batch.
+    device_ids = [int(h.device_id) for h in heartbeats if str(h.device_id).isdigit()]
+    serial_numbers = [
+        str(h.device_id) for h in heartbeats if not str(h.device_id).isdigit()
+    ]
+    rows = db.execute(
+        select(
+            models.Device.id,
+            models.Device.serial_number,
+            func.coalesce(TenantSettings.heartbeat_s, int(os.getenv("HEARTBEAT_S"))),
+        )
+        .join(Folder, isouter=True)
+        .join(
+            TenantSettings, TenantSettings.tenant_id == Folder.tenant_id, isouter=True
+        )
+        .where(
+            or_(
+                models.Device.id.in_(device_ids),
+                models.Device.serial_number.in_(serial_numbers),
+            )
+        )
+    ).all()
+    devices = {}
+    for device_id, serial_number, heartbeat_s in rows:
+        devices[str(device_id)] = (device_id, heartbeat_s)
+        if serial_number is not None:
+            devices[serial_number] = (device_id, heartbeat_s)
+
+    timestamp = datetime.now()
+    entries, responses = [], []
+    for heartbeat in heartbeats:
+        if str(heartbeat.device_id) not in devices:
+            responses.append(
+                schemas.HeartBeatBatchResponse(
+                    device_id=heartbeat.device_id,
+                    detail=exceptions.DeviceNotFound.DETAIL,
+                )
+            )
+            continue
+        device_id, heartbeat_s = devices[str(heartbeat.device_id)]
+        entries.append(
+            {
+                "device_id": device_id,
+                "timestamp": timestamp,
+                **heartbeat.model_dump(exclude_none=True, exclude={"device_id"}),
+            }
+        )
+        responses.append(
+            schemas.HeartBeatBatchResponse(
+                device_id=device_id, timestamp=timestamp, heartbeat_s=heartbeat_s
+            )
+        )
+
+    # written with a single multi-row INSERT (or queued in the ingest buffer)
+    heartbeat_buffer.enqueue_many(db, entries, block)
+    return responses
+
+
 def delete_device(db: Session, db_device: schemas.Device):
     # sanity check
     get_device(db, db_device.id)
@@ -210,7 +290,7 @@ def format_expiration_date(expiration_date: datetime) -> datetime:
     return datetime.strptime(expiration_date.strftime(date_format), date_format)
 
 
-def create_share_url(
+def create_share_token(
     user_id: int, device_id: Union[str, int], expiration_minutes: int
 ) -> tuple[str, datetime]:
     expiration_minutes = (
@@ -230,8 +310,20 @@ def create_share_url(
     share_hash = jwt.encode(
         to_encode, os.getenv("SECRET_KEY"), algorithm=os.getenv("ALGORITHM")
     )
-    share_url = f"{os.getenv(f"DEVICE_SHARE_URL_BASE_{os.getenv("ENV")}")}/devices/shared?id={share_hash}"
-    return share_url, expiration_dt
+    return share_hash, expiration_dt
+
+
+def get_share_url(share_hash: str) -> str:
+    return f"{os.getenv(f"DEVICE_SHARE_URL_BASE_{os.getenv("ENV")}")}/devices/shared?id={share_hash}"
+
+
+def create_share_url(
+    user_id: int, device_id: Union[str, int], expiration_minutes: int
+) -> tuple[str, datetime]:
+    share_hash, expiration_dt = create_share_token(
+        user_id, device_id, expiration_minutes
+    )
+    return get_share_url(share_hash), expiration_dt
 
 
 def share_device(
@@ -245,99 +337,106 @@ def share_device(
     if expiration_minutes < 0:
         raise exceptions.InvalidExpirationMinutes()
 
-    # updating device attributes (share_url + share exp time)
-    if str(device_id).isdigit():
-        device = get_device(db, device_id)
-    else:
-        device = utils.get_device_by_serial_number(db, device_id)
+    device = get_device(db, utils.resolve_device(db, device_id).device_id)
 
     if not device.id_rust or not device.pass_rust:
         raise exceptions.DeviceCredentialsNotConfigured()
 
-    # creating share_url with the corresponding response schema
-    share_url, expiration_dt = create_share_url(user_id, device_id, expiration_minutes)
-    device = update_device(
-        db,
-        device,
-        schemas.DeviceUpdate(
-            share_url=share_url,
-            share_url_expires_at=expiration_dt,
-            tags=device.tags,
-        ),
+    # every share creates its own link, the device row is left untouched
+    share_hash, expiration_dt = create_share_token(
+        user_id, device_id, expiration_minutes
+    )
+    db.add(
+        models.ShareLink(
+            device_id=device.id,
+            token_digest=utils.hash_share_token(share_hash),
+            expires_at=expiration_dt,
+            created_by=user_id,
+        )
     )
+    db.commit()
 
     return schemas.ShareDeviceURL(
-        url=share_url, expiration_date=expiration_dt, time_zone=device.time_zone
+        url=get_share_url(share_hash), expiration_date=expiration_dt, time_zone=device.time_zone
     )
 
 
 def verify_share_url(db: Session, token: str) -> str:
-    # decoding data to obtain shared device metadata
+    # checking the token signature and expiration
     try:
-        shared_device_metadata = jwt.decode(
-            token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")]
-        )
+        jwt.decode(token, os.getenv("SECRET_KEY"), algorithms=[os.getenv("ALGORITHM")])
     except ExpiredSignatureError as e:
         raise exceptions.ExpiredShareDeviceURL()
 
-    # checking that the device share_url is not null
-    device = db.scalars(
-        select(models.Device)
-        .where(models.Device.id == shared_device_metadata["device_id"])
-        .where(models.Device.share_url.is_not(None))
-        .where(models.Device.share_url.contains(token))
+    # a single lookup by the (unique) token digest
+    share_link = db.scalars(
+        select(models.ShareLink).where(
+            models.ShareLink.token_digest == utils.hash_share_token(token)
+        )
     ).first()
 
-    if not device:
+    if not share_link:
         raise exceptions.DeviceNotFound()
 
-    has_expired = datetime.now() > device.share_url_expires_at
+    has_expired = datetime.now() > share_link.expires_at
     if has_expired:
         raise exceptions.ExpiredShareDeviceURL()
 
     # URL is valid, redirecting the user
     otp = create_otp()
-    redirect_url = create_connection_url(db, device.id, otp)
+    redirect_url = create_connection_url(db, share_link.device_id, otp)
     return redirect_url
 
 
 def revoke_share_url(db: Session, device_id: Union[str, int]) -> schemas.Device:
-    if str(device_id).isdigit():
-        device = get_device(db, device_id)
-    else:
-        device = utils.get_device_by_serial_number(db, device_id)
-
-    device = update_device(
-        db,
-        device,
-        schemas.DeviceUpdate(
-            share_url=None,
-            share_url_expires_at=None,
-            tags=device.tags,
-        ),
-    )
-
+    # revoking every link of the device
+    device = get_device(db, utils.resolve_device(db, device_id).device_id)
+    db.execute(delete(models.ShareLink).where(models.ShareLink.device_id == device.id))
+    db.commit()
     return device
 
 
-def append_online_status_column(db: Session, device: models.Device):
-    return {
-        **device._asdict(),
-        # "is_online": utils.get_online_status(get_device(db, device[0])),
-        "is_online": get_device(db, device[0]).is_online,
-    }
-
-
-def device_transformer(
-    db: Session, devices: Sequence[models.Device]
-) -> Sequence[models.Device]:
-    return [append_online_status_column(db, device) for device in devices]
+def get_heartbeat_history_step(
+    since: datetime, until: datetime, step: Optional[int] = None
+) -> int:
+    # the step is widened as needed to return at most HEARTBEAT_HISTORY_MAX_POINTS:
+    # buckets are aligned to the epoch rather than to `since`, so a range spanning n
+    # steps may touch n + 1 of them...
+    span_s = (until - since).total_seconds()
+    step = max(
+        step or 1, math.ceil(span_s / max(HEARTBEAT_HISTORY_MAX_POINTS - 1, 1))
+    )
+    # ...and aligned to the rollup buckets, so that rollups are read instead of raw rows
+    for model in (models.HeartbeatRollupHour, models.HeartbeatRollupMinute):
+        if step >= model.bucket_s:
+            return math.ceil(step / model.bucket_s) * model.bucket_s
+    return step
 
 
-def read_device_heartbeats(db: Session, device_id: int):
-    heartbeats = db.scalars(
-        select(models.Heartbeat)
-        .where(models.Heartbeat.device_id == device_id)
-        .order_by(models.Heartbeat.timestamp.desc())
-    ).all()
-    return heartbeats
+def read_device_heartbeats(
+    db: Session,
+    device_id: int,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    step: Optional[int] = None,
+) -> schemas.HeartBeatHistory:
+    # heartbeats are stored with naive local timestamps
+    if until and until.tzinfo:
+        until = until.astimezone().replace(tzinfo=None)
+    if since and since.tzinfo:
+        since = since.astimezone().replace(tzinfo=None)
+    until = until or datetime.now()
+    since = since or until - timedelta(days=1)
+    if since >= until:
+        raise exceptions.InvalidHeartbeatHistoryRange()
+
+    step = get_heartbeat_history_step(since, until, step)
+    points = aggregate_heartbeats(db, device_id, since, until, step)
+    return schemas.HeartBeatHistory(
+        device_id=device_id,
+        since=since,
+        until=until,
+        step=step,
+        # the most recent points are the ones kept, should the bound ever be exceeded
+        points=points[-HEARTBEAT_HISTORY_MAX_POINTS:],
+    )
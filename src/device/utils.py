@@ -1,9 +1,82 @@
 import os
+from hashlib import sha256
 from datetime import datetime, UTC
-from sqlalchemy import select, update
-from sqlalchemy.orm import Session
-from typing import Union, Optional, List
-from src.device import models
+from sqlalchemy import ColumnElement, select, func, case, literal
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.orm import Session, object_session
+from typing import Any, Dict, NamedTuple, Union, Optional, List
+from src.cache import LRUCache
+from src.device import models, exceptions
+from src.folder.models import Folder
+from src.tenant.models import TenantSettings
+from src.tenant.utils import get_cached_tenant_settings
+from src.utils import unix_timestamp
+
+PRESENCE_METRICS = ("CPU_load", "MEM_load_mb", "free_space_mb")
+
+
+class DeviceRef(NamedTuple):
+    device_id: int
+    serial_number: Optional[str]
+    folder_id: Optional[int]
+    tenant_id: Optional[int]
+
+
+# device ids and serial numbers -> DeviceRef. Entries are invalidated when a device is
+# updated, moved or deleted; the TTL bounds staleness for changes made by other processes.
+device_ref_cache = LRUCache(
+    max_size=int(os.getenv("DEVICE_REF_CACHE_MAX_SIZE", 10_000)),
+    ttl_s=float(os.getenv("DEVICE_REF_CACHE_TTL_S", 300)),
+)
+
+
+def resolve_device(db: Session, device_id: Union[str, int]) -> DeviceRef:
+    # numeric values are device ids, anything else is a serial number
+    key = str(device_id)
+    device_ref = device_ref_cache.get(key)
+    if device_ref is not None:
+        return device_ref
+
+    # a single point lookup on either the primary key or the serial_number index
+    condition = (
+        models.Device.id == int(key)
+        if key.isdigit()
+        else models.Device.serial_number == key
+    )
+    row = db.execute(
+        select(
+            models.Device.id,
+            models.Device.serial_number,
+            models.Device.folder_id,
+            Folder.tenant_id,
+        )
+        .join(Folder, isouter=True)
+        .where(condition)
+    ).first()
+    if not row:
+        raise exceptions.DeviceNotFound()
+
+    device_ref = DeviceRef(*row)
+    device_ref_cache.set(str(device_ref.device_id), device_ref)
+    if device_ref.serial_number is not None:
+        device_ref_cache.set(device_ref.serial_number, device_ref)
+    return device_ref
+
+
+def invalidate_device_ref(
+    device_id: Optional[int] = None, serial_number: Optional[str] = None
+) -> None:
+    # without arguments every entry is dropped (e.g. after moving devices in bulk)
+    if device_id is None and serial_number is None:
+        device_ref_cache.clear()
+        return
+    if device_id is not None:
+        device_ref = device_ref_cache.get(str(device_id))
+        device_ref_cache.invalidate(str(device_id))
+        if device_ref and device_ref.serial_number is not None:
+            device_ref_cache.invalidate(device_ref.serial_number)
+    if serial_number is not None:
+        device_ref_cache.invalidate(serial_number)
 
 
 def get_device_by_serial_number(
@@ -25,17 +98,82 @@ def get_devices_in_tree(db: Session, folder_ids: List[int]):
     ).all()
 
 
-def reset_devices_folder_id(
-    db: Session, folder_ids: List[int], tenant1_root_folder_id: int
-) -> None:
-    # when deleting a folder every device assigned to it should be assigned to the root folder from tenant1.
-    update_stmt = (
-        update(models.Device)
-        .where(models.Device.folder_id.in_(folder_ids))
-        .values(folder_id=tenant1_root_folder_id)
+def get_latest_presence_rows(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # one row per device built from its most recent heartbeat
+    latest = {}
+    for e in sorted(entries, key=lambda e: e["timestamp"]):
+        has_credentials = e.get("id_rust") is not None and e.get("pass_rust") is not None
+        previous = latest.get(e["device_id"], {})
+        latest[e["device_id"]] = {
+            "device_id": e["device_id"],
+            "last_heartbeat_at": e["timestamp"],
+            **{
+                m: e[m] if e.get(m) is not None else previous.get(m)
+                for m in PRESENCE_METRICS
+            },
+            "credentials_updated_at": (
+                e["timestamp"]
+                if has_credentials
+                else previous.get("credentials_updated_at")
+            ),
+        }
+    return list(latest.values())
+
+
+def upsert_device_presence(db: Session, entries: List[Dict[str, Any]]) -> None:
+    rows = get_latest_presence_rows(entries)
+    if not rows:
+        return
+
+    presence = models.DevicePresence
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(presence).values(rows)
+        new_values = stmt.inserted
+    else:
+        stmt = sqlite.insert(presence).values(rows)
+        new_values = stmt.excluded
+
+    # missing metrics and credential changes keep their last known value
+    updated_values = {
+        "last_heartbeat_at": new_values.last_heartbeat_at,
+        **{
+            column: func.coalesce(new_values[column], presence.__table__.c[column])
+            for column in (*PRESENCE_METRICS, "credentials_updated_at")
+        },
+    }
+    if dialect == "mysql":
+        stmt = stmt.on_duplicate_key_update(updated_values)
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[presence.device_id], set_=updated_values
+        )
+    db.execute(stmt)
+
+
+def online_status_clause(now: Optional[datetime] = None) -> ColumnElement[bool]:
+    # SQL version of Device.is_online: the elapsed minutes since the latest heartbeat
+    # must not exceed (heartbeat_s // 60) * MAX_TOLERANCE_HEARTBEATS. Both sides are
+    # multiplied by 60 so only integer modulo is needed.
+    now = now or datetime.now()
+    elapsed_s = unix_timestamp(literal(now)) - unix_timestamp(
+        models.DevicePresence.last_heartbeat_at
     )
-    db.execute(update_stmt)
-    db.commit()
+    # tenants without settings fall back to HEARTBEAT_S, as in Device.is_online
+    heartbeat_s = func.coalesce(TenantSettings.heartbeat_s, int(os.getenv("HEARTBEAT_S")))
+    max_tolerance = float(os.getenv("MAX_TOLERANCE_HEARTBEATS"))
+    return case(
+        (
+            models.Device.folder_id.is_not(None)
+            & (
+                (elapsed_s - elapsed_s % 60)
+                <= (heartbeat_s - heartbeat_s % 60) * max_tolerance
+            ),
+            True,
+        ),
+        else_=False,
+    )
+
 
 # TODO: pending tests. Will probably delete it.
 def get_online_status(device: models.Device):
@@ -43,11 +181,16 @@ def get_online_status(device: models.Device):
         return False
     if not device.folder.tenant:
         return False
-    if not device.heartbeats:
+    if not device.presence:
         return False
 
-    tenant_heartbeats_interval = device.folder.tenant.settings.heartbeat_s
-    latest_heartbeat_timestamp = device.heartbeats[-1].timestamp
+    tenant_settings = get_cached_tenant_settings(
+        object_session(device), device.folder.tenant_id
+    )
+    tenant_heartbeats_interval = (
+        tenant_settings.heartbeat_s if tenant_settings else int(os.getenv("HEARTBEAT_S"))
+    )
+    latest_heartbeat_timestamp = device.presence.last_heartbeat_at
     diff_minutes = (
         datetime.now(UTC) - latest_heartbeat_timestamp.astimezone(UTC)
     ).total_seconds() // 60
@@ -55,3 +198,7 @@ def get_online_status(device: models.Device):
     return diff_minutes <= tenant_heartbeats_interval * int(
         os.getenv("MAX_TOLERANCE_HEARTBEATS")
     )
+
+
+def hash_share_token(token: str) -> str:
+    return sha256(token.encode()).hexdigest()
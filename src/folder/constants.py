@@ -3,4 +3,6 @@ class ErrorCode:
     FOLDER_NAME_TAKEN = "Otra carpeta ya tiene este nombre"
     FOLDER_INVALID_ATTRS = "Atributos inválidos"
     SUBFOLDER_PARENT_MISMATCH = "Subfolder parent id and supplied parent folder id do not match"
-    ROOT_FOLDER_NOT_FOUND = "No se ha encontrado una carpeta raíz para este tenant"
\ No newline at end of file
+    ROOT_FOLDER_NOT_FOUND = "No se ha encontrado una carpeta raíz para este tenant"
+    FOLDER_CANNOT_BE_MOVED_INTO_ITSELF = "Una carpeta no puede moverse dentro de sí misma o de una de sus subcarpetas"
+    FOLDER_TENANT_MISMATCH = "Las carpetas y dispositivos solo pueden moverse dentro de su mismo tenant"
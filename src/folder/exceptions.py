@@ -17,4 +17,10 @@ class SubfolderParentMismatch(BadRequest):
     DETAIL = ErrorCode.SUBFOLDER_PARENT_MISMATCH
 
 class RootFolderNotFound(NotFound):
-    DETAIL = ErrorCode.ROOT_FOLDER_NOT_FOUND
\ No newline at end of file
+    DETAIL = ErrorCode.ROOT_FOLDER_NOT_FOUND
+
+class FolderCannotBeMovedIntoItself(BadRequest):
+    DETAIL = ErrorCode.FOLDER_CANNOT_BE_MOVED_INTO_ITSELF
+
+class FolderTenantMismatch(BadRequest):
+    DETAIL = ErrorCode.FOLDER_TENANT_MISMATCH
@@ -30,3 +30,17 @@ class Folder(AuditMixin, Base):
 
     def add_tag(self, tag: "src.tag.models.Tag") -> None:
         self.tags.append(tag)
+
+
+class FolderClosure(Base):
+    # one row per (ancestor, descendant) pair, each folder being its own ancestor at
+    # depth 0: a whole subtree is a single indexed lookup on ancestor_id.
+    __tablename__ = "folder_closure"
+
+    ancestor_id: Mapped[int] = mapped_column(
+        ForeignKey("folder.id", ondelete="CASCADE"), primary_key=True
+    )
+    descendant_id: Mapped[int] = mapped_column(
+        ForeignKey("folder.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    depth: Mapped[int] = mapped_column()
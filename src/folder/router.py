@@ -1,6 +1,6 @@
-from fastapi import Depends, APIRouter, HTTPException, Path
+from fastapi import Depends, APIRouter, HTTPException, Path, Query
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from fastapi_pagination.ext.sqlalchemy import paginate
 from src.auth.dependencies import (
     get_current_active_user,
@@ -14,7 +14,9 @@ from src.user.schemas import User
 from src.tenant.router import router as tenant_router
 from src.database import get_db
 from src.folder import service, schemas
-from src.utils import CustomBigPage
+from src.job.models import JobStatus
+from src.folder.tree import MAX_TREE_DEPTH, get_folder_tree, get_tenant_device_counts
+from src.utils import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, KeysetPage
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
@@ -39,7 +41,36 @@ def read_folder(
     return db_folder
 
 
-@router.get("/", response_model=CustomBigPage[schemas.Folder])
+@router.get(
+    "/{folder_id}/tree",
+    response_model=schemas.FolderNode,
+    response_model_exclude_none=True,
+)
+def read_folder_tree(
+    folder_id: int,
+    depth: int = Query(1, ge=0, le=MAX_TREE_DEPTH, description="Levels to expand"),
+    include: List[Literal["devices", "counts"]] = Query([]),
+    after: Optional[int] = Query(
+        None, description="children_cursor of the requested folder"
+    ),
+    size: int = Query(
+        DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Children per folder"
+    ),
+    db: Session = Depends(get_db),
+    user: User = Depends(has_access_to_folder),
+):
+    return get_folder_tree(
+        db,
+        folder_id,
+        depth=depth,
+        include_devices="devices" in include,
+        include_counts="counts" in include,
+        after=after,
+        size=size,
+    )
+
+
+@router.get("/", response_model=KeysetPage[schemas.Folder])
 def read_folders(
     tenant_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -48,7 +79,7 @@ def read_folders(
     return paginate(db, service.get_folders_from_tenant(db, user.id, tenant_id))
 
 
-@tenant_router.get("/{tenant_id}/folders", response_model=CustomBigPage[schemas.Folder])
+@tenant_router.get("/{tenant_id}/folders", response_model=KeysetPage[schemas.Folder])
 def read_folders_from_tenant(
     tenant_id: int = Path(),
     db: Session = Depends(get_db),
@@ -57,6 +88,19 @@ def read_folders_from_tenant(
     return read_folders(tenant_id, db, user)
 
 
+@tenant_router.get(
+    "/{tenant_id}/folders/device-counts",
+    response_model=List[schemas.FolderDeviceCounts],
+)
+def read_tenant_device_counts(
+    tenant_id: int = Path(),
+    db: Session = Depends(get_db),
+    user: User = Depends(has_access_to_tenant),
+):
+    # every folder of the tenant with the device counters of its subtree
+    return get_tenant_device_counts(db, tenant_id)
+
+
 @router.patch("/{folder_id}", response_model=schemas.Folder)
 def update_folder(
     folder_id: int,
@@ -69,19 +113,31 @@ def update_folder(
     return updated_device
 
 
+@router.post("/{folder_id}/move", response_model=schemas.FolderMoved)
+def move_to_folder(
+    folder_id: int,
+    move: schemas.FolderMove,
+    db: Session = Depends(get_db),
+    user: User = Depends(can_edit_folder),
+):
+    db_folder = read_folder(folder_id, db)
+    return service.move_to_folder(db, db_folder, move, user)
+
+
 @router.delete("/{folder_id}", response_model=schemas.FolderDelete)
 def delete_folder(
     folder_id: int, db: Session = Depends(get_db), user: User = Depends(can_edit_folder)
 ):
     db_folder = read_folder(folder_id, db)
-    deleted_folder_id = service.delete_folder(db, db_folder)
-    return {
-        "id": deleted_folder_id,
-        "msg": f"Carpeta {deleted_folder_id} eliminada exitosamente!",
-    }
+    job = service.enqueue_folder_deletion(db, db_folder)
+    if job.status == JobStatus.SUCCEEDED:
+        msg = f"Carpeta {folder_id} eliminada exitosamente!"
+    else:
+        msg = f"Carpeta {folder_id} en proceso de eliminación"
+    return {"id": folder_id, "msg": msg, "job_id": job.id}
 
 
-# @router.get("/{folder_id}/subfolders", response_model=CustomBigPage[schemas.Folder])
+# @router.get("/{folder_id}/subfolders", response_model=KeysetPage[schemas.Folder])
 # def read_subfolders(
 #     folder_id: int,
 #     db: Session = Depends(get_db),
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from src.device.schemas import Device, DeviceList
 from src.tag.schemas import Tag
 
@@ -36,6 +36,39 @@ class Folder(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class DeviceCount(BaseModel):
+    devices: int = 0
+    online: int = 0
+
+
+class SubtreeDeviceCounts(BaseModel):
+    # devices under a folder, its whole subtree included, as maintained in
+    # folder_device_counts (online status is refreshed periodically).
+    device_count: Optional[int] = None
+    online_count: Optional[int] = None
+    SO_name_counts: Optional[Dict[str, DeviceCount]] = None
+    vendor_name_counts: Optional[Dict[str, DeviceCount]] = None
+
+
+class FolderDeviceCounts(SubtreeDeviceCounts):
+    folder_id: int
+    parent_id: Optional[int] = None
+
+
+class FolderNode(SubtreeDeviceCounts):
+    # a folder in GET /folders/{id}/tree. Counts cover the whole subtree, devices
+    # are the ones directly in the folder.
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    tenant_id: int
+    depth: int
+    children_count: int = 0
+    devices: Optional[List[DeviceList]] = None
+    children: List["FolderNode"] = []
+    children_cursor: Optional[int] = None
+
+
 class FolderCreate(FolderBase):
     parent_id: Optional[int] = None
 
@@ -50,6 +83,20 @@ class FolderUpdate(FolderBase):
     model_config = {"extra": "ignore"}
 
 
+class FolderMove(BaseModel):
+    # folders (moved along with their subfolders) and devices to move into a folder
+    folder_ids: List[int] = []
+    device_ids: List[int] = []
+
+
+class FolderMoved(BaseModel):
+    id: int
+    folder_ids: List[int]
+    device_ids: List[int]
+
+
 class FolderDelete(BaseModel):
     id: int
     msg: str
+    # the deletion runs as a job, see GET /jobs/{job_id}
+    job_id: Optional[int] = None
@@ -1,27 +1,47 @@
 from pydantic import ValidationError
-from sqlalchemy import select, update
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.orm import Session, object_session
 from sqlalchemy.exc import IntegrityError
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from src.exceptions import PermissionDenied
+from src.entity.models import Entity
 from src.entity.service import (
     create_entity_auto,
     update_entity_tags,
-    delete_entity_tags,
 )
 from src.folder import exceptions, schemas, models
+from src.folder.models import FolderClosure
+from src.folder.utils import (
+    add_folder_to_closure,
+    get_subtree_folder_ids,
+    move_folder_in_closure,
+    move_folders_in_closure,
+    remove_folders_from_closure,
+)
+from src.auth.acl import bump_acl_version_on_move, get_acl_snapshot
 from src.auth.dependencies import has_role
-from src.tag.models import Type
+from src.tag.models import Tag, Type, entities_and_tags_table
 from src.tag.service import create_tag
 from src.tag.schemas import TagAdminCreate
 from src.tenant.service import check_tenant_exists
 from src.tenant.models import tenants_and_users_table
 from src.tenant.utils import filter_tag_ids
+from src.role.utils import get_role_id
 from src.user.models import User
 from src.user.exceptions import UserTenantNotAssigned
 from src.user.service import get_user
-from src.device.models import Device
-from src.device.utils import reset_devices_folder_id
+from src.device.exceptions import DeviceNotFound
+from src.device.models import Device, FolderDeviceCount
+from src.device.utils import invalidate_device_ref
+from src.device.counters import refresh_folder_device_counts
+from src.job.models import Job
+from src.job.runner import job_runner
+from src.job.service import (
+    JOB_BATCH_SIZE,
+    advance_job,
+    check_job_interrupted,
+    enqueue_job,
+)
 
 
 def check_folder_exist(db: Session, folder_id: int):
@@ -49,6 +69,8 @@ def create_root_folder(db: Session, tenant_id: int):
     entity = create_entity_auto(db)
     db_folder = models.Folder(**folder.model_dump(), entity_id=entity.id)
     db.add(db_folder)
+    db.flush()
+    add_folder_to_closure(db, db_folder.id, None)
     db.commit()
     db.refresh(db_folder)
 
@@ -109,6 +131,8 @@ def create_folder(db: Session, folder: schemas.FolderCreate):
 
     folder = models.Folder(**folder.model_dump(), entity_id=entity.id)
     db.add(folder)
+    db.flush()
+    add_folder_to_closure(db, folder.id, folder.parent_id)
     db.commit()
 
     formatted_name = folder.tenant.name.lower().replace(" ", "-")
@@ -140,7 +164,11 @@ def get_folders(db: Session, user_id: int) -> List[models.Folder]:
     user = get_user(db, user_id)
 
     if user.is_admin:
-        return select(models.Folder).where(models.Folder.parent_id == None)
+        return (
+            select(models.Folder)
+            .where(models.Folder.parent_id == None)
+            .order_by(models.Folder.id)
+        )
     else:
         if user.tenants:
             tenant_ids = user.get_tenants_ids()
@@ -149,6 +177,7 @@ def get_folders(db: Session, user_id: int) -> List[models.Folder]:
                     select(models.Folder)
                     .where(models.Folder.tenant_id.in_(tenant_ids))
                     .where(models.Folder.parent_id == None)
+                    .order_by(models.Folder.id)
                 )
         else:
             raise UserTenantNotAssigned()
@@ -160,6 +189,14 @@ def get_folders_from_tenant(
     return get_folders(db, user_id).filter(models.Folder.tenant_id == tenant_id)
 
 
+def get_folders_tenant_ids(db: Session, folder_ids: Iterable[int]) -> List[int]:
+    return db.scalars(
+        select(models.Folder.tenant_id)
+        .where(models.Folder.id.in_(list(folder_ids)))
+        .distinct()
+    ).all()
+
+
 def get_folder_by_name(db: Session, folder_name: str):
     folder = db.query(models.Folder).filter(models.Folder.name == folder_name).first()
     if not folder:
@@ -170,7 +207,12 @@ def get_folder_by_name(db: Session, folder_name: str):
 def update_subfolders(
     db: Session, folder: models.Folder, subfolders: List[models.Folder]
 ):
+    for sf in subfolders:
+        # a folder can't become a subfolder of one of its own descendants
+        if folder.id in get_subtree_folder_ids(db, sf["id"]):
+            raise exceptions.FolderCannotBeMovedIntoItself()
     try:
+        previous_subfolder_ids = [sf.id for sf in folder.subfolders]
         folder.subfolders = []
         db.commit()
         if len(subfolders) != 0:
@@ -183,6 +225,15 @@ def update_subfolders(
             folder.subfolders = subfolders
             db.commit()
         db.refresh(folder)
+        # subfolders left out are detached from the tree, the new ones moved under it
+        subfolder_ids = [sf.id for sf in folder.subfolders]
+        for sf_id in previous_subfolder_ids:
+            if sf_id not in subfolder_ids:
+                move_folder_in_closure(db, sf_id, None)
+        for sf_id in subfolder_ids:
+            if sf_id not in previous_subfolder_ids:
+                move_folder_in_closure(db, sf_id, folder.id)
+        db.commit()
     except IntegrityError:
         db.rollback()
     return folder
@@ -226,6 +277,10 @@ def update_folder(
     folder = get_folder(db, db_folder.id)
     if updated_folder.tenant_id:
         check_tenant_exists(db, updated_folder.tenant_id)
+    if "parent_id" in values and values["parent_id"] != folder.parent_id:
+        if values["parent_id"] is not None:
+            check_folder_exist(db, values["parent_id"])
+        move_folder_in_closure(db, folder.id, values["parent_id"])
     check_folder_name_taken(
         db, updated_folder.name, updated_folder.tenant_id, folder.id
     )
@@ -233,7 +288,16 @@ def update_folder(
     if subfolders is not None and len(subfolders) >= 0:
         folder = update_subfolders(db, folder, subfolders)
     if devices is not None and len(devices) >= 0:
+        # the folders the devices are taken from need their counters refreshed too
+        source_folder_ids = db.scalars(
+            select(Device.folder_id).where(
+                Device.id.in_([d["id"] for d in devices])
+            )
+        ).all()
+        source_tenant_ids = get_folders_tenant_ids(db, source_folder_ids)
         folder = update_devices(db, folder, devices)
+        refresh_folder_device_counts(db, [folder.id, *source_folder_ids])
+        bump_acl_version_on_move(db, source_tenant_ids, folder.tenant_id)
     if tags is not None and len(tags) >= 0:
         tag_ids = filter_tag_ids(tags, folder.tenant_id)
         folder.entity = update_entity_tags(
@@ -243,35 +307,216 @@ def update_folder(
             tag_ids=tag_ids,
         )
 
+    if "tenant_id" in values:
+        bump_acl_version_on_move(db, [folder.tenant_id], values["tenant_id"])
     db.execute(
         update(models.Folder).where(models.Folder.id == folder.id).values(values)
     )
     db.commit()
+    if devices is not None or "tenant_id" in values:
+        # devices may have changed their folder or tenant
+        invalidate_device_ref()
     db.refresh(folder)
     return folder
 
 
-def get_folder_ids_in_tree(folder: models.Folder, folder_ids: List[int] =[]):
-    folder_ids.append(folder.id)
-    for sf in folder.subfolders:
-        get_folder_ids_in_tree(sf, folder_ids)
-    return folder_ids
+def move_to_folder(
+    db: Session, folder: models.Folder, move: schemas.FolderMove, user: User
+) -> schemas.FolderMoved:
+    # folders and devices are moved with set-based statements, committed at once
+    folder_ids = sorted(set(move.folder_ids))
+    device_ids = sorted(set(move.device_ids))
+    tenant_ids = dict(
+        db.execute(
+            select(models.Folder.id, models.Folder.tenant_id).where(
+                models.Folder.id.in_(folder_ids)
+            )
+        ).all()
+    )
+    if len(tenant_ids) != len(folder_ids):
+        raise exceptions.FolderNotFound()
+    if any(tenant_id != folder.tenant_id for tenant_id in tenant_ids.values()):
+        raise exceptions.FolderTenantMismatch()
+    previous_folder_ids = dict(
+        db.execute(
+            select(Device.id, Device.folder_id).where(Device.id.in_(device_ids))
+        ).all()
+    )
+    if len(previous_folder_ids) != len(device_ids):
+        raise DeviceNotFound()
+    # devices carry tags from their tenant, so they don't leave it either
+    if any(
+        tenant_id != folder.tenant_id
+        for tenant_id in get_folders_tenant_ids(db, previous_folder_ids.values())
+    ):
+        raise exceptions.FolderTenantMismatch()
+    if user.role_id != get_role_id(db, "admin"):
+        snapshot = get_acl_snapshot(db, user.id)
+        if not (
+            snapshot.folder_ids.issuperset(folder_ids)
+            and snapshot.device_ids.issuperset(device_ids)
+        ):
+            raise PermissionDenied()
+
+    if folder_ids:
+        move_folders_in_closure(db, folder_ids, folder.id)
+        db.execute(
+            update(models.Folder)
+            .where(models.Folder.id.in_(folder_ids))
+            .values(parent_id=folder.id)
+        )
+    if device_ids:
+        db.execute(
+            update(Device).where(Device.id.in_(device_ids)).values(folder_id=folder.id)
+        )
+        refresh_folder_device_counts(db, [folder.id, *previous_folder_ids.values()])
+    db.commit()
+    if device_ids:
+        invalidate_device_ref()
+    return schemas.FolderMoved(
+        id=folder.id, folder_ids=folder_ids, device_ids=device_ids
+    )
+
+
+def get_folder_ids_in_tree(folder: models.Folder) -> List[int]:
+    return get_subtree_folder_ids(object_session(folder), folder.id)
 
 
-def delete_folder(db: Session, db_folder: schemas.Folder):
-    # sanity check
-    check_folder_exist(db, db_folder.id)
-    tag_ids = [t.id for t in db_folder.tags if t.type == Type.FOLDER]
-    delete_entity_tags(db, db_folder.entity, tag_ids)
+FOLDER_DELETION_JOB = "delete-folder"
 
-    # assigning devices to root_folder from tenant1
-    tenant1_root_folder = get_root_folder(db, tenant_id=1)
-    folder_tree = get_folder_ids_in_tree(db_folder)
-    reset_devices_folder_id(db, folder_tree, tenant1_root_folder.id)
 
-    db.delete(db_folder.entity) # db_folder debiera eliminarse por cascada al eliminar su entity
+def count_folder_deletion_work(db: Session, *criteria) -> int:
+    # devices to reassign plus folders to delete
+    folder_ids = select(models.Folder.id).where(*criteria)
+    devices = db.scalar(
+        select(func.count(Device.id)).where(Device.folder_id.in_(folder_ids))
+    )
+    folders = db.scalar(select(func.count(models.Folder.id)).where(*criteria))
+    return devices + folders
+
+
+def delete_folders_in_batches(
+    db: Session, job: Job, devices_folder_id: int, *criteria
+) -> None:
+    # the folders matching `criteria` are deleted with set-based statements touching
+    # at most JOB_BATCH_SIZE rows each, their devices being moved to devices_folder_id
+    # first. Every batch is committed along with the job progress.
+    folder_ids = select(models.Folder.id).where(*criteria)
+    while True:
+        check_job_interrupted()
+        devices = db.execute(
+            select(Device.id, Device.folder_id)
+            .where(
+                Device.folder_id.in_(folder_ids),
+                Device.folder_id != devices_folder_id,
+            )
+            .limit(JOB_BATCH_SIZE)
+        ).all()
+        if not devices:
+            break
+        db.execute(
+            update(Device)
+            .where(Device.id.in_([d.id for d in devices]))
+            .values(folder_id=devices_folder_id)
+        )
+        refresh_folder_device_counts(
+            db, [devices_folder_id, *(d.folder_id for d in devices)]
+        )
+        bump_acl_version_on_move(
+            db,
+            get_folders_tenant_ids(db, [d.folder_id for d in devices]),
+            db.scalar(
+                select(models.Folder.tenant_id).where(
+                    models.Folder.id == devices_folder_id
+                )
+            ),
+        )
+        advance_job(db, job, len(devices))
+        invalidate_device_ref()
+
+    # deepest folders first, so that no folder is deleted before its subfolders
+    depth = func.count(FolderClosure.ancestor_id)
+    while True:
+        check_job_interrupted()
+        batch = db.scalars(
+            select(models.Folder.id)
+            .join(FolderClosure, FolderClosure.descendant_id == models.Folder.id)
+            .where(*criteria)
+            .group_by(models.Folder.id)
+            .order_by(depth.desc(), models.Folder.id)
+            .limit(JOB_BATCH_SIZE)
+        ).all()
+        if not batch:
+            break
+        delete_folders(db, batch)
+        advance_job(db, job, len(batch))
+
+
+def delete_folders(db: Session, folder_ids: List[int]) -> None:
+    entity_ids = db.scalars(
+        select(models.Folder.entity_id).where(models.Folder.id.in_(folder_ids))
+    ).all()
+    links = entities_and_tags_table.c
+    # the automatic tags of the folders are deleted along with them
+    tag_ids = db.scalars(
+        select(links.tag_id)
+        .join(Tag, Tag.id == links.tag_id)
+        .where(links.entity_id.in_(entity_ids), Tag.type == Type.FOLDER)
+    ).all()
+    db.execute(
+        delete(entities_and_tags_table).where(
+            or_(links.entity_id.in_(entity_ids), links.tag_id.in_(tag_ids))
+        )
+    )
+    # the deleted instances are dropped from the session's identity map too
+    db.execute(
+        delete(Tag)
+        .where(Tag.id.in_(tag_ids))
+        .execution_options(synchronize_session="fetch")
+    )
+    remove_folders_from_closure(db, folder_ids)
+    db.execute(
+        delete(FolderDeviceCount).where(FolderDeviceCount.folder_id.in_(folder_ids))
+    )
+    db.execute(
+        delete(models.Folder)
+        .where(models.Folder.id.in_(folder_ids))
+        .execution_options(synchronize_session="fetch")
+    )
+    db.execute(
+        delete(Entity)
+        .where(Entity.id.in_(entity_ids))
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def run_folder_deletion(db: Session, job: Job) -> None:
+    # the folder and its whole subtree; devices go to the root folder from tenant1
+    subtree = models.Folder.id.in_(
+        select(FolderClosure.descendant_id).where(
+            FolderClosure.ancestor_id == job.target_id
+        )
+    )
+    tenant1_root_folder = get_root_folder(db, tenant_id=1)
+    job.total = job.done + count_folder_deletion_work(db, subtree)
     db.commit()
-    return db_folder.id
+    delete_folders_in_batches(db, job, tenant1_root_folder.id, subtree)
+
+
+job_runner.register(FOLDER_DELETION_JOB, run_folder_deletion)
+
+
+def enqueue_folder_deletion(db: Session, db_folder: schemas.Folder) -> Job:
+    # sanity checks
+    check_folder_exist(db, db_folder.id)
+    get_root_folder(db, tenant_id=1)
+    return enqueue_job(db, FOLDER_DELETION_JOB, db_folder.id)
+
+
+def delete_folder(db: Session, db_folder: schemas.Folder):
+    folder_id = db_folder.id
+    enqueue_folder_deletion(db, db_folder)
+    return folder_id
 
 
 # def get_subfolders(
@@ -0,0 +1,143 @@
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+from src.device.models import Device, FolderDeviceCount
+from src.device.schemas import DeviceList
+from src.device.service import with_online_status
+from src.folder import exceptions, models, schemas
+from src.folder.models import FolderClosure
+from src.utils import DEFAULT_PAGE_SIZE
+
+MAX_TREE_DEPTH = 10
+
+
+def get_subtree_device_counts(db: Session, *criteria) -> Dict[int, Dict[str, Any]]:
+    # the maintained counters of every folder matching `criteria`, summed over the
+    # folder's whole subtree, in a single query. Folders without devices get zeros.
+    rows = db.execute(
+        select(
+            models.Folder.id,
+            models.Folder.parent_id,
+            FolderDeviceCount.dimension,
+            FolderDeviceCount.value,
+            func.sum(FolderDeviceCount.devices),
+            func.sum(FolderDeviceCount.online),
+        )
+        .join(FolderClosure, FolderClosure.ancestor_id == models.Folder.id)
+        .join(
+            FolderDeviceCount,
+            FolderDeviceCount.folder_id == FolderClosure.descendant_id,
+            isouter=True,
+        )
+        .where(*criteria)
+        .group_by(
+            models.Folder.id,
+            models.Folder.parent_id,
+            FolderDeviceCount.dimension,
+            FolderDeviceCount.value,
+        )
+    ).all()
+    counts = {}
+    for folder_id, parent_id, dimension, value, devices, online in rows:
+        folder_counts = counts.setdefault(
+            folder_id,
+            {
+                "parent_id": parent_id,
+                "device_count": 0,
+                "online_count": 0,
+                "SO_name_counts": {},
+                "vendor_name_counts": {},
+            },
+        )
+        if dimension == "total":
+            folder_counts["device_count"] = int(devices)
+            folder_counts["online_count"] = int(online or 0)
+        elif dimension is not None:
+            folder_counts[f"{dimension}_counts"][value] = schemas.DeviceCount(
+                devices=int(devices), online=int(online or 0)
+            )
+    return counts
+
+
+def get_tenant_device_counts(
+    db: Session, tenant_id: int
+) -> List[schemas.FolderDeviceCounts]:
+    counts = get_subtree_device_counts(db, models.Folder.tenant_id == tenant_id)
+    return [
+        schemas.FolderDeviceCounts(folder_id=folder_id, **counts[folder_id])
+        for folder_id in sorted(counts)
+    ]
+
+
+def get_folder_tree(
+    db: Session,
+    folder_id: int,
+    depth: int = 1,
+    include_devices: bool = False,
+    include_counts: bool = False,
+    after: Optional[int] = None,
+    size: int = DEFAULT_PAGE_SIZE,
+) -> schemas.FolderNode:
+    # the whole subtree down to `depth` is a single query on the closure table
+    rows = db.execute(
+        select(
+            models.Folder.id,
+            models.Folder.name,
+            models.Folder.parent_id,
+            models.Folder.tenant_id,
+            FolderClosure.depth,
+        )
+        .join(FolderClosure, FolderClosure.descendant_id == models.Folder.id)
+        .where(FolderClosure.ancestor_id == folder_id, FolderClosure.depth <= depth)
+        .order_by(FolderClosure.depth, models.Folder.id)
+    ).all()
+    if not rows:
+        raise exceptions.FolderNotFound()
+
+    children_count = dict(
+        db.execute(
+            select(models.Folder.parent_id, func.count(models.Folder.id))
+            .where(models.Folder.parent_id.in_([r.id for r in rows]))
+            .group_by(models.Folder.parent_id)
+        ).all()
+    )
+
+    # every node keeps at most `size` children (after `after`, for the requested
+    # folder); the id of the last one is the cursor to expand the rest.
+    root = rows[0]
+    nodes = {
+        root.id: schemas.FolderNode(
+            **root._asdict(), children_count=children_count.get(root.id, 0)
+        )
+    }
+    for row in rows[1:]:
+        parent = nodes.get(row.parent_id)
+        if parent is None or (parent.id == root.id and after and row.id <= after):
+            continue
+        if len(parent.children) >= size:
+            parent.children_cursor = parent.children[-1].id
+            continue
+        node = schemas.FolderNode(
+            **row._asdict(), children_count=children_count.get(row.id, 0)
+        )
+        parent.children.append(node)
+        nodes[row.id] = node
+
+    if include_counts:
+        counts = get_subtree_device_counts(db, models.Folder.id.in_(list(nodes)))
+        for node_id, node in nodes.items():
+            for field, value in counts[node_id].items():
+                setattr(node, field, value)
+
+    if include_devices:
+        for node in nodes.values():
+            node.devices = []
+        devices = db.execute(
+            with_online_status(
+                select(Device).where(Device.folder_id.in_(list(nodes)))
+            )
+        ).all()
+        for device in devices:
+            nodes[device.folder_id].devices.append(DeviceList.model_validate(device))
+
+    return nodes[root.id]
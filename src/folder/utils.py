@@ -0,0 +1,107 @@
+from sqlalchemy import delete, insert, literal, or_, select, true, tuple_
+from sqlalchemy.orm import Session, aliased
+from typing import List, Optional
+from src.folder import exceptions
+from src.folder.models import FolderClosure
+
+
+def get_subtree_folder_ids(db: Session, folder_id: int) -> List[int]:
+    # the folder itself comes first (depth 0), then its descendants level by level
+    return db.scalars(
+        select(FolderClosure.descendant_id)
+        .where(FolderClosure.ancestor_id == folder_id)
+        .order_by(FolderClosure.depth, FolderClosure.descendant_id)
+    ).all()
+
+
+def add_folder_to_closure(db: Session, folder_id: int, parent_id: Optional[int]) -> None:
+    db.execute(
+        insert(FolderClosure).values(
+            ancestor_id=folder_id, descendant_id=folder_id, depth=0
+        )
+    )
+    if parent_id is not None:
+        # every ancestor of the parent (the parent included) is an ancestor of the folder
+        db.execute(
+            insert(FolderClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    FolderClosure.ancestor_id,
+                    literal(folder_id),
+                    FolderClosure.depth + 1,
+                ).where(FolderClosure.descendant_id == parent_id),
+            )
+        )
+
+
+def move_folder_in_closure(
+    db: Session, folder_id: int, parent_id: Optional[int]
+) -> List[int]:
+    subtree_ids = get_subtree_folder_ids(db, folder_id)
+    move_folders_in_closure(db, [folder_id], parent_id)
+    return subtree_ids
+
+
+def move_folders_in_closure(
+    db: Session, folder_ids: List[int], parent_id: Optional[int]
+) -> None:
+    # set-based: the statements are the same whatever the number of folders moved,
+    # which may be nested in one another.
+    if parent_id is not None and db.scalar(
+        select(FolderClosure.descendant_id).where(
+            FolderClosure.ancestor_id.in_(folder_ids),
+            FolderClosure.descendant_id == parent_id,
+        )
+    ):
+        raise exceptions.FolderCannotBeMovedIntoItself()
+
+    # detaching every subtree from the former ancestors of its root...
+    above = aliased(FolderClosure)
+    below = aliased(FolderClosure)
+    detached = (
+        select(above.ancestor_id, below.descendant_id)
+        .join(below, below.ancestor_id == above.descendant_id)
+        .where(above.descendant_id.in_(folder_ids), above.depth > 0)
+        # distinct keeps MySQL from merging the derived table into the DELETE, which
+        # can't read from the table it deletes from otherwise.
+        .distinct()
+        .subquery()
+    )
+    db.execute(
+        delete(FolderClosure).where(
+            tuple_(FolderClosure.ancestor_id, FolderClosure.descendant_id).in_(
+                select(detached.c.ancestor_id, detached.c.descendant_id)
+            )
+        )
+    )
+    # ...and attaching it under every ancestor of its new parent
+    if parent_id is not None:
+        db.execute(
+            insert(FolderClosure).from_select(
+                ["ancestor_id", "descendant_id", "depth"],
+                select(
+                    above.ancestor_id,
+                    below.descendant_id,
+                    above.depth + below.depth + 1,
+                )
+                # every ancestor of the parent with every folder of the subtrees: the
+                # cross product is intended.
+                .select_from(above)
+                .join(below, true())
+                .where(
+                    above.descendant_id == parent_id,
+                    below.ancestor_id.in_(folder_ids),
+                ),
+            )
+        )
+
+
+def remove_folders_from_closure(db: Session, folder_ids: List[int]) -> None:
+    db.execute(
+        delete(FolderClosure).where(
+            or_(
+                FolderClosure.descendant_id.in_(folder_ids),
+                FolderClosure.ancestor_id.in_(folder_ids),
+            )
+        )
+    )
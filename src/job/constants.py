@@ -0,0 +1,2 @@
+class ErrorCode:
+    JOB_NOT_FOUND = "Tarea no encontrada"
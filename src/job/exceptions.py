@@ -0,0 +1,6 @@
+from src.job.constants import ErrorCode
+from src.exceptions import NotFound
+
+
+class JobNotFound(NotFound):
+    DETAIL = ErrorCode.JOB_NOT_FOUND
@@ -0,0 +1,33 @@
+from datetime import datetime
+from enum import StrEnum, auto
+from sqlalchemy import String
+from sqlalchemy.orm import mapped_column, Mapped
+from typing import Optional
+from ..database import Base
+from ..audit_mixin import AuditMixin
+
+
+class JobStatus(StrEnum):
+    PENDING = auto()
+    RUNNING = auto()
+    SUCCEEDED = auto()
+    FAILED = auto()
+
+
+class Job(AuditMixin, Base):
+    # a long running operation (e.g. deleting a tenant) processed by the job runner.
+    # `done` out of `total` items have been processed so far.
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True, autoincrement=True)
+    type: Mapped[str] = mapped_column(String(64))
+    target_id: Mapped[Optional[int]] = mapped_column()
+    status: Mapped[JobStatus] = mapped_column(default=JobStatus.PENDING, index=True)
+    total: Mapped[int] = mapped_column(default=0)
+    done: Mapped[int] = mapped_column(default=0)
+    error: Mapped[Optional[str]] = mapped_column(String(1024))
+    started_at: Mapped[Optional[datetime]] = mapped_column()
+    finished_at: Mapped[Optional[datetime]] = mapped_column()
+    # the runner processing the job holds a lease on it, renewed after every batch
+    worker: Mapped[Optional[str]] = mapped_column(String(64))
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column()
@@ -0,0 +1,19 @@
+from fastapi import Depends, APIRouter
+from sqlalchemy.orm import Session
+from src.auth.dependencies import get_current_active_user
+from src.user.schemas import User
+from src.database import get_db
+from src.job import service, schemas
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=schemas.Job)
+def read_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_active_user),
+):
+    job = service.get_job(db, job_id)
+    service.check_job_access(db, job, user)
+    return job
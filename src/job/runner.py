@@ -0,0 +1,182 @@
+import os
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import ColumnElement, and_, func, or_, select, update
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+from src.database import SessionLocal
+from src.job.models import Job, JobStatus
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[Session, Job], None]
+
+
+class JobInterrupted(Exception):
+    # raised between batches when the runner is shutting down or lost the job's lease
+    pass
+
+
+class JobRunner:
+    """
+    In-process worker pool for jobs. Every job type has a handler which processes its
+    work in bounded batches, committing (and reporting progress) after each one, and
+    is expected to pick up where it left off when run again. A job is claimed before
+    running it, with a lease renewed after every batch, so that it is processed by a
+    single runner even when several processes share the database. Jobs still pending,
+    interrupted, or whose lease expired (e.g. their process died) are resumed on start
+    and every `lease_s` seconds afterwards. When the runner is not started (e.g.
+    outside the app lifespan) jobs run straight away with the caller's session.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        lease_s: float = 60,
+        session_factory: sessionmaker = SessionLocal,
+    ):
+        self.max_workers = max_workers
+        self.lease = timedelta(seconds=lease_s)
+        self.session_factory = session_factory
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"[-64:]
+        self.handlers: Dict[str, JobHandler] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def register(self, job_type: str, handler: JobHandler) -> None:
+        self.handlers[job_type] = handler
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="job-runner"
+        )
+        self.resume_jobs()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stopping.set()
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._stopping.clear()
+        self._executor = None
+
+    def resume_jobs(self) -> None:
+        executor = self._executor
+        if executor is None:
+            return
+        with self.session_factory() as db:
+            job_ids = db.scalars(
+                select(Job.id).where(claimable(datetime.now())).order_by(Job.id)
+            ).all()
+        for job_id in job_ids:
+            executor.submit(self._run, job_id)
+
+    def submit(self, db: Session, job: Job) -> None:
+        if not self.running:
+            self.run(db, job.id)
+            return
+        self._executor.submit(self._run, job.id)
+
+    def claim(self, db: Session, job_id: int) -> bool:
+        # a single conditional UPDATE, so only one runner can get the job
+        now = datetime.now()
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, claimable(now))
+            .values(
+                status=JobStatus.RUNNING,
+                worker=self.worker_id,
+                lease_expires_at=now + self.lease,
+                started_at=func.coalesce(Job.started_at, now),
+            )
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return claimed == 1
+
+    def renew_lease(self, db: Session, job: Job) -> None:
+        # part of the transaction of the batch just processed, which is rolled back if
+        # the job has been claimed by another runner in the meantime.
+        renewed = db.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.worker == self.worker_id)
+            .values(lease_expires_at=datetime.now() + self.lease)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not renewed:
+            raise JobInterrupted()
+
+    def release(self, db: Session, job_id: int, **values) -> None:
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.worker == self.worker_id)
+            .values(worker=None, lease_expires_at=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    def run(self, db: Session, job_id: int) -> None:
+        if not self.claim(db, job_id):
+            # already finished, or being processed by another runner
+            return
+        job = db.get(Job, job_id)
+        try:
+            self.handlers[job.type](db, job)
+        except JobInterrupted:
+            db.rollback()
+            logger.info("Job %s interrupted, it will be resumed", job_id)
+            self.release(db, job_id)
+        except Exception as e:
+            db.rollback()
+            logger.exception("Job %s failed", job_id)
+            self.release(
+                db,
+                job_id,
+                status=JobStatus.FAILED,
+                error=str(getattr(e, "detail", e))[:1024],
+                finished_at=datetime.now(),
+            )
+        else:
+            self.release(
+                db, job_id, status=JobStatus.SUCCEEDED, finished_at=datetime.now()
+            )
+
+    def _run(self, job_id: int) -> None:
+        db = self.session_factory()
+        try:
+            self.run(db, job_id)
+        finally:
+            db.close()
+
+
+def claimable(now: datetime) -> ColumnElement:
+    # pending jobs, and running ones nobody holds a lease on
+    return or_(
+        Job.status == JobStatus.PENDING,
+        and_(
+            Job.status == JobStatus.RUNNING,
+            or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now),
+        ),
+    )
+
+
+job_runner = JobRunner(
+    max_workers=int(os.getenv("JOB_RUNNER_MAX_WORKERS", 2)),
+    lease_s=float(os.getenv("JOB_LEASE_S", 60)),
+)
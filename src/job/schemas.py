@@ -0,0 +1,19 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+from src.job.models import JobStatus
+
+
+class Job(BaseModel):
+    id: int
+    type: str
+    target_id: Optional[int] = None
+    status: JobStatus
+    total: int
+    done: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
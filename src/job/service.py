@@ -0,0 +1,68 @@
+import os
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
+from sqlalchemy.orm import Session
+from typing import Iterator, Optional
+from src.exceptions import PermissionDenied
+from src.job import exceptions, models
+from src.job.runner import JobInterrupted, job_runner
+from src.role.utils import get_role_id
+from src.user.models import User
+
+load_dotenv()
+
+# upper bound on the rows touched by a single statement of a job
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", 500))
+
+
+def get_job(db: Session, job_id: int) -> models.Job:
+    job = db.get(models.Job, job_id)
+    if not job:
+        raise exceptions.JobNotFound()
+    return job
+
+
+def check_job_access(db: Session, job: models.Job, user: User) -> None:
+    # jobs can be followed by whoever started them and by admins
+    if job.created_by_id != user.id and user.role_id != get_role_id(db, "admin"):
+        raise PermissionDenied()
+
+
+def enqueue_job(
+    db: Session, job_type: str, target_id: Optional[int] = None
+) -> models.Job:
+    job = models.Job(type=job_type, target_id=target_id)
+    inline = not job_runner.running
+    with deferred_expiration(db) if inline else nullcontext():
+        db.add(job)
+        db.commit()
+        job_runner.submit(db, job)
+    db.refresh(job)
+    return job
+
+
+@contextmanager
+def deferred_expiration(db: Session) -> Iterator[None]:
+    # for jobs run inline with the caller's session: its instances are expired once
+    # the job is done rather than on every commit, so that the ones the job deleted
+    # leave the session with their state loaded, as they would with Session.delete.
+    expire_on_commit = db.expire_on_commit
+    db.expire_on_commit = False
+    try:
+        yield
+    finally:
+        db.expire_on_commit = expire_on_commit
+        db.expire_all()
+
+
+def advance_job(db: Session, job: models.Job, processed: int) -> None:
+    # commits the batch just processed along with the job's progress and lease
+    job_runner.renew_lease(db, job)
+    job.done += processed
+    db.commit()
+
+
+def check_job_interrupted() -> None:
+    # called before every batch: the job is left as is and resumed on the next start
+    if job_runner.stopping:
+        raise JobInterrupted()
@@ -1,15 +1,26 @@
 import os
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi_pagination import add_pagination
-from .database import engine, Base
+from .database import engine, Base, SessionLocal
+from .scheduler import scheduler
+from .device.ingest import heartbeat_buffer
+from .role.utils import load_role_registry
+from .auth.hashing import password_hasher
+from .auth.dependencies import has_admin_role
+from .job.runner import job_runner
+from .device.rollups import run_heartbeat_compaction, HEARTBEAT_COMPACTION_INTERVAL_S
 from .auth.router import router as auth_router
 from .device.router import router as device_router
 from .device.router import alt_router
+from .device.service import run_share_url_expiry, SHARE_URL_EXPIRY_INTERVAL_S
+from .auth.service import run_token_sweep, TOKEN_SWEEP_INTERVAL_S
+from .device.counters import run_device_online_refresh, DEVICE_ONLINE_REFRESH_INTERVAL_S
 from .folder.router import router as folder_router
+from .job.router import router as job_router
 from .role.router import router as role_router
 from .tag.router import router as tag_router
 from .tenant.router import router as tenant_router
@@ -22,14 +33,35 @@ load_dotenv()
 ENV = os.getenv("ENV")
 ROOT_PATH = os.getenv(f"ROOT_PATH_{ENV}")
 
+scheduler.add_job(
+    "heartbeat-compaction", run_heartbeat_compaction, HEARTBEAT_COMPACTION_INTERVAL_S
+)
+scheduler.add_job("share-url-expiry", run_share_url_expiry, SHARE_URL_EXPIRY_INTERVAL_S)
+scheduler.add_job("token-sweep", run_token_sweep, TOKEN_SWEEP_INTERVAL_S)
+scheduler.add_job(
+    "device-online-refresh", run_device_online_refresh, DEVICE_ONLINE_REFRESH_INTERVAL_S
+)
+# jobs whose runner stopped renewing their lease are picked up again
+scheduler.add_job("job-recovery", job_runner.resume_jobs, job_runner.lease.total_seconds())
+
 
 @asynccontextmanager
-async def db_creation_lifespan(app: FastAPI):
+async def app_lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        load_role_registry(db)
+    heartbeat_buffer.start()
+    scheduler.start()
+    job_runner.start()
     yield
+    scheduler.stop()
+    # running jobs stop after their current batch and are resumed on the next start
+    job_runner.stop()
+    # flushing pending heartbeats before shutting down
+    heartbeat_buffer.stop()
 
 
-app = FastAPI(root_path=ROOT_PATH, lifespan=db_creation_lifespan)
+app = FastAPI(root_path=ROOT_PATH, lifespan=app_lifespan)
 origins = [
     "http://localhost:4200",
 ]
@@ -51,6 +83,7 @@ app.include_router(auth_router)
 app.include_router(device_router)
 app.include_router(alt_router)
 app.include_router(folder_router)
+app.include_router(job_router)
 app.include_router(role_router)
 app.include_router(tag_router)
 app.include_router(tenant_router)
@@ -58,4 +91,9 @@ app.include_router(user_router)
 
 @app.get("/status", tags=["status"])
 async def status():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/status/password-hasher", tags=["status"])
+async def password_hasher_status(user=Depends(has_admin_role)):
+    return password_hasher.stats()
\ No newline at end of file
@@ -6,7 +6,7 @@ from src.auth.dependencies import get_current_active_user
 from src.user.schemas import User
 from src.database import get_db
 from src.role import service, schemas
-from src.utils import CustomBigPage
+from src.utils import KeysetPage
 
 router = APIRouter(prefix="/roles", tags=["roles"])
 
@@ -31,7 +31,7 @@ def read_role(
     return db_role
 
 
-@router.get("/", response_model=CustomBigPage[schemas.Role])
+@router.get("/", response_model=KeysetPage[schemas.Role])
 def read_roles(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user)
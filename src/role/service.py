@@ -1,6 +1,8 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from src.exceptions import PermissionDenied
 from . import schemas, models, exceptions
+from .utils import invalidate_role_registry
 from src.user.models import User
 
 
@@ -30,10 +32,11 @@ def get_role_by_name(db: Session, name: str):
 
 def get_roles(db: Session, user_id: int):
     user = db.query(User).filter(User.id == user_id).first()
+    roles = select(models.Role).order_by(models.Role.id)
     if user.is_admin:
-        return db.query(models.Role)
+        return roles
     else:
-        return db.query(models.Role).filter(models.Role.id >= user.role_id)
+        return roles.where(models.Role.id >= user.role_id)
 
 
 def create_role(db: Session, role: schemas.RoleCreate):
@@ -44,6 +47,7 @@ def create_role(db: Session, role: schemas.RoleCreate):
     db.add(db_role)
     db.commit()
     db.refresh(db_role)
+    invalidate_role_registry()
     return db_role
 
 
@@ -59,6 +63,7 @@ def update_role(
     )
     db.commit()
     db.refresh(db_role)
+    invalidate_role_registry()
     return db_role
 
 
@@ -68,4 +73,5 @@ def delete_role(db: Session, db_role: schemas.Role):
 
     db.delete(db_role)
     db.commit()
+    invalidate_role_registry()
     return db_role.id
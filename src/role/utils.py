@@ -0,0 +1,35 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import Optional
+from src.cache import LRUCache
+from src.role import models
+
+load_dotenv()
+
+# role names -> ids, checked by every permission dependency. Roles hardly ever change:
+# the registry is loaded at startup and cleared when a role is created, updated or
+# deleted; the TTL bounds staleness for changes made by other processes.
+role_registry = LRUCache(
+    max_size=int(os.getenv("ROLE_REGISTRY_MAX_SIZE", 256)),
+    ttl_s=float(os.getenv("ROLE_REGISTRY_TTL_S", 300)),
+)
+
+
+def load_role_registry(db: Session) -> None:
+    for role_id, name in db.execute(select(models.Role.id, models.Role.name)):
+        role_registry.set(name, role_id)
+
+
+def get_role_id(db: Session, name: str) -> Optional[int]:
+    role_id = role_registry.get(name)
+    if role_id is None:
+        role_id = db.scalar(select(models.Role.id).where(models.Role.name == name))
+        if role_id is not None:
+            role_registry.set(name, role_id)
+    return role_id
+
+
+def invalidate_role_registry() -> None:
+    role_registry.clear()
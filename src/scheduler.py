@@ -0,0 +1,65 @@
+import logging
+import threading
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    def __init__(self, name: str, func: Callable[[], None], interval_s: float):
+        self.name = name
+        self.func = func
+        self.interval_s = interval_s
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self.running:
+            self._stopping.set()
+            self._thread.join()
+        self._thread = None
+
+    def run_once(self) -> None:
+        try:
+            self.func()
+        except Exception:
+            logger.exception("Job %s failed", self.name)
+
+    def _run(self) -> None:
+        while not self._stopping.wait(timeout=self.interval_s):
+            self.run_once()
+
+
+class Scheduler:
+    """
+    Minimal in-process scheduler: every job runs `func` every `interval_s` seconds in
+    its own daemon thread. Jobs are expected to open (and close) their own sessions.
+    """
+
+    def __init__(self):
+        self.jobs: List[PeriodicJob] = []
+
+    def add_job(self, name: str, func: Callable[[], None], interval_s: float) -> None:
+        self.jobs.append(PeriodicJob(name, func, interval_s))
+
+    def start(self) -> None:
+        for job in self.jobs:
+            job.start()
+
+    def stop(self) -> None:
+        for job in self.jobs:
+            job.stop()
+
+
+scheduler = Scheduler()
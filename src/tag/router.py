@@ -1,9 +1,10 @@
 from fastapi import Depends, APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
 # from fastapi_pagination import Params
 from fastapi_pagination.ext.sqlalchemy import paginate
-from src.utils import CustomBigPage
+from src.utils import KeysetPage
 from typing import Union, List, Dict, Any
 from src.auth.dependencies import (
     get_current_active_user,
@@ -52,7 +53,7 @@ async def read_tags(
     else:
         ignore_user_id = False
 
-    await has_access_to_user_id(user_id, db, user)
+    await run_in_threadpool(has_access_to_user_id, user_id, db, user)
     available_tags = await service.get_available_tags(
         db, user, user_id, name, tenant_id, folder_id, device_id, ignore_user_id
     )
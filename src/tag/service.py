@@ -1,3 +1,4 @@
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import Select, select, insert, update, or_, and_, delete, func
 from sqlalchemy.orm import Session
 from typing import Union, List, Optional
@@ -15,6 +16,7 @@ from src.entity.service import get_entity_tag_ids
 from src.tenant.models import Tenant, tenants_and_users_table
 from src.folder.models import Folder
 from src.device.models import Device
+from src.device.utils import resolve_device
 from src.tenant.utils import check_tenant_exists
 from src.tag import schemas, models, exceptions
 
@@ -74,24 +76,20 @@ async def get_tags(
 
     # testing needed:
     if tenant_id:
-        await has_access_to_tenant(tenant_id, db, auth_user)
+        await run_in_threadpool(has_access_to_tenant, tenant_id, db, auth_user)
         tenant = db.scalars(select(Tenant).where(Tenant.id == tenant_id)).first()
         tenant_assigned_tag_ids = get_entity_tag_ids(db, tenant.entity_id)
         tag_ids = tenant_assigned_tag_ids
 
     if folder_id:
-        await has_access_to_folder(folder_id, db, auth_user)
+        await run_in_threadpool(has_access_to_folder, folder_id, db, auth_user)
         folder = db.scalars(select(Folder).where(Folder.id == folder_id)).first()
         folder_assigned_tag_ids = get_entity_tag_ids(db, folder.entity_id)
         tag_ids = folder_assigned_tag_ids
 
     if device_id:
-        await has_access_to_device(device_id, db, auth_user)
-        device = db.scalars(
-            select(Device).where(
-                or_(Device.id == device_id, Device.serial_number == device_id)
-            )
-        ).first()
+        await run_in_threadpool(has_access_to_device, device_id, db, auth_user)
+        device = db.get(Device, resolve_device(db, device_id).device_id)
         device_assigned_tag_ids = get_entity_tag_ids(db, device.entity_id)
         tag_ids = device_assigned_tag_ids
 
@@ -145,11 +143,7 @@ def get_folder_available_tags(db: Session, folder_id: int, tags: Select):
 
 
 def get_device_available_tags(db: Session, device_id: Union[str, int], tags: Select):
-    device = db.scalars(
-        select(Device).where(
-            or_(Device.id == device_id, Device.serial_number == device_id)
-        )
-    ).first()
+    device = db.get(Device, resolve_device(db, device_id).device_id)
     auto_device_tag_id = (
         select(models.Tag.id)
         .join(
@@ -203,15 +197,15 @@ async def get_available_tags(
         )
 
     if tenant_id:
-        await has_access_to_tenant(tenant_id, db, auth_user)
+        await run_in_threadpool(has_access_to_tenant, tenant_id, db, auth_user)
         tags = get_tenant_available_tags(db, tenant_id, tags)
 
     if folder_id:
-        await has_access_to_folder(folder_id, db, auth_user)
+        await run_in_threadpool(has_access_to_folder, folder_id, db, auth_user)
         tags = get_folder_available_tags(db, folder_id, tags)
 
     if device_id:
-        await has_access_to_device(device_id, db, auth_user)
+        await run_in_threadpool(has_access_to_device, device_id, db, auth_user)
         tags = get_device_available_tags(db, device_id, tags)
 
     if name:
@@ -73,3 +73,7 @@ class TenantSettings(AuditMixin, Base):
     heartbeat_s: Mapped[int] = mapped_column(
         default=int(os.getenv("HEARTBEAT_S")), nullable=False
     )
+    # raw heartbeats older than this are deleted once they have been rolled up.
+    heartbeat_retention_days: Mapped[int] = mapped_column(
+        default=int(os.getenv("HEARTBEAT_RETENTION_DAYS", 30)), nullable=False
+    )
@@ -11,7 +11,8 @@ from src.user.schemas import User
 from src.tag import schemas as tags_schemas
 from src.database import get_db
 from src.tenant import service, schemas
-from src.utils import CustomBigPage
+from src.job.models import JobStatus
+from src.utils import KeysetPage
 from src.exceptions import PermissionDenied
 
 router = APIRouter(prefix="/tenants", tags=["tenants"])
@@ -37,7 +38,7 @@ def read_tenant(
     return db_tenant
 
 
-@router.get("/", response_model=CustomBigPage[schemas.Tenant])
+@router.get("/", response_model=KeysetPage[schemas.Tenant])
 def read_tenants(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_active_user),
@@ -68,14 +69,15 @@ def delete_tenant(
     if tenant_id == 1:
         raise PermissionDenied()
     db_tenant = read_tenant(tenant_id, db)
-    deleted_tenant_id = service.delete_tenant(db, db_tenant)
-    return {
-        "id": deleted_tenant_id,
-        "msg": f"Tenant {deleted_tenant_id} eliminado exitosamente!",
-    }
+    job = service.enqueue_tenant_deletion(db, db_tenant)
+    if job.status == JobStatus.SUCCEEDED:
+        msg = f"Tenant {tenant_id} eliminado exitosamente!"
+    else:
+        msg = f"Tenant {tenant_id} en proceso de eliminación"
+    return {"id": tenant_id, "msg": msg, "job_id": job.id}
 
 
-@router.get("/{tenant_id}/tags", response_model=CustomBigPage[tags_schemas.Tag])
+@router.get("/{tenant_id}/tags", response_model=KeysetPage[tags_schemas.Tag])
 async def read_tags(
     tenant_id: int,
     db: Session = Depends(get_db),
@@ -1,3 +1,4 @@
+import os
 from pydantic import BaseModel, PositiveInt
 from typing import List, Optional
 from src.folder.schemas import Folder, FolderTenantList
@@ -31,6 +32,8 @@ class TenantUpdate(TenantCreate):
 class TenantDelete(BaseModel):
     id: int
     msg: str
+    # the deletion runs as a job, see GET /jobs/{job_id}
+    job_id: Optional[int] = None
 
 
 class TenantFull(Tenant):
@@ -39,6 +42,9 @@ class TenantFull(Tenant):
 
 class TenantSettings(BaseModel):
     heartbeat_s: PositiveInt
+    heartbeat_retention_days: PositiveInt = int(
+        os.getenv("HEARTBEAT_RETENTION_DAYS", 30)
+    )
 
     model_config = {"extra": "ignore"}
 
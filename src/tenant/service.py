@@ -1,12 +1,15 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import select, update
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.orm import Session
 from typing import Union
+from src.auth.acl import bump_acl_version
 from src.auth.dependencies import has_access_to_tenant
+from src.entity.models import Entity
 from src.entity.service import create_entity_auto, update_entity_tags
 from src.exceptions import PermissionDenied
-from src.tag.models import Tag, Type
+from src.tag.models import Tag, Type, entities_and_tags_table
 from src.tag.service import create_tag
 from src.tag.schemas import TagAdminCreate
 from src.tenant import schemas, models, exceptions
@@ -14,12 +17,27 @@ from src.tenant.utils import (
     check_tenant_exists,
     check_tenant_name_taken,
     filter_tag_ids,
+    invalidate_tenant_settings,
+)
+from src.folder.models import Folder
+from src.folder.service import (
+    count_folder_deletion_work,
+    create_root_folder,
+    delete_folders_in_batches,
+    get_root_folder,
 )
-from src.folder.service import create_root_folder, delete_folder
 from src.folder.schemas import FolderCreate
 from src.user.schemas import User
 from src.user.models import tenants_and_users_table
 from src.user.service import get_user
+from src.job.models import Job
+from src.job.runner import job_runner
+from src.job.service import (
+    JOB_BATCH_SIZE,
+    advance_job,
+    check_job_interrupted,
+    enqueue_job,
+)
 from pydantic import ValidationError
 
 load_dotenv()
@@ -32,7 +50,11 @@ def get_tenant(db: Session, tenant_id: int):
 
 def get_tenants(db: Session, user_id: int):
     user = get_user(db, user_id)
-    tenants = select(models.Tenant).where(models.Tenant.id != 1)
+    tenants = (
+        select(models.Tenant)
+        .where(models.Tenant.id != 1)
+        .order_by(models.Tenant.id)
+    )
     if user.is_admin:
         return tenants
     else:
@@ -129,19 +151,86 @@ def update_tenant(
     return tenant
 
 
-def delete_tenant(db: Session, db_tenant: schemas.Tenant):
+TENANT_DELETION_JOB = "delete-tenant"
+
+
+def run_tenant_deletion(db: Session, job: Job) -> None:
+    # every folder of the tenant (devices go to the root folder from tenant1), then
+    # its tags and finally the tenant itself
+    tenant_id = job.target_id
+    tenant_folders = Folder.tenant_id == tenant_id
+    tenant1_root_folder = get_root_folder(db, tenant_id=1)
+    tenant_tags = Tag.tenant_id == tenant_id
+    # the automatic tags of the folders go along with them
+    tags = db.scalar(
+        select(func.count(Tag.id)).where(tenant_tags, Tag.type != Type.FOLDER)
+    )
+    job.total = job.done + count_folder_deletion_work(db, tenant_folders) + tags
+    db.commit()
+    delete_folders_in_batches(db, job, tenant1_root_folder.id, tenant_folders)
+
+    job.total = job.done + db.scalar(select(func.count(Tag.id)).where(tenant_tags))
+    db.commit()
+    links = entities_and_tags_table.c
+    while True:
+        check_job_interrupted()
+        tag_ids = db.scalars(
+            select(Tag.id).where(tenant_tags).limit(JOB_BATCH_SIZE)
+        ).all()
+        if not tag_ids:
+            break
+        db.execute(delete(entities_and_tags_table).where(links.tag_id.in_(tag_ids)))
+        db.execute(
+            delete(Tag)
+            .where(Tag.id.in_(tag_ids))
+            .execution_options(synchronize_session="fetch")
+        )
+        advance_job(db, job, len(tag_ids))
+
+    entity_id = db.scalar(
+        select(models.Tenant.entity_id).where(models.Tenant.id == tenant_id)
+    )
+    bump_acl_version(db, tenant_ids=[tenant_id])
+    db.execute(
+        delete(tenants_and_users_table).where(
+            tenants_and_users_table.c.tenant_id == tenant_id
+        )
+    )
+    db.execute(
+        delete(models.TenantSettings).where(
+            models.TenantSettings.tenant_id == tenant_id
+        )
+    )
+    db.execute(delete(entities_and_tags_table).where(links.entity_id == entity_id))
+    db.execute(
+        delete(models.Tenant)
+        .where(models.Tenant.id == tenant_id)
+        .execution_options(synchronize_session="fetch")
+    )
+    db.execute(
+        delete(Entity)
+        .where(Entity.id == entity_id)
+        .execution_options(synchronize_session="fetch")
+    )
+    db.commit()
+    invalidate_tenant_settings(tenant_id)
+
+
+job_runner.register(TENANT_DELETION_JOB, run_tenant_deletion)
+
+
+def enqueue_tenant_deletion(db: Session, db_tenant: schemas.Tenant) -> Job:
     # sanity check
     if db_tenant.id == 1:
         raise PermissionDenied()
     check_tenant_exists(db, tenant_id=db_tenant.id)
-    for folder in db_tenant.folders:
-        # deleting only the root folder as children folders will be automatically deleted in cascade
-        if folder.parent_id == None:
-            delete_folder(db, folder)
+    return enqueue_job(db, TENANT_DELETION_JOB, db_tenant.id)
 
-    db.delete(db_tenant.entity)
-    db.commit()
-    return db_tenant.id
+
+def delete_tenant(db: Session, db_tenant: schemas.Tenant):
+    tenant_id = db_tenant.id
+    enqueue_tenant_deletion(db, db_tenant)
+    return tenant_id
 
 
 async def get_tenant_tags(
@@ -150,12 +239,13 @@ async def get_tenant_tags(
     tenant_id: Union[int, None] = None,
 ):
     check_tenant_exists(db, tenant_id)
-    if await has_access_to_tenant(tenant_id, db, user):
+    if await run_in_threadpool(has_access_to_tenant, tenant_id, db, user):
         return (
             select(Tag)
             .join(models.Tenant)
             .where(models.Tenant.id == tenant_id)
             .where(Tag.tenant_id == tenant_id)
+            .order_by(Tag.id)
         )
     else:
         raise PermissionDenied()
@@ -192,6 +282,7 @@ def create_tenant_settings(
     db.add(settings)
     db.commit()
     db.refresh(settings)
+    invalidate_tenant_settings(tenant_id)
     return settings
 
 
@@ -207,6 +298,7 @@ def update_tenant_settings(
         .values(**tenant_settings.model_dump(exclude_unset=True))
     )
     db.commit()
+    invalidate_tenant_settings(tenant_id)
     db.refresh(current_settings)
 
     return current_settings
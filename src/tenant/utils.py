@@ -1,7 +1,19 @@
+import os
+from dotenv import load_dotenv
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from src.tenant import exceptions, models
+from src.cache import LRUCache
+from src.tenant import exceptions, models, schemas
 from typing import Optional
 
+load_dotenv()
+
+# tenant settings are read on every heartbeat and online check but hardly ever change
+tenant_settings_cache = LRUCache(
+    max_size=int(os.getenv("TENANT_SETTINGS_CACHE_MAX_SIZE", 1024)),
+    ttl_s=float(os.getenv("TENANT_SETTINGS_CACHE_TTL_S", 60)),
+)
+
 def check_tenant_name_taken(db: Session, tenant_name: str, tenant_id: Optional[int] = None):
     tenant = db.query(models.Tenant).filter(models.Tenant.name == tenant_name).first()
     if tenant:
@@ -26,3 +38,26 @@ def filter_tag_ids(tags: dict, valid_tenant_id: int):
         elif t["tenant_id"] == valid_tenant_id:
             tag_ids.append(t["id"])
     return tag_ids
+
+
+def get_cached_tenant_settings(
+    db: Session, tenant_id: int
+) -> Optional[schemas.TenantSettings]:
+    settings = tenant_settings_cache.get(tenant_id)
+    if settings is None:
+        db_settings = db.scalar(
+            select(models.TenantSettings).where(
+                models.TenantSettings.tenant_id == tenant_id
+            )
+        )
+        if not db_settings:
+            return None
+        settings = schemas.TenantSettings.model_validate(
+            db_settings, from_attributes=True
+        )
+        tenant_settings_cache.set(tenant_id, settings)
+    return settings
+
+
+def invalidate_tenant_settings(tenant_id: int) -> None:
+    tenant_settings_cache.invalidate(tenant_id)
@@ -20,6 +20,8 @@ class User(AuditMixin, Base):
     last_login: Mapped[datetime] = mapped_column(
         default=func.now(), onupdate=func.now()
     )
+    # bumped whenever the tenants, folders or devices the user has access to change
+    acl_version: Mapped[int] = mapped_column(default=0, server_default="0")
     entity_id: Mapped[int] = mapped_column(ForeignKey(Entity.id))
     entity: Mapped["src.entity.models.Entity"] = relationship(
         "src.entity.models.Entity", foreign_keys=entity_id
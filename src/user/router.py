@@ -1,4 +1,5 @@
 from fastapi import Depends, APIRouter, HTTPException, Path
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi_pagination.ext.sqlalchemy import paginate
 from typing import List
@@ -12,16 +13,17 @@ from src.auth.dependencies import (
 )
 from src.database import get_db
 from src.device.schemas import DeviceList
+from src.device.service import with_online_status
 from src.folder.schemas import Folder
 from src.tenant.service import get_tenants
 from src.tenant.schemas import Tenant
-from src.utils import CustomBigPage
+from src.utils import KeysetPage
 from src.user import service, schemas, utils, exceptions
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
-@router.get("/", response_model=CustomBigPage[utils.UserTenant])
+@router.get("/", response_model=KeysetPage[utils.UserTenant])
 def read_users(
     db: Session = Depends(get_db),
     user: schemas.User = Depends(has_admin_or_owner_role),
@@ -46,9 +48,10 @@ async def create_user(
     db: Session = Depends(get_db),
     auth_user: schemas.User = Depends(has_admin_or_owner_role),
 ):
-    if not await can_assign_role(user.role_id, db, auth_user):
+    if not await run_in_threadpool(can_assign_role, user.role_id, db, auth_user):
         raise exceptions.PermissionDenied()
-    return service.create_user_full(db, user)
+    # hashing the password waits for the password hasher pool
+    return await run_in_threadpool(service.create_user_full, db, user)
 
 @router.patch("/{user_id}", response_model=utils.UserTenant)
 def update_user(
@@ -101,7 +104,7 @@ def assign_tenant(
     return user
 
 
-@router.get("/{user_id}/tenants", response_model=CustomBigPage[Tenant])
+@router.get("/{user_id}/tenants", response_model=KeysetPage[Tenant])
 async def read_tenants(
     user_id: str = Path(),
     db: Session = Depends(get_db),
@@ -113,7 +116,7 @@ async def read_tenants(
     return paginate(db, tenants)
 
 
-@router.get("/{user_id}/devices", response_model=CustomBigPage[DeviceList])
+@router.get("/{user_id}/devices", response_model=KeysetPage[DeviceList])
 async def read_devices(
     user_id: str = Path(),
     db: Session = Depends(get_db),
@@ -122,10 +125,10 @@ async def read_devices(
     if user_id == "me":
         user_id = user.id
     devices = service.get_devices(db, user_id=int(user_id))
-    return paginate(db, devices)
+    return paginate(db, with_online_status(devices))
 
 
-@router.get("/{user_id}/folders", response_model=CustomBigPage[Folder])
+@router.get("/{user_id}/folders", response_model=KeysetPage[Folder])
 async def read_folders(
     user_id: str = Path(),
     db: Session = Depends(get_db),
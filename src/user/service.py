@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from typing import Optional, List
 from src.exceptions import BadRequest
+from src.auth.acl import acl_cache, bump_acl_version
 from src.auth.utils import get_password_hash
 from src.role.service import check_role_exists
 from src.role import models as role_models
@@ -46,13 +47,14 @@ def get_user(db: Session, user_id: int) -> models.User:
 
 def get_users(db: Session, auth_user: models.User):
     if auth_user.is_admin:
-        return select(models.User)
+        return select(models.User).order_by(models.User.id)
     return (
         select(models.User)
         .join(tenants_and_users_table)
         .where(tenants_and_users_table.c.user_id == models.User.id)
         .where(tenants_and_users_table.c.tenant_id.in_(auth_user.get_tenants_ids()))
         .where(auth_user.role_id <= models.User.role_id)
+        .order_by(models.User.id)
     )
 
 
@@ -60,8 +62,12 @@ def get_folders(db: Session, user_id: int):
     user = get_user(db, user_id)
     if not user.is_admin:
         tenant_ids = user.get_tenants_ids()
-        return select(Folder).where(Folder.tenant_id.in_(tenant_ids))
-    return select(Folder)
+        return (
+            select(Folder)
+            .where(Folder.tenant_id.in_(tenant_ids))
+            .order_by(Folder.id)
+        )
+    return select(Folder).order_by(Folder.id)
 
 
 def get_devices(db: Session, user_id: int):
@@ -118,6 +124,7 @@ def update_user_tenants(db: Session, user: models.User, tenant_ids: List[int]):
         user.tenants = []
         db.commit()
         user.tenants = tenants
+        bump_acl_version(db, user_ids=[user.id])
         db.commit()
         db.refresh(user)
         return user
@@ -176,6 +183,7 @@ def delete_user(db: Session, db_user: schemas.User):
 
     db.delete(db_user)
     db.commit()
+    acl_cache.invalidate(db_user.id)
     return db_user.id
 
 
@@ -201,6 +209,7 @@ def assign_tenant(db: Session, user_id: int, tenant_id: int) -> utils.UserTenant
     user = get_user(db, user_id)
 
     user.add_tenant(tenant)
+    bump_acl_version(db, user_ids=[user.id])
     db.commit()
     db.refresh(user)
 
@@ -212,5 +221,9 @@ def create_user_full(db: Session, user_full: schemas.UserCreateFull):
     tenants = create_values.pop("tenants")
     tags = create_values.pop("tags")
     user = create_user(db, schemas.UserCreate(**create_values))
-    user = update_user(db, user, user_full)
+    # the password was already hashed by create_user
+    updated_user = schemas.UserUpdate(
+        **user_full.model_dump(exclude={"password"}, exclude_unset=True)
+    )
+    user = update_user(db, user, updated_user)
     return user
@@ -1,9 +1,111 @@
-from typing import TypeVar
-from fastapi_pagination import Page
-from fastapi_pagination.customization import CustomizedPage, UseParamsFields
+from fastapi import Query
+from fastapi_pagination.bases import CursorRawParams
+from fastapi_pagination.cursor import CursorPage, CursorParams
+from typing import Generic, TypeVar
+from sqlalchemy import (
+    ColumnElement,
+    DateTime,
+    Integer,
+    cast,
+    delete,
+    func,
+    literal,
+    select,
+    tuple_,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 
 
 T = TypeVar("T")
 
-BIG_PAGE_SIZE = 1_000_000
-CustomBigPage = CustomizedPage[Page[T], UseParamsFields(size=BIG_PAGE_SIZE)]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+DEFAULT_DELETE_BATCH_SIZE = 1000
+
+
+class KeysetParams(CursorParams):
+    size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size")
+    include_total: bool = Query(False, description="Include the total number of items")
+
+    def to_raw_params(self) -> CursorRawParams:
+        raw_params = super().to_raw_params()
+        raw_params.include_total = self.include_total
+        return raw_params
+
+
+# keyset (cursor) pagination: list queries must be ordered by a unique key, e.g. `id`,
+# and pages are fetched with `WHERE key > :last_seen` instead of OFFSET.
+class KeysetPage(CursorPage[T], Generic[T]):
+    __params_type__ = KeysetParams
+
+
+class unix_timestamp(FunctionElement):
+    # seconds since epoch for a datetime expression, rendered for each backend.
+    type = Integer()
+    name = "unix_timestamp"
+    inherit_cache = True
+
+
+@compiles(unix_timestamp)
+def _compile_unix_timestamp(element, compiler, **kw):
+    return compiler.process(func.unix_timestamp(*element.clauses), **kw)
+
+
+@compiles(unix_timestamp, "sqlite")
+def _compile_unix_timestamp_sqlite(element, compiler, **kw):
+    return compiler.process(cast(func.strftime("%s", *element.clauses), Integer), **kw)
+
+
+class from_unix_timestamp(FunctionElement):
+    # datetime for a number of seconds since epoch, rendered for each backend.
+    type = DateTime()
+    name = "from_unix_timestamp"
+    inherit_cache = True
+
+
+@compiles(from_unix_timestamp)
+def _compile_from_unix_timestamp(element, compiler, **kw):
+    return compiler.process(func.from_unixtime(*element.clauses), **kw)
+
+
+@compiles(from_unix_timestamp, "sqlite")
+def _compile_from_unix_timestamp_sqlite(element, compiler, **kw):
+    # matching the storage format SQLAlchemy uses for sqlite datetimes, otherwise the
+    # generated values would not compare equal to the ones bound from python.
+    return compiler.process(
+        func.datetime(*element.clauses, "unixepoch").concat(".000000"), **kw
+    )
+
+
+def time_bucket(timestamp: ColumnElement, seconds: int) -> ColumnElement:
+    # start of the `seconds` wide bucket (aligned to the epoch) a timestamp falls in.
+    epoch = unix_timestamp(timestamp)
+    # rendered inline so that the expression is identical wherever it appears
+    # (e.g. in both SELECT and GROUP BY).
+    return from_unix_timestamp(epoch - epoch % literal(seconds, literal_execute=True))
+
+
+def delete_in_batches(
+    db: Session,
+    model: type,
+    *criteria: ColumnElement,
+    batch_size: int = DEFAULT_DELETE_BATCH_SIZE,
+) -> int:
+    # deleting (and committing) at most `batch_size` rows at a time keeps every
+    # transaction, and the locks it holds, short.
+    keys = model.__mapper__.primary_key
+    key = keys[0] if len(keys) == 1 else tuple_(*keys)
+    deleted = 0
+    while True:
+        rows = db.execute(select(*keys).where(*criteria).limit(batch_size)).all()
+        if not rows:
+            break
+        values = [row[0] for row in rows] if len(keys) == 1 else rows
+        db.execute(delete(model).where(key.in_(values)))
+        db.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            break
+    return deleted
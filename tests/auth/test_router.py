@@ -4,17 +4,29 @@ import pytest
 from typing import Optional
 from dotenv import load_dotenv
 from jose import jwt
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from fastapi.testclient import TestClient
 from fastapi import status
 from fastapi.security import OAuth2PasswordRequestForm
+from src.auth import dependencies
+from src.auth import service as auth_service
+from src.auth import utils as auth_utils
 from src.auth.constants import ErrorCode
+from src.auth.hashing import password_hasher
+from src.auth.utils import TOKEN_CLAIMS_VERSION, verified_token_cache
+from src.role.schemas import RoleCreate
+from src.role.service import create_role
+from src.role.utils import load_role_registry, role_registry
 from src.user.schemas import User
+from src.user.service import get_user, update_user_tenants
 from tests.database import (
     app,
     session,
     client_fixture,
     client_authenticated,
+    client_with_middleware,
+    engine,
     mock_os_data,
     mock_vendor_data,
     admin_auth_tokens,
@@ -43,8 +55,47 @@ def test_login(client: TestClient) -> None:
         key=os.getenv("SECRET_KEY"),
         algorithms=[os.getenv("ALGORITHM")],
     )
-    user = User.model_validate_json(decoded_token["sub"])
-    assert user.role_name is not None
+    assert decoded_token["v"] == TOKEN_CLAIMS_VERSION
+    assert decoded_token["sub"] == "1"
+    # the role and the permissions are always read from the current user
+    assert "rid" not in decoded_token
+    assert "acl" not in decoded_token
+
+
+@pytest.mark.asyncio
+async def test_login_rejected_when_password_hasher_is_saturated(
+    client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+    admin_auth_tokens: dict,
+    user_auth_tokens: dict,
+) -> None:
+    rejected = password_hasher.stats()["rejected"]
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    response = client.post(
+        "/auth/token",
+        data={"username": "test-user-1@sia.com", "password": "_s3cr3tp@5sw0rd_"},
+    )
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE, response.text
+    assert response.json()["detail"] == ErrorCode.PASSWORD_HASHER_BUSY
+    assert response.headers["Retry-After"] == "1"
+
+    # the stats are only visible to admins
+    response = client.get("/status")
+    assert response.json() == {"status": "ok"}
+    response = client.get("/status/password-hasher")
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
+    response = client.get(
+        "/status/password-hasher",
+        headers={"Authorization": f"Bearer {(await user_auth_tokens)['access_token']}"},
+    )
+    assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
+    response = client.get(
+        "/status/password-hasher",
+        headers={
+            "Authorization": f"Bearer {(await admin_auth_tokens)['access_token']}"
+        },
+    )
+    assert response.json()["rejected"] == rejected + 1
 
 
 @pytest.mark.asyncio
@@ -85,6 +136,34 @@ async def test_logout(client: TestClient, admin_auth_tokens: dict) -> None:
     assert response.json()["msg"]
 
 
+@pytest.mark.asyncio
+async def test_refresh_tokens_are_stored_as_digests(
+    session: Session, client: TestClient
+) -> None:
+    tokens = []
+    for _ in range(2):
+        response = client.post(
+            "/auth/token",
+            data={"username": "test-user-1@sia.com", "password": "_s3cr3tp@5sw0rd_"},
+        )
+        assert response.status_code == status.HTTP_200_OK, response.text
+        tokens.append(response.json()["refresh_token"])
+
+    # every login gets its own token, found by its digest
+    assert tokens[0] != tokens[1]
+    for refresh_token in tokens:
+        db_refresh_token = await auth_service.get_refresh_token(session, refresh_token)
+        assert db_refresh_token.user_id == 1
+        assert db_refresh_token.token_digest != refresh_token
+        assert len(db_refresh_token.token_digest) == 64
+
+    # logging out only deletes the presented token
+    response = client.delete("/auth/token", params={"refresh_token": tokens[0]})
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert await auth_service.get_refresh_token(session, tokens[0]) is None
+    assert await auth_service.get_refresh_token(session, tokens[1]) is not None
+
+
 @pytest.mark.asyncio
 async def test_refresh_token(
     client: TestClient, get_expired_access_token: dict
@@ -139,6 +218,64 @@ async def test_read_devices_authorized(
     )  # we need to access "items" as we are using pagination
 
 
+@pytest.mark.asyncio
+async def test_user_is_loaded_once_per_request(
+    client_with_middleware: TestClient,
+    admin_auth_tokens: dict,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    lookups = []
+    get_user_by_id = dependencies.get_user_by_id
+
+    def count_lookup(db, user_id):
+        lookups.append(user_id)
+        return get_user_by_id(db, user_id)
+
+    monkeypatch.setattr(dependencies, "get_user_by_id", count_lookup)
+
+    response = client_with_middleware.get(
+        "/devices/",
+        headers={
+            "Authorization": f"Bearer {(await admin_auth_tokens)['access_token']}"
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert len(response.json()["items"]) == 3
+    # resolved by the middleware and reused by get_current_user
+    assert len(lookups) == 1
+
+
+@pytest.mark.asyncio
+async def test_verified_tokens_are_cached(
+    client: TestClient, admin_auth_tokens: dict, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    decoded = []
+    decode = auth_utils.jwt.decode
+
+    def count_decode(*args, **kwargs):
+        decoded.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth_utils.jwt, "decode", count_decode)
+    headers = {"Authorization": f"Bearer {(await admin_auth_tokens)['access_token']}"}
+    for _ in range(3):
+        response = client.get("/devices/", headers=headers)
+        assert response.status_code == status.HTTP_200_OK, response.text
+    # the signature is verified only on the first request
+    assert len(decoded) == 1
+    assert len(verified_token_cache) == 1
+
+
+def test_middleware_rejects_invalid_token(client_with_middleware: TestClient) -> None:
+    response = client_with_middleware.get(
+        "/status", headers={"Authorization": "Bearer invalid-token"}
+    )
+    assert response.status_code == status.HTTP_401_UNAUTHORIZED, response.text
+
+    response = client_with_middleware.get("/status")
+    assert response.status_code == status.HTTP_200_OK, response.text
+
+
 def test_read_devices_expired_token(client: TestClient) -> None:
     # manually created an expired access token for user with id=1 using auth.utils.create_access_token,
     # previously running "export ACCESS_TOKEN_EXPIRE_MINUTES=1"
@@ -185,6 +322,56 @@ async def test_read_tenant_authorized_owner(
     assert len(data["folders"]) == 4
 
 
+@pytest.mark.asyncio
+async def test_role_checks_do_not_query_roles(
+    session: Session, client: TestClient, owner_2_auth_tokens: dict
+) -> None:
+    load_role_registry(session)
+    headers = {"Authorization": f"Bearer {(await owner_2_auth_tokens)['access_token']}"}
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/tenants/1", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert not [s for s in statements if "FROM role" in s]
+
+    # the registry is reloaded after roles change
+    create_role(session, RoleCreate(name="auditor"))
+    assert len(role_registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_access_checks_use_acl_snapshot(
+    session: Session, client: TestClient, owner_2_auth_tokens: dict
+) -> None:
+    headers = {"Authorization": f"Bearer {(await owner_2_auth_tokens)['access_token']}"}
+    response = client.get("/tenants/1", headers=headers)  # compiling the snapshot
+    assert response.status_code == status.HTTP_200_OK, response.text
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        response = client.get("/tenants/1", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert not [s for s in statements if "tenants_and_users" in s]
+
+    # membership changes bump the ACL version, so the snapshot is compiled again
+    update_user_tenants(session, get_user(session, 2), [])
+    response = client.get("/tenants/1", headers=headers)
+    assert response.status_code == status.HTTP_403_FORBIDDEN, response.text
+
+
 @pytest.mark.asyncio
 async def test_read_tenant_unauthorized_owner(
     client: TestClient, owner_3_auth_tokens: dict
@@ -835,10 +1022,17 @@ async def test_login_with_and_without_a_device(
     rt3 = login("DeviceSerialno0001")
     rt4 = login("DeviceSerialno0001")
     rt5 = login("DeviceSerialno0002")
-    assert rt1 == rt2
-    assert rt2 != rt3
-    assert rt3 == rt4
-    assert rt4 != rt5
+    # only digests are stored, so every login gets its own refresh token
+    assert len({rt1, rt2, rt3, rt4, rt5}) == 5
+    for refresh_token, serial_number in (
+        (rt1, None),
+        (rt2, None),
+        (rt3, "DeviceSerialno0001"),
+        (rt4, "DeviceSerialno0001"),
+        (rt5, "DeviceSerialno0002"),
+    ):
+        db_refresh_token = await auth_service.get_refresh_token(session, refresh_token)
+        assert db_refresh_token.serial_number == serial_number
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime, timedelta, UTC
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.database import session, mock_os_data, mock_vendor_data
+
+from src.auth.acl import get_acl_version
+from src.auth.models import AuthPasswordRecoveryToken, AuthRefreshToken
+from src.auth.service import create_refresh_token, sweep_expired_tokens
+from src.auth.utils import hash_refresh_token
+from src.device.schemas import DeviceUpdate
+from src.device.service import get_device, update_device
+from src.folder.service import get_folder_by_name
+from src.user.service import get_user, update_user_tenants
+
+
+@pytest.mark.asyncio
+async def test_sweep_expired_tokens(session: Session) -> None:
+    valid_refresh_token = await create_refresh_token(session, 1)
+    expired_at = datetime.now(UTC) - timedelta(minutes=1)
+    session.add_all(
+        [
+            AuthRefreshToken(
+                user_id=1,
+                token_digest=hash_refresh_token(f"expired-token-{i}"),
+                expires_at=expired_at,
+            )
+            for i in range(3)
+        ]
+    )
+    session.add_all(
+        [
+            AuthPasswordRecoveryToken(
+                email="test-user-1@sia.com",
+                recovery_token="expired-recovery-token",
+                expires_at=expired_at,
+            ),
+            AuthPasswordRecoveryToken(
+                email="test-user-1@sia.com",
+                recovery_token="valid-recovery-token",
+                expires_at=datetime.now(UTC) + timedelta(minutes=10),
+            ),
+        ]
+    )
+    session.commit()
+
+    # deleted in batches of 2 rows
+    assert sweep_expired_tokens(session, batch_size=2) == {
+        "refresh_tokens": 3,
+        "recovery_tokens": 1,
+    }
+    assert session.scalars(select(AuthRefreshToken.token_digest)).all() == [
+        hash_refresh_token(valid_refresh_token)
+    ]
+    assert session.scalars(select(AuthPasswordRecoveryToken.recovery_token)).all() == [
+        "valid-recovery-token"
+    ]
+
+
+def test_acl_version_is_bumped_for_the_affected_users(session: Session) -> None:
+    def versions():
+        return [get_acl_version(session, user_id) for user_id in (1, 2, 3, 4)]
+
+    # tenant1: users 2 and 4, tenant2: user 3
+    device = get_device(session, 1)
+    assert device.folder.tenant_id == 1
+    before = versions()
+
+    # moves within a tenant leave every snapshot as it is
+    update_device(
+        session,
+        device,
+        DeviceUpdate(folder_id=get_folder_by_name(session, "folder2").id),
+    )
+    assert versions() == before
+
+    update_device(
+        session,
+        device,
+        DeviceUpdate(folder_id=get_folder_by_name(session, "folder3").id),
+    )
+    assert versions() == [before[0], before[1] + 1, before[2] + 1, before[3] + 1]
+
+    update_user_tenants(session, get_user(session, 3), [])
+    assert versions() == [before[0], before[1] + 1, before[2] + 2, before[3] + 1]
@@ -3,10 +3,13 @@ import pytest
 from datetime import datetime, timedelta, UTC
 from jose import jwt
 from fastapi.security import OAuth2PasswordBearer
+from starlette.middleware import Middleware
 from fastapi.testclient import TestClient
 from fastapi_pagination import add_pagination
 from typing import Generator
-from sqlalchemy import StaticPool, create_engine, update
+import aiosqlite
+from sqlalchemy import NullPool, StaticPool, create_engine, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
 from src import folder
@@ -19,7 +22,8 @@ from src.auth.dependencies import (
 from src.auth import service as auth_service
 from src.auth import utils as auth_utils
 from src.auth import models as auth_models
-from src.database import get_db, Base
+from src.auth import middleware as auth_middleware
+from src.database import get_db, get_async_db, Base
 from src.user.models import User
 from src.device.service import create_device
 from src.device.schemas import DeviceCreate
@@ -30,6 +34,11 @@ from src.user.service import create_user, assign_role
 from src.user.schemas import UserCreate
 from src.tenant.service import create_tenant
 from src.tenant.schemas import TenantCreate
+from src.tenant.utils import tenant_settings_cache
+from src.device.utils import device_ref_cache
+from src.role.utils import role_registry
+from src.auth.acl import acl_cache
+from src.auth.utils import verified_token_cache
 from src.entity.service import create_entity_auto
 from src.role.service import create_role
 from src.role.schemas import RoleCreate
@@ -49,6 +58,40 @@ engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+class SharedConnection:
+    """
+    The in-memory database only lives as long as its connection, so async sessions
+    reuse the one held by `engine` and never close it.
+    """
+
+    def __init__(self, connection):
+        object.__setattr__(self, "_connection", connection)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
+
+    def close(self):
+        pass
+
+
+async def shared_connection_creator():
+    connection = engine.raw_connection().driver_connection
+    return await aiosqlite.Connection(
+        lambda: SharedConnection(connection), iter_chunk_size=64
+    )
+
+
+async_engine = create_async_engine(
+    "sqlite+aiosqlite://", async_creator=shared_connection_creator, poolclass=NullPool
+)
+TestingAsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+
 def override_get_db():
     db = TestingSessionLocal()
     try:
@@ -58,10 +101,16 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 app.user_middleware = []  # removing middleware added in main.py for testing purposes.
 
 add_pagination(app)
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 
 @pytest.fixture
@@ -85,6 +134,11 @@ def session(
 ) -> Generator[Session, None, None]:
     # Create the tables in the test database
     Base.metadata.create_all(bind=engine)
+    tenant_settings_cache.clear()
+    device_ref_cache.clear()
+    role_registry.clear()
+    acl_cache.clear()
+    verified_token_cache.clear()
 
     db = TestingSessionLocal()
 
@@ -266,11 +320,27 @@ def client_fixture(session: Session):
     oauth2_scheme_override = OAuth2PasswordBearer(tokenUrl="auth/token")
     app.dependency_overrides[oauth2_scheme] = oauth2_scheme_override
     app.dependency_overrides[get_db] = get_db_session_override
+    app.dependency_overrides[get_async_db] = override_get_async_db
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def client_with_middleware(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    """
+    Returns an API client which runs the user context middleware removed above
+    """
+    monkeypatch.setattr(auth_middleware, "AsyncSessionLocal", TestingAsyncSessionLocal)
+    app.user_middleware = [
+        Middleware(auth_middleware.AuthUserRequestContextMiddleware)
+    ]
+    app.middleware_stack = None  # rebuilt on the next request
+    yield client
+    app.user_middleware = []
+    app.middleware_stack = None
+
+
 @pytest.fixture
 def client_authenticated(session: Session):
     """
@@ -283,6 +353,7 @@ def client_authenticated(session: Session):
         return user
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     app.dependency_overrides[get_current_active_user] = skip_auth
     return TestClient(app)
 
@@ -310,11 +381,7 @@ def expire_refresh_token(session: Session, user_id: int, refresh_token: str, del
     # creating the expired version of the jwt
     expires_at = (datetime.now() - timedelta(days=delta_days)).astimezone(UTC)
     expired_token = jwt.encode(
-        {
-            "sub": decoded_token["sub"],
-            "sn": decoded_token["sn"],
-            "exp": expires_at,
-        },
+        {**decoded_token, "exp": expires_at},
         key=os.getenv("SECRET_KEY"),
         algorithm=os.getenv("ALGORITHM"),
     )
@@ -323,9 +390,13 @@ def expire_refresh_token(session: Session, user_id: int, refresh_token: str, del
     session.execute(
         update(auth_models.AuthRefreshToken)
         .where(
-            auth_models.AuthRefreshToken.refresh_token == refresh_token,
+            auth_models.AuthRefreshToken.token_digest
+            == auth_utils.hash_refresh_token(refresh_token),
+        )
+        .values(
+            token_digest=auth_utils.hash_refresh_token(expired_token),
+            expires_at=expires_at,
         )
-        .values(refresh_token=expired_token, expires_at=expires_at)
     )
     session.commit()
     return expired_token
@@ -3,14 +3,17 @@ import pytest
 import time
 from typing import Union
 from datetime import datetime, timedelta
+from sqlalchemy import event, select
 from sqlalchemy.orm import Session
 from fastapi.testclient import TestClient
 from fastapi import status
 from src import device
 from src.device.constants import ErrorCode
+from src.device.models import Heartbeat
 from src.folder.constants import ErrorCode as FolderErrorCode
 from tests.database import (
     app,
+    async_engine,
     session,
     mock_os_data,
     mock_vendor_data,
@@ -512,3 +515,152 @@ def test_device_list_with_online_status(
         assert "id" in device.keys()
         if device_id == device["id"]:
             assert device["is_online"] == True
+
+
+def test_device_list_query_count_is_fixed(
+    session: Session,
+    mock_os_data: dict,
+    mock_vendor_data: dict,
+    client_authenticated: TestClient,
+):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = client_authenticated.get("/devices/")
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()["items"]) == 3
+        query_count = len(statements)
+
+        for i in range(5):
+            response = client_authenticated.post(
+                "/devices/",
+                json={
+                    "name": f"dev-count-{i}",
+                    "folder_id": 3,
+                    "MAC_addresses": TEST_MAC_ADDR,
+                    "local_ips": TEST_IP_ADDR,
+                    **mock_os_data,
+                    **mock_vendor_data,
+                },
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+        statements.clear()
+        response = client_authenticated.get("/devices/")
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.json()["items"]) == 8
+        assert len(statements) == query_count
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+
+def test_read_devices_with_cursor(session: Session, client_authenticated: TestClient):
+    response = client_authenticated.get("/devices/", params={"size": 2})
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [d["id"] for d in page["items"]] == [1, 2]
+    assert page["total"] is None
+    assert page["previous_page"] is None
+
+    response = client_authenticated.get(
+        "/devices/", params={"size": 2, "cursor": page["next_page"]}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    page = response.json()
+    assert [d["id"] for d in page["items"]] == [3]
+    assert page["next_page"] is None
+    assert page["previous_page"] is not None
+
+    response = client_authenticated.get("/devices/", params={"include_total": True})
+    assert response.json()["total"] == 3
+
+
+def test_read_devices_page_size_is_capped(
+    session: Session, client_authenticated: TestClient
+):
+    response = client_authenticated.get("/devices/", params={"size": 1_000_000})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+def test_read_device_heartbeats(session: Session, client_authenticated: TestClient):
+    for _ in range(3):
+        response = client_authenticated.post(
+            "/devices/1/heartbeat", json={"CPU_load": 10}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    now = datetime.now()
+    response = client_authenticated.get(
+        "/devices/DeviceSerialno0001/heartbeats",
+        params={
+            "from": (now - timedelta(hours=1)).isoformat(),
+            "to": (now + timedelta(minutes=1)).isoformat(),
+            "step": 60,
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["device_id"] == 1
+    assert data["step"] == 60
+    assert "from" in data and "to" in data
+    assert sum(point["samples"] for point in data["points"]) == 3
+    assert data["points"][-1]["CPU_load_avg"] == 10
+
+    # by default, the last 24 hours
+    response = client_authenticated.get("/devices/1/heartbeats")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["step"] == 120
+
+
+def test_read_device_heartbeats_with_invalid_range(
+    session: Session, client_authenticated: TestClient
+):
+    now = datetime.now()
+    response = client_authenticated.get(
+        "/devices/1/heartbeats",
+        params={"from": now.isoformat(), "to": (now - timedelta(hours=1)).isoformat()},
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == ErrorCode.INVALID_HEARTBEAT_HISTORY_RANGE
+
+
+def test_update_devices_heartbeats(session: Session, client_authenticated: TestClient):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = client_authenticated.post(
+            "/devices/heartbeats:batch",
+            json=[
+                {"device_id": 1, "CPU_load": 10},
+                {"device_id": "DeviceSerialno0002", "CPU_load": 20},
+                {"device_id": 3, "id_rust": "myRustDeskId", "pass_rust": "myPass"},
+                {"device_id": "UnknownSerialno", "CPU_load": 30},
+                {"device_id": 99, "CPU_load": 40},
+            ],
+        )
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    # one response per heartbeat, unknown devices included
+    assert [item["device_id"] for item in data] == [1, 2, 3, "UnknownSerialno", 99]
+    assert all(item["heartbeat_s"] == 120 for item in data[:3])
+    assert all(item["detail"] is None for item in data[:3])
+    assert all(item["detail"] == ErrorCode.DEVICE_NOT_FOUND for item in data[3:])
+    assert all(item["timestamp"] is None for item in data[3:])
+    heartbeats = session.scalars(select(Heartbeat)).all()
+    assert sorted(h.device_id for h in heartbeats) == [1, 2, 3]
+    inserts = [s for s in statements if s.startswith("INSERT INTO heartbeat_logs")]
+    assert len(inserts) == 1
+
+    response = client_authenticated.get("/devices/3")
+    assert response.json()["id_rust"] == "myRustDeskId"
+    assert response.json()["is_online"]
@@ -1,15 +1,26 @@
+import time
+from datetime import datetime, timedelta
 from pydantic import ValidationError
 import pytest
-from sqlalchemy import select
+from sqlalchemy import delete, event, select
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 from src.device.exceptions import (
     DeviceNameTaken,
     DeviceNotFound,
     InvalidExpirationMinutes,
     ExpiredShareDeviceURL,
+    HeartbeatBufferFull,
+    InvalidHeartbeatHistoryRange,
 )
 from src.folder.exceptions import FolderNotFound
-from tests.database import session, mock_os_data, mock_vendor_data
+from tests.database import (
+    session,
+    mock_os_data,
+    mock_vendor_data,
+    TestingSessionLocal,
+    engine,
+)
 from src.device.service import (
     create_device,
     get_device,
@@ -20,10 +31,30 @@ from src.device.service import (
     share_device,
     verify_share_url,
     create_share_url,
+    expire_invalid_share_urls,
+    revoke_share_url,
     update_device_heartbeat,
     read_device_heartbeats,
 )
-from src.device.utils import get_device_by_serial_number
+from src.device import ingest
+from src.device import service as device_service
+from src.device.ingest import HeartbeatBuffer, write_heartbeats
+from src.device.counters import refresh_devices_online_status
+from src.folder.tree import get_tenant_device_counts
+from src.device.rollups import compact_heartbeats, purge_heartbeats
+from src.device.models import (
+    Heartbeat,
+    DevicePresence,
+    HeartbeatRollupHour,
+    HeartbeatRollupMinute,
+    ShareLink,
+)
+from src.device.utils import (
+    DeviceRef,
+    get_device_by_serial_number,
+    hash_share_token,
+    resolve_device,
+)
 from src.device.schemas import (
     DeviceCreate,
     DeviceDelete,
@@ -32,7 +63,9 @@ from src.device.schemas import (
     Device,
     HeartBeat,
 )
-from src.tenant.service import get_tenant
+from src.tenant.models import TenantSettings
+from src.tenant.service import get_tenant, get_tenant_settings
+from src.tenant.utils import invalidate_tenant_settings
 from src.tag.models import entities_and_tags_table
 from src.tag.service import get_tags
 from src.user.service import get_user
@@ -358,6 +391,43 @@ def test_verify_share_url_has_expired(session: Session) -> None:
         _ = verify_share_url(session, expired_url.split("id=")[1])
 
 
+def test_device_can_have_several_share_links(session: Session) -> None:
+    first = share_device(session, 1, 1, ShareParams(expiration_minutes=1))
+    second = share_device(session, 1, 1, ShareParams(expiration_minutes=1))
+    first_token = first.url.split("id=")[1]
+    second_token = second.url.split("id=")[1]
+
+    links = session.scalars(select(ShareLink).where(ShareLink.device_id == 1)).all()
+    assert len(links) == 2
+    # tokens are not stored, only their digest
+    assert {link.token_digest for link in links} == {
+        hash_share_token(first_token),
+        hash_share_token(second_token),
+    }
+    assert all(link.created_by == 1 for link in links)
+    assert verify_share_url(session, first_token)
+    assert verify_share_url(session, second_token)
+
+    revoke_share_url(session, 1)
+    with pytest.raises(DeviceNotFound):
+        verify_share_url(session, first_token)
+
+
+def test_expired_share_links_are_deleted(session: Session) -> None:
+    share_device(session, 1, 1, ShareParams(expiration_minutes=1))
+    session.add(
+        ShareLink(
+            device_id=1,
+            token_digest=hash_share_token("expired-token"),
+            expires_at=datetime.now() - timedelta(minutes=1),
+        )
+    )
+    session.commit()
+
+    assert expire_invalid_share_urls(session) == 1
+    assert len(session.scalars(select(ShareLink)).all()) == 1
+
+
 @pytest.mark.parametrize(
     "serial_number, expected_device_id",
     [
@@ -396,3 +466,445 @@ def test_device_is_online(session: Session):
     # as the heartbeat is recent, the device will show up online
     device = get_device(session, device_id)
     assert device.is_online == True
+
+
+def test_heartbeat_buffer_flush(session: Session):
+    buffer = HeartbeatBuffer(batch_size=2, session_factory=TestingSessionLocal)
+    timestamp = datetime.now()
+    for device_id in [1, 2, 3]:
+        buffer.put({"device_id": device_id, "timestamp": timestamp, "CPU_load": 10})
+    buffer.put(
+        {
+            "device_id": 1,
+            "timestamp": timestamp,
+            "id_rust": "newRustDeskId",
+            "pass_rust": "newRustDeskPass",
+        }
+    )
+    assert buffer.size == 4
+    assert session.scalars(select(Heartbeat)).all() == []
+
+    assert buffer.flush() == 4
+    assert buffer.size == 0
+    assert len(session.scalars(select(Heartbeat)).all()) == 4
+
+    device = get_device(session, 1)
+    session.refresh(device)
+    assert device.id_rust == "newRustDeskId"
+    assert device.pass_rust == "newRustDeskPass"
+
+
+def test_heartbeat_buffer_is_bounded(session: Session):
+    buffer = HeartbeatBuffer(
+        max_size=1, put_timeout_s=0, session_factory=TestingSessionLocal
+    )
+    buffer.put({"device_id": 1, "timestamp": datetime.now()})
+    with pytest.raises(HeartbeatBufferFull):
+        buffer.put({"device_id": 2, "timestamp": datetime.now()})
+
+
+def test_heartbeat_buffer_non_blocking_put(session: Session):
+    buffer = HeartbeatBuffer(
+        max_size=1, put_timeout_s=60, session_factory=TestingSessionLocal
+    )
+    buffer.put({"device_id": 1, "timestamp": datetime.now()}, block=False)
+    started_at = time.monotonic()
+    with pytest.raises(HeartbeatBufferFull):
+        buffer.put({"device_id": 2, "timestamp": datetime.now()}, block=False)
+    assert time.monotonic() - started_at < 1
+
+
+def test_heartbeat_buffer_rejects_whole_batches(session: Session):
+    buffer = HeartbeatBuffer(
+        max_size=3, flush_interval_s=60, session_factory=TestingSessionLocal
+    )
+    buffer.start()
+    buffer.enqueue_many(
+        session, [{"device_id": 1, "timestamp": datetime.now()} for _ in range(2)]
+    )
+    with pytest.raises(HeartbeatBufferFull):
+        buffer.enqueue_many(
+            session,
+            [{"device_id": 2, "timestamp": datetime.now()} for _ in range(2)],
+            block=False,
+        )
+    # nothing from the rejected batch was queued
+    assert buffer.size == 2
+    buffer.stop()
+    heartbeats = session.scalars(select(Heartbeat)).all()
+    assert [h.device_id for h in heartbeats] == [1, 1]
+
+
+def test_heartbeat_buffer_drops_only_bad_entries(session: Session):
+    buffer = HeartbeatBuffer(batch_size=5, session_factory=TestingSessionLocal)
+    timestamp = datetime.now()
+    buffer.put_many(
+        [
+            {"device_id": 1, "timestamp": timestamp},
+            {"device_id": 2, "timestamp": timestamp},
+            {"device_id": None, "timestamp": timestamp},
+            {"device_id": 3, "timestamp": timestamp},
+            {"device_id": 1, "timestamp": timestamp},
+        ]
+    )
+    assert buffer.flush() == 4
+    heartbeats = session.scalars(select(Heartbeat)).all()
+    assert sorted(h.device_id for h in heartbeats) == [1, 1, 2, 3]
+
+
+def test_heartbeat_buffer_keeps_batches_on_transient_errors(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    buffer = HeartbeatBuffer(batch_size=4, session_factory=TestingSessionLocal)
+    attempts = []
+
+    def unavailable(db, entries):
+        attempts.append(len(entries))
+        raise OperationalError("INSERT", {}, Exception("server has gone away"))
+
+    buffer.put_many(
+        [{"device_id": device_id, "timestamp": datetime.now()} for device_id in [1, 2, 3]]
+    )
+    monkeypatch.setattr(ingest, "write_heartbeats", unavailable)
+    assert buffer.flush() == 0
+    # tried once rather than bisected, and kept for the next flush
+    assert attempts == [3]
+    assert buffer.size == 3
+    assert buffer.retry_delay_s == buffer.flush_interval_s
+    assert buffer.flush() == 0
+    assert buffer.retry_delay_s == 2 * buffer.flush_interval_s
+
+    monkeypatch.setattr(ingest, "write_heartbeats", write_heartbeats)
+    assert buffer.flush() == 3
+    assert buffer.size == 0
+    assert buffer.retry_delay_s == 0
+    heartbeats = session.scalars(select(Heartbeat)).all()
+    assert sorted(h.device_id for h in heartbeats) == [1, 2, 3]
+
+
+def test_heartbeat_buffer_flushes_on_stop(session: Session):
+    buffer = HeartbeatBuffer(flush_interval_s=60, session_factory=TestingSessionLocal)
+    buffer.start()
+    assert buffer.running
+    buffer.enqueue(session, {"device_id": 1, "timestamp": datetime.now()})
+    buffer.stop()
+    assert not buffer.running
+    assert len(session.scalars(select(Heartbeat)).all()) == 1
+
+
+def test_device_presence_is_upserted(session: Session):
+    device_id = 1
+    assert session.get(DevicePresence, device_id) is None
+
+    update_device_heartbeat(
+        session, device_id, HeartBeat(CPU_load=10, MEM_load_mb=20, free_space_mb=30)
+    )
+    presence = session.get(DevicePresence, device_id)
+    assert presence.CPU_load == 10
+    assert presence.credentials_updated_at is None
+    first_heartbeat_at = presence.last_heartbeat_at
+
+    # missing metrics keep their last known value
+    update_device_heartbeat(
+        session,
+        "DeviceSerialno0001",
+        HeartBeat(CPU_load=50, id_rust="myRustDeskId", pass_rust="myRustDeskPass"),
+    )
+    session.refresh(presence)
+    assert presence.CPU_load == 50
+    assert presence.MEM_load_mb == 20
+    assert presence.free_space_mb == 30
+    assert presence.last_heartbeat_at >= first_heartbeat_at
+    assert presence.credentials_updated_at == presence.last_heartbeat_at
+    assert len(session.scalars(select(DevicePresence)).all()) == 1
+
+    devices = session.execute(get_devices(session, user_id=1)).fetchall()
+    timestamps = {d.id: d.heartbeat_timestamp for d in devices}
+    assert timestamps[device_id] == presence.last_heartbeat_at
+    assert timestamps[2] is None
+
+
+def test_get_devices_computes_online_status(session: Session):
+    update_device_heartbeat(session, 1, HeartBeat(CPU_load=10))
+    devices = session.execute(get_devices(session, user_id=1)).fetchall()
+    assert {d.id: d.is_online for d in devices} == {1: True, 2: False, 3: False}
+    assert all(d.is_online == get_device(session, d.id).is_online for d in devices)
+
+    # tenants without settings fall back to HEARTBEAT_S in SQL as well
+    session.execute(delete(TenantSettings).where(TenantSettings.tenant_id == 1))
+    session.commit()
+    invalidate_tenant_settings(1)
+    devices = session.execute(get_devices(session, user_id=1)).fetchall()
+    assert {d.id: d.is_online for d in devices} == {1: True, 2: False, 3: False}
+    assert all(d.is_online == get_device(session, d.id).is_online for d in devices)
+
+    # an old heartbeat makes the device show up offline
+    presence = session.get(DevicePresence, 1)
+    presence.last_heartbeat_at = datetime.now() - timedelta(days=1)
+    session.commit()
+    devices = session.execute(get_devices(session, user_id=1)).fetchall()
+    assert not any(d.is_online for d in devices)
+
+
+def test_compact_heartbeats(session: Session):
+    now = datetime(2026, 1, 1, 12, 30, 20)
+    heartbeats = [
+        (1, datetime(2026, 1, 1, 10, 5, 10), 10),
+        (1, datetime(2026, 1, 1, 10, 5, 50), 30),
+        (1, datetime(2026, 1, 1, 10, 6, 0), 50),
+        (2, datetime(2026, 1, 1, 11, 0, 0), 70),
+        # still within the grace period, left for the next run
+        (2, datetime(2026, 1, 1, 12, 29, 30), 90),
+    ]
+    write_heartbeats(
+        session,
+        [
+            {"device_id": device_id, "timestamp": timestamp, "CPU_load": cpu_load}
+            for device_id, timestamp, cpu_load in heartbeats
+        ],
+    )
+
+    minutes_until, hours_until = compact_heartbeats(session, now)
+    assert minutes_until == datetime(2026, 1, 1, 12, 29)
+    assert hours_until == datetime(2026, 1, 1, 12, 0)
+
+    minutes = session.scalars(
+        select(HeartbeatRollupMinute).order_by(
+            HeartbeatRollupMinute.device_id, HeartbeatRollupMinute.bucket
+        )
+    ).all()
+    assert [(m.device_id, m.bucket, m.samples) for m in minutes] == [
+        (1, datetime(2026, 1, 1, 10, 5), 2),
+        (1, datetime(2026, 1, 1, 10, 6), 1),
+        (2, datetime(2026, 1, 1, 11, 0), 1),
+    ]
+    assert minutes[0].CPU_load_min == 10
+    assert minutes[0].CPU_load_avg == 20
+    assert minutes[0].CPU_load_max == 30
+    assert minutes[0].MEM_load_mb_avg is None
+
+    hours = session.scalars(
+        select(HeartbeatRollupHour).order_by(HeartbeatRollupHour.device_id)
+    ).all()
+    assert [(h.device_id, h.bucket, h.samples) for h in hours] == [
+        (1, datetime(2026, 1, 1, 10), 3),
+        (2, datetime(2026, 1, 1, 11), 1),
+    ]
+    assert hours[0].CPU_load_min == 10
+    assert hours[0].CPU_load_avg == 30
+    assert hours[0].CPU_load_max == 50
+
+    # running again does not roll up the same buckets twice
+    assert compact_heartbeats(session, now) == (minutes_until, hours_until)
+    assert len(session.scalars(select(HeartbeatRollupMinute)).all()) == 3
+
+
+def test_compact_heartbeats_after_a_gap(session: Session):
+    # no heartbeats at all for longer than the window rolled up in a single run
+    write_heartbeats(session, [{"device_id": 1, "timestamp": datetime(2026, 1, 1, 10)}])
+    compact_heartbeats(session, datetime(2026, 1, 1, 12))
+    write_heartbeats(session, [{"device_id": 1, "timestamp": datetime(2026, 1, 5, 10)}])
+
+    now = datetime(2026, 1, 5, 12)
+    assert compact_heartbeats(session, now) == (
+        datetime(2026, 1, 5, 11, 59),
+        datetime(2026, 1, 5, 11),
+    )
+    minutes = session.scalars(
+        select(HeartbeatRollupMinute.bucket).order_by(HeartbeatRollupMinute.bucket)
+    ).all()
+    assert minutes == [datetime(2026, 1, 1, 10), datetime(2026, 1, 5, 10)]
+    hours = session.scalars(
+        select(HeartbeatRollupHour.bucket).order_by(HeartbeatRollupHour.bucket)
+    ).all()
+    assert hours == [datetime(2026, 1, 1, 10), datetime(2026, 1, 5, 10)]
+
+
+def test_purge_heartbeats(session: Session):
+    now = datetime.now()
+    old = now - timedelta(days=10)
+    write_heartbeats(
+        session,
+        [
+            {"device_id": 1, "timestamp": old},  # tenant1
+            {"device_id": 3, "timestamp": old},  # tenant2
+            {"device_id": 3, "timestamp": now},
+        ],
+    )
+    tenant_settings = get_tenant_settings(session, 2)
+    tenant_settings.heartbeat_retention_days = 7
+    session.commit()
+
+    minutes_until, hours_until = compact_heartbeats(session, now)
+    assert purge_heartbeats(session, now, minutes_until, hours_until) == 1
+
+    # only tenant2 heartbeats past its retention, which have been rolled up, are gone
+    heartbeats = session.scalars(select(Heartbeat).order_by(Heartbeat.id)).all()
+    assert [(h.device_id, h.timestamp) for h in heartbeats] == [(1, old), (3, now)]
+
+
+def test_purge_heartbeats_of_tenants_without_settings(session: Session):
+    now = datetime.now()
+    old = now - timedelta(days=40)
+    write_heartbeats(
+        session,
+        [
+            {"device_id": 1, "timestamp": old},  # tenant1, without settings
+            {"device_id": 3, "timestamp": old},  # tenant2
+            {"device_id": 3, "timestamp": now},
+        ],
+    )
+    session.execute(delete(TenantSettings).where(TenantSettings.tenant_id == 1))
+    tenant_settings = get_tenant_settings(session, 2)
+    tenant_settings.heartbeat_retention_days = 60
+    session.commit()
+
+    minutes_until, hours_until = compact_heartbeats(session, now)
+    purge_heartbeats(session, now, minutes_until, hours_until)
+
+    # tenant1 heartbeats fall back to the default retention
+    heartbeats = session.scalars(select(Heartbeat).order_by(Heartbeat.id)).all()
+    assert [(h.device_id, h.timestamp) for h in heartbeats] == [(3, old), (3, now)]
+
+
+def test_read_device_heartbeats(session: Session):
+    now = datetime(2026, 1, 1, 12, 30, 20)
+    heartbeats = [
+        (datetime(2026, 1, 1, 10, 5, 10), 10),
+        (datetime(2026, 1, 1, 10, 45, 0), 30),
+        (datetime(2026, 1, 1, 11, 10, 0), 50),
+        # not rolled up yet, read from the raw heartbeats
+        (datetime(2026, 1, 1, 11, 50, 0), 70),
+    ]
+    write_heartbeats(
+        session,
+        [
+            {"device_id": 1, "timestamp": timestamp, "CPU_load": cpu_load}
+            for timestamp, cpu_load in heartbeats
+        ],
+    )
+    compact_heartbeats(session, datetime(2026, 1, 1, 11, 30))
+
+    history = read_device_heartbeats(
+        session, 1, datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 12), 3600
+    )
+    assert history.step == 3600
+    assert [(p.timestamp, p.samples) for p in history.points] == [
+        (datetime(2026, 1, 1, 10), 2),
+        (datetime(2026, 1, 1, 11), 2),
+    ]
+    assert history.points[1].CPU_load_min == 50
+    assert history.points[1].CPU_load_avg == 60
+    assert history.points[1].CPU_load_max == 70
+
+    # the step is widened to keep the number of points bounded
+    history = read_device_heartbeats(session, 1, now - timedelta(days=365), now, 60)
+    assert history.step == 9 * 3600
+    assert len(history.points) == 1
+
+
+def test_read_device_heartbeats_is_bounded(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(device_service, "HEARTBEAT_HISTORY_MAX_POINTS", 3)
+    timestamps = [
+        datetime(2026, 1, 1, 10, 0, 40),
+        datetime(2026, 1, 1, 10, 1, 10),
+        datetime(2026, 1, 1, 10, 2, 10),
+        datetime(2026, 1, 1, 10, 3, 10),
+    ]
+    write_heartbeats(
+        session, [{"device_id": 1, "timestamp": timestamp} for timestamp in timestamps]
+    )
+
+    # 3 minutes starting mid-minute touch 4 one-minute buckets: the step is widened
+    # rather than the most recent heartbeats dropped.
+    history = read_device_heartbeats(
+        session, 1, datetime(2026, 1, 1, 10, 0, 30), datetime(2026, 1, 1, 10, 3, 30), 60
+    )
+    assert history.step == 120
+    assert [(p.timestamp, p.samples) for p in history.points] == [
+        (datetime(2026, 1, 1, 10), 2),
+        (datetime(2026, 1, 1, 10, 2), 2),
+    ]
+
+
+def test_read_device_heartbeats_with_invalid_range(session: Session):
+    now = datetime.now()
+    with pytest.raises(InvalidHeartbeatHistoryRange):
+        read_device_heartbeats(session, 1, now, now - timedelta(hours=1))
+
+
+def test_resolve_device(session: Session):
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    device = get_device(session, 1)
+    device_ref = resolve_device(session, "DeviceSerialno0001")
+    assert device_ref == DeviceRef(1, "DeviceSerialno0001", device.folder_id, 1)
+
+    # hits are served without querying the database, by serial number or id
+    event.listen(engine, "before_cursor_execute", count_statement)
+    try:
+        assert resolve_device(session, "DeviceSerialno0001") == device_ref
+        assert resolve_device(session, 1) == device_ref
+    finally:
+        event.remove(engine, "before_cursor_execute", count_statement)
+    assert statements == []
+
+    # updating the device invalidates its entries
+    tenant2_folder = get_tenant(session, 2).folders[0]
+    update_device(session, device, DeviceUpdate(folder_id=tenant2_folder.id))
+    device_ref = resolve_device(session, "DeviceSerialno0001")
+    assert device_ref.folder_id == tenant2_folder.id
+    assert device_ref.tenant_id == 2
+
+    with pytest.raises(DeviceNotFound):
+        resolve_device(session, "UnknownSerialno")
+
+
+
+def test_folder_device_counts_are_maintained(session: Session):
+    folder_1_id = get_device(session, 1).folder_id
+    folder_2_id = get_device(session, 2).folder_id
+    root_folder_id = get_device(session, 1).folder.parent_id
+
+    def counts():
+        return {c.folder_id: c for c in get_tenant_device_counts(session, 1)}
+
+    root_counts = counts()[root_folder_id]
+    assert (root_counts.device_count, root_counts.online_count) == (2, 0)
+
+    # the counters follow online/offline transitions once they are refreshed
+    update_device_heartbeat(session, 1, HeartBeat(CPU_load=10))
+    assert refresh_devices_online_status(session) == 1
+    assert refresh_devices_online_status(session) == 0
+    root_counts = counts()[root_folder_id]
+    assert (root_counts.device_count, root_counts.online_count) == (2, 1)
+    assert root_counts.SO_name_counts["android"].model_dump() == {
+        "devices": 2,
+        "online": 1,
+    }
+    assert counts()[folder_1_id].online_count == 1
+
+    # ...and device moves
+    update_device(
+        session,
+        get_device(session, 1),
+        DeviceUpdate(folder_id=folder_2_id, vendor_name="lenovo"),
+    )
+    folder_2_counts = counts()[folder_2_id]
+    assert (folder_2_counts.device_count, folder_2_counts.online_count) == (2, 1)
+    assert {v: c.devices for v, c in folder_2_counts.vendor_name_counts.items()} == {
+        "samsung": 1,
+        "lenovo": 1,
+    }
+    assert counts()[folder_1_id].device_count == 0
+
+    presence = session.get(DevicePresence, 1)
+    presence.last_heartbeat_at = datetime.now() - timedelta(days=1)
+    session.commit()
+    assert refresh_devices_online_status(session) == 1
+    assert counts()[root_folder_id].online_count == 0
@@ -11,12 +11,17 @@ from tests.database import (
     mock_vendor_data,
     client_authenticated,
 )
+from src.folder.service import get_folder, get_root_folder
+from src.folder.utils import get_subtree_folder_ids
+from src.device.service import get_device
 
 
 def test_read_folders(session: Session, client_authenticated: TestClient) -> None:
     response = client_authenticated.get("/folders/")
     assert response.status_code == status.HTTP_200_OK
-    assert len(response.json()) == 5
+    data = response.json()
+    assert "items" in data
+    assert "next_page" in data
 
 
 def test_read_folder(session: Session, client_authenticated: TestClient) -> None:
@@ -249,3 +254,105 @@ def test_delete_non_existent_folder(
     folder_id = 16
     response = client_authenticated.delete(f"/folders/{folder_id}")
     assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_read_folder_tree(session: Session, client_authenticated: TestClient) -> None:
+    root_folder = get_root_folder(session, tenant_id=1)
+    response = client_authenticated.get(
+        f"/folders/{root_folder.id}/tree", params={"depth": 2, "include": "counts"}
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert data["id"] == root_folder.id
+    assert data["device_count"] == 2
+    assert data["online_count"] == 0
+    assert "devices" not in data
+    folder_1, folder_2 = data["children"]
+    assert (folder_1["name"], folder_1["depth"], folder_1["device_count"]) == ("folder1", 1, 1)
+    assert folder_1["children_count"] == 1
+    assert [sf["name"] for sf in folder_1["children"]] == ["subfolder1"]
+    assert folder_2["name"] == "folder2"
+
+    # only the requested levels are expanded
+    response = client_authenticated.get(
+        f"/folders/{folder_1['id']}/tree", params={"depth": 0, "include": "devices"}
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert data["children"] == []
+    assert data["children_count"] == 1
+    assert [d["name"] for d in data["devices"]] == ["dev1"]
+    assert "device_count" not in data
+
+
+def test_read_folder_tree_children_cursor(
+    session: Session, client_authenticated: TestClient
+) -> None:
+    root_folder = get_root_folder(session, tenant_id=1)
+    response = client_authenticated.get(
+        f"/folders/{root_folder.id}/tree", params={"size": 1}
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert [f["name"] for f in data["children"]] == ["folder1"]
+    assert data["children_cursor"] == data["children"][0]["id"]
+
+    response = client_authenticated.get(
+        f"/folders/{root_folder.id}/tree",
+        params={"size": 1, "after": data["children_cursor"]},
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert [f["name"] for f in data["children"]] == ["folder2"]
+    assert "children_cursor" not in data
+
+
+def test_move_to_folder(session: Session, client_authenticated: TestClient) -> None:
+    folder_ids = {}
+    for name, parent in (("a", None), ("b", "a"), ("c", None)):
+        response = client_authenticated.post(
+            "/folders/",
+            json={"name": name, "tenant_id": 1, "parent_id": folder_ids.get(parent)},
+        )
+        assert response.status_code == status.HTTP_200_OK, response.text
+        folder_ids[name] = response.json()["id"]
+    a, b, c = folder_ids["a"], folder_ids["b"], folder_ids["c"]
+
+    # b is moved out of a as well, both end up right under c
+    response = client_authenticated.post(
+        f"/folders/{c}/move", json={"folder_ids": [b, a], "device_ids": [2, 1]}
+    )
+    assert response.status_code == status.HTTP_200_OK, response.text
+    assert response.json() == {"id": c, "folder_ids": [a, b], "device_ids": [1, 2]}
+    assert get_subtree_folder_ids(session, c) == [c, a, b]
+    assert get_subtree_folder_ids(session, a) == [a]
+    assert get_folder(session, b).parent_id == c
+    assert {get_device(session, d).folder_id for d in (1, 2)} == {c}
+    response = client_authenticated.get(
+        f"/folders/{get_root_folder(session, tenant_id=1).id}/tree",
+        params={"include": "counts"},
+    )
+    assert [
+        (f["id"], f["device_count"]) for f in response.json()["children"]
+    ][-1] == (c, 2)
+
+    response = client_authenticated.post(f"/folders/{a}/move", json={"folder_ids": [c]})
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == ErrorCode.FOLDER_CANNOT_BE_MOVED_INTO_ITSELF
+
+    tenant_2_folder = get_root_folder(session, tenant_id=2)
+    response = client_authenticated.post(
+        f"/folders/{c}/move", json={"folder_ids": [tenant_2_folder.id]}
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == ErrorCode.FOLDER_TENANT_MISMATCH
+
+    response = client_authenticated.post(
+        f"/folders/{c}/move", json={"device_ids": [3]}  # tenant2
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == ErrorCode.FOLDER_TENANT_MISMATCH
+    assert get_device(session, 3).folder.tenant_id == 2
+
+    response = client_authenticated.post(f"/folders/{c}/move", json={"device_ids": [99]})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
@@ -6,6 +6,7 @@ from src.tenant.exceptions import TenantNotFound
 from tests.database import session, mock_os_data, mock_vendor_data
 
 from src.folder.exceptions import (
+    FolderCannotBeMovedIntoItself,
     FolderNameTaken,
     FolderNotFound,
 )
@@ -37,7 +38,8 @@ from src.device.models import Device
 from src.device.service import create_device
 from src.device.schemas import DeviceCreate
 from src.device.utils import get_devices_in_tree
-from src.folder.models import Folder
+from src.folder.models import Folder, FolderClosure
+from src.folder.utils import get_subtree_folder_ids
 
 
 def test_create_folder(session: Session) -> None:
@@ -351,3 +353,34 @@ def test_delete_folder_and_subfolders(session: Session, mock_os_data: dict, mock
     device_ids = get_devices_in_tree(session, folder_tree)
     devs = session.scalars(select(Device).where(Device.id.in_(device_ids))).all()
     assert all(d.folder_id == root_folder.id for d in devs)
+
+
+def test_folder_closure_is_maintained(session: Session) -> None:
+    a = create_folder(session, FolderCreate(name="a", tenant_id=1))
+    b = create_folder(session, FolderCreate(name="b", tenant_id=1, parent_id=a.id))
+    c = create_folder(session, FolderCreate(name="c", tenant_id=1, parent_id=b.id))
+    d = create_folder(session, FolderCreate(name="d", tenant_id=1))
+    root_folder = get_root_folder(session, tenant_id=1)
+
+    assert get_subtree_folder_ids(session, a.id) == [a.id, b.id, c.id]
+    assert get_folder_ids_in_tree(a) == [a.id, b.id, c.id]
+    assert set(get_subtree_folder_ids(session, root_folder.id)) >= {a.id, b.id, c.id, d.id}
+
+    # moving b (and c along with it) under d
+    update_folder(session, b, FolderUpdate(parent_id=d.id))
+    assert get_subtree_folder_ids(session, a.id) == [a.id]
+    assert get_subtree_folder_ids(session, d.id) == [d.id, b.id, c.id]
+    depths = session.execute(
+        select(FolderClosure.ancestor_id, FolderClosure.depth).where(
+            FolderClosure.descendant_id == c.id
+        )
+    ).all()
+    assert dict(depths) == {c.id: 0, b.id: 1, d.id: 2, root_folder.id: 3}
+
+    with pytest.raises(FolderCannotBeMovedIntoItself):
+        update_folder(session, d, FolderUpdate(parent_id=c.id))
+
+    delete_folder(session, d)
+    assert not session.scalars(
+        select(FolderClosure).where(FolderClosure.descendant_id.in_([b.id, c.id, d.id]))
+    ).all()
@@ -0,0 +1,39 @@
+from sqlalchemy.orm import Session
+from fastapi.testclient import TestClient
+from fastapi import status
+from src.job.constants import ErrorCode
+from tests.database import (
+    app,
+    session,
+    mock_os_data,
+    mock_vendor_data,
+    client_authenticated,
+)
+
+
+def test_read_job(session: Session, client_authenticated: TestClient) -> None:
+    response = client_authenticated.post(
+        "/folders/", json={"name": "folder5", "tenant_id": 1}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    folder_id = response.json()["id"]
+
+    response = client_authenticated.delete(f"/folders/{folder_id}")
+    assert response.status_code == status.HTTP_200_OK
+    job_id = response.json()["job_id"]
+
+    response = client_authenticated.get(f"/jobs/{job_id}")
+    assert response.status_code == status.HTTP_200_OK, response.text
+    data = response.json()
+    assert (data["type"], data["target_id"]) == ("delete-folder", folder_id)
+    assert data["status"] == "succeeded"
+    assert data["done"] == data["total"] == 1
+    assert data["finished_at"] is not None
+
+
+def test_read_non_existent_job(
+    session: Session, client_authenticated: TestClient
+) -> None:
+    response = client_authenticated.get("/jobs/99")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json()["detail"] == ErrorCode.JOB_NOT_FOUND
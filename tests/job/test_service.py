@@ -0,0 +1,124 @@
+import time
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from tests.database import session, mock_os_data, mock_vendor_data, TestingSessionLocal
+
+from src.device.models import Device
+from src.folder import service as folder_service
+from src.folder.exceptions import FolderNotFound
+from src.folder.models import Folder
+from src.folder.service import FOLDER_DELETION_JOB, get_folder, get_root_folder
+from src.job.models import Job, JobStatus
+from src.job.runner import JobInterrupted, JobRunner, job_runner
+from src.tag.models import Type
+from src.tenant import service as tenant_service
+from src.tenant.exceptions import TenantNotFound
+from src.tenant.service import enqueue_tenant_deletion, get_tenant
+
+
+def test_tenant_deletion_job_runs_in_batches(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # a single row per statement
+    monkeypatch.setattr(folder_service, "JOB_BATCH_SIZE", 1)
+    monkeypatch.setattr(tenant_service, "JOB_BATCH_SIZE", 1)
+    tenant = get_tenant(session, 2)
+    folder_ids = [f.id for f in tenant.folders]
+    # folder tags are deleted along with their folders
+    tags = len([t for t in tenant.tags_for_tenant if t.type != Type.FOLDER])
+    device_ids = session.scalars(
+        select(Device.id).where(Device.folder_id.in_(folder_ids))
+    ).all()
+    tenant1_root_folder_id = get_root_folder(session, tenant_id=1).id
+
+    job = enqueue_tenant_deletion(session, tenant)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.done == job.total
+    assert job.total == len(device_ids) + len(folder_ids) + tags
+
+    with pytest.raises(TenantNotFound):
+        get_tenant(session, 2)
+    assert not session.scalars(select(Folder).where(Folder.id.in_(folder_ids))).all()
+    assert set(
+        session.scalars(select(Device.folder_id).where(Device.id.in_(device_ids)))
+    ) == {tenant1_root_folder_id}
+
+
+def test_interrupted_jobs_are_resumed(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    folder_id = session.scalar(select(Folder.id).where(Folder.name == "folder1"))
+    job = Job(type=FOLDER_DELETION_JOB, target_id=folder_id)
+    session.add(job)
+    session.commit()
+
+    # the runner shutting down stops the job before its next batch...
+    monkeypatch.setattr(job_runner, "session_factory", TestingSessionLocal)
+    job_runner._stopping.set()
+    job_runner.run(session, job.id)
+    assert job.status == JobStatus.RUNNING
+    assert job.done == 0
+    assert get_folder(session, folder_id)
+
+    # ...and it is picked up again on the next start
+    job_runner.start()
+    try:
+        for _ in range(100):
+            session.expire_all()
+            if session.get(Job, job.id).status != JobStatus.RUNNING:
+                break
+            time.sleep(0.05)
+    finally:
+        job_runner.stop()
+    job = session.get(Job, job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.done == job.total
+    with pytest.raises(FolderNotFound):
+        get_folder(session, folder_id)
+
+
+def test_jobs_are_claimed_by_a_single_runner(session: Session) -> None:
+    folder_id = session.scalar(select(Folder.id).where(Folder.name == "folder1"))
+    # a job being processed by another process
+    job = Job(
+        type=FOLDER_DELETION_JOB,
+        target_id=folder_id,
+        status=JobStatus.RUNNING,
+        worker="other-runner",
+        lease_expires_at=datetime.now() + timedelta(minutes=1),
+    )
+    session.add(job)
+    session.commit()
+
+    job_runner.run(session, job.id)
+    assert job.status == JobStatus.RUNNING
+    assert job.worker == "other-runner"
+    assert get_folder(session, folder_id)
+
+    # the other process died and stopped renewing its lease
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    session.commit()
+    job_runner.run(session, job.id)
+    assert job.status == JobStatus.SUCCEEDED
+    assert job.worker is None
+    with pytest.raises(FolderNotFound):
+        get_folder(session, folder_id)
+
+
+def test_jobs_stop_once_their_lease_is_lost(session: Session) -> None:
+    job = Job(type=FOLDER_DELETION_JOB)
+    session.add(job)
+    session.commit()
+    assert job_runner.claim(session, job.id)
+    assert not job_runner.claim(session, job.id)
+
+    # the lease expired before the batch was done and another runner claimed the job
+    job.lease_expires_at = datetime.now() - timedelta(seconds=1)
+    session.commit()
+    other_runner = JobRunner(session_factory=TestingSessionLocal)
+    assert other_runner.claim(session, job.id)
+    with pytest.raises(JobInterrupted):
+        job_runner.renew_lease(session, job)
+    other_runner.renew_lease(session, job)
@@ -2,7 +2,7 @@ import os
 import pytest
 from dotenv import load_dotenv
 from pydantic import ValidationError
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from typing import Union
 from tests.database import session, mock_os_data, mock_vendor_data
@@ -27,6 +27,8 @@ from src.tenant.service import (
     update_tenant_settings,
 )
 from src.tenant.schemas import TenantCreate, TenantUpdate, TenantSettings
+from src.tenant.models import TenantSettings as TenantSettingsModel
+from src.tenant.utils import get_cached_tenant_settings
 from src.user import models as user_models
 from src.tag.schemas import TagCreate
 from src.tag.service import create_tag, get_tag
@@ -265,6 +267,26 @@ def test_update_tenant_settings(
         assert new_settings.heartbeat_s == tenant_settings_after["heartbeat_s"]
 
 
+def test_tenant_settings_are_cached(session: Session) -> None:
+    tenant_id = 1
+    assert get_cached_tenant_settings(session, tenant_id).heartbeat_s == 120
+
+    # changes made behind the service's back are not seen until the entry expires...
+    session.execute(
+        update(TenantSettingsModel)
+        .where(TenantSettingsModel.tenant_id == tenant_id)
+        .values(heartbeat_s=30)
+    )
+    session.commit()
+    assert get_cached_tenant_settings(session, tenant_id).heartbeat_s == 120
+
+    # ...while updating the settings invalidates the cached ones
+    update_tenant_settings(session, tenant_id, TenantSettings(heartbeat_s=60))
+    assert get_cached_tenant_settings(session, tenant_id).heartbeat_s == 60
+
+    assert get_cached_tenant_settings(session, 99) is None
+
+
 def test_delete_tenant_permanent(session: Session) -> None:
     tenant_id = 2
     tenant = get_tenant(session, tenant_id)
@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from fastapi.testclient import TestClient
 from fastapi import status
 
+from src.auth.hashing import password_hasher
 from src.user.constants import ErrorCode
 from tests.database import (
     app,
@@ -443,6 +444,7 @@ async def test_create_user_full(
     assert response.status_code == status.HTTP_200_OK
     tags = response.json()["tags"]
 
+    hashed = password_hasher.stats()["completed"]
     response = client.post(
         "/users",
         json={
@@ -461,4 +463,6 @@ async def test_create_user_full(
         assert data["username"] == "test-user@email.com"
         assert data["role_id"] == role_id
         assert len(data["tenants"]) >= 0
-        assert all(t in tags for t in data["tags"])
\ No newline at end of file
+        assert all(t in tags for t in data["tags"])
+        # the password is hashed only once
+        assert password_hasher.stats()["completed"] == hashed + 1
\ No newline at end of file